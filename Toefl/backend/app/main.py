@@ -1,20 +1,72 @@
 import json
+import logging
 import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 
-from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from .database import Base, engine, get_db
-from .models import PromptUsage, SentenceSetCache, StudentPromptHistory, Submission
-from .schemas import HistoryItem, PromptResponse, SubmitRequest, SubmitResponse
+from .database import Base, SessionLocal, engine, get_db
+from .models import PromptUsage, RubricJob, SentenceSetCache, StudentPromptHistory, Submission
+from .schemas import HistoryItem, PromptResponse, SimilarPrompt, SubmitRequest, SubmitResponse
+from .schemas import ClassroomSetRequest, ClassroomSetResponse
 from .schemas import SentenceSetResponse, SentenceSubmitRequest, SentenceSubmitResponse
 from .services.grading import evaluate_submission
+from .services.live_grading import DraftSession
+from .services.metrics import metrics
+from .services.prompt_index import prompt_index
 from .services.prompt_store import prompt_store
-from .services.sentence_builder import generate_sentence_set, get_runtime_set, grade_sentence_set, register_runtime_set
+from .services.result_cache import normalize_submission_text, result_cache_key, submission_cache, text_digest
+from .services.rubric_jobs import enqueue_rubric_job, job_status_payload, rubric_job_runner, rubric_model_enabled
+from .services.set_tokens import open_set_token, seal_sentence_set
+from .services.sentence_sets import sentence_set_compactor, set_expires_at
+from .services.sentence_inventory import (
+    inventory_candidates,
+    inventory_is_empty,
+    inventory_replenisher,
+    items_by_keys,
+    mark_served,
+    rekey_items,
+    seed_inventory,
+)
+from .services.sentence_builder import (
+    compact_sentence_set,
+    generate_classroom_sets,
+    generate_sentence_set,
+    get_runtime_set,
+    grade_sentence_set,
+    iter_sentence_set,
+    public_sentence_set,
+    rebuild_sentence_set,
+    register_runtime_set,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with SessionLocal() as db:
+        rekey_items(db)
+        seed_inventory(db)
+    rubric_job_runner.start()
+    inventory_replenisher.start()
+    sentence_set_compactor.start()
+    # Loaded off the request path so the first similarity query does not pay for it.
+    threading.Thread(target=prompt_index.ensure_loaded, name="prompt-index-load", daemon=True).start()
+    yield
+    sentence_set_compactor.stop()
+    inventory_replenisher.stop()
+    rubric_job_runner.stop()
 
-app = FastAPI(title="TOEFL Writing Practice API")
+
+app = FastAPI(title="TOEFL Writing Practice API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,6 +92,30 @@ def _ensure_submission_columns() -> None:
 _ensure_submission_columns()
 
 
+def _ensure_sentence_cache_columns() -> None:
+    with engine.begin() as conn:
+        cols = [row[1] for row in conn.execute(text("PRAGMA table_info(sentence_set_cache)")).fetchall()]
+        if "expires_at" not in cols:
+            conn.execute(text("ALTER TABLE sentence_set_cache ADD COLUMN expires_at DATETIME"))
+            conn.execute(
+                text("CREATE INDEX IF NOT EXISTS ix_sentence_set_cache_expires_at ON sentence_set_cache (expires_at)")
+            )
+
+
+_ensure_sentence_cache_columns()
+
+
+def _ensure_rubric_job_columns() -> None:
+    with engine.begin() as conn:
+        cols = [row[1] for row in conn.execute(text("PRAGMA table_info(rubric_jobs)")).fetchall()]
+        if "next_attempt_at" not in cols:
+            conn.execute(text("ALTER TABLE rubric_jobs ADD COLUMN next_attempt_at DATETIME"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_rubric_jobs_next_attempt_at ON rubric_jobs (next_attempt_at)"))
+
+
+_ensure_rubric_job_columns()
+
+
 def _sanitize_email_prompt_view(prompt: dict | None) -> dict | None:
     if not isinstance(prompt, dict):
         return prompt
@@ -131,30 +207,166 @@ def random_prompt(
     return _sanitize_email_prompt_view(prompt)
 
 
+@app.get("/api/prompts/similar", response_model=list[SimilarPrompt])
+def similar_prompts(
+    prompt_id: str | None = Query(None),
+    query_text: str | None = Query(None, alias="text", max_length=20000),
+    k: int = Query(5, ge=1, le=50),
+    task_type: str | None = Query(None, pattern="^(email|discussion)$"),
+):
+    exclude: set[str] = set()
+    if prompt_id:
+        prompt = prompt_store.get_prompt_by_id(prompt_id)
+        if not prompt:
+            raise HTTPException(status_code=404, detail="Prompt not found.")
+        query_text = prompt.get("raw_text") or ""
+        exclude = {prompt_id, str(prompt.get("source_prompt_id") or prompt_id)}
+    if not query_text:
+        raise HTTPException(status_code=422, detail="Provide prompt_id or text.")
+    return prompt_index.search(query_text, k=k, task_type=task_type, exclude=exclude)
+
+
 @app.post("/api/submit", response_model=SubmitResponse)
-def submit(payload: SubmitRequest, db: Session = Depends(get_db)):
+def submit(
+    payload: SubmitRequest,
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db),
+):
+    idempotency_key = idempotency_key or payload.idempotency_key
+    user_text = normalize_submission_text(payload.user_text)
+    submission = (payload.prompt_id, text_digest(user_text), payload.student_id)
+    if idempotency_key:
+        replay = submission_cache.lookup_idempotency_key(idempotency_key)
+        if replay:
+            if replay["submission"] != submission:
+                raise HTTPException(status_code=409, detail="Idempotency-Key was already used for a different submission.")
+            metrics.inc("submit.idempotent_replays")
+            return replay["result"]
+
     prompt_store.reload()
     prompt = prompt_store.get_prompt_by_id(payload.prompt_id)
     if not prompt:
         raise HTTPException(status_code=404, detail="Prompt not found")
+    cache_key = result_cache_key(prompt, user_text)
+    entry = submission_cache.get(cache_key)
+    if entry is None:
+        # Graded as sent; the normalized text only decides which submissions share a cached grade.
+        started = time.perf_counter()
+        graded = evaluate_submission(prompt, payload.user_text)
+        metrics.observe("submit.grade_seconds", time.perf_counter() - started)
+        entry = submission_cache.put(cache_key, graded, _sanitize_email_prompt_view(prompt) or prompt)
 
-    result = evaluate_submission(prompt, payload.user_text)
-
-    prompt = _sanitize_email_prompt_view(prompt) or prompt
-    row = Submission(
-        prompt_id=payload.prompt_id,
-        student_id=payload.student_id,
-        task_type=prompt.get("task_type", "unknown"),
-        user_text=payload.user_text,
-        scores_json=json.dumps(result),
-        prompt_json=json.dumps(prompt),
-    )
-    db.add(row)
-    db.commit()
+    if submission_cache.mark_written(cache_key, payload.student_id):
+        result = dict(entry["result"])
+        if rubric_model_enabled():
+            # Each stored submission gets its own job; the model-scored rubric is fetched later via the job id.
+            result["rubric_job_id"] = enqueue_rubric_job(db, prompt, payload.user_text, entry["result"])
+        row = Submission(
+            prompt_id=payload.prompt_id,
+            student_id=payload.student_id,
+            task_type=entry["prompt"].get("task_type", "unknown"),
+            user_text=payload.user_text,
+            scores_json=json.dumps(result),
+            prompt_json=json.dumps(entry["prompt"]),
+        )
+        db.add(row)
+        db.commit()
+        submission_cache.remember_written(cache_key, payload.student_id, result)
+    else:
+        metrics.inc("submit.duplicate_writes_skipped")
+        result = submission_cache.written_response(cache_key, payload.student_id) or dict(entry["result"])
 
+    if idempotency_key:
+        submission_cache.remember_idempotency_key(idempotency_key, submission, result)
     return result
 
 
+@app.get("/api/rubric-jobs/{job_id}")
+def rubric_job_status(job_id: str, db: Session = Depends(get_db)):
+    job = db.query(RubricJob).filter(RubricJob.job_id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Rubric job not found")
+    return job_status_payload(job)
+
+
+@app.get("/api/rubric-jobs/{job_id}/events")
+def rubric_job_events(job_id: str, timeout: float = Query(120.0, ge=1.0, le=600.0)):
+    with SessionLocal() as db:
+        if not db.query(RubricJob.id).filter(RubricJob.job_id == job_id).first():
+            raise HTTPException(status_code=404, detail="Rubric job not found")
+
+    def stream():
+        deadline = time.monotonic() + timeout
+        last_status = None
+        while True:
+            with SessionLocal() as db:
+                job = db.query(RubricJob).filter(RubricJob.job_id == job_id).first()
+                payload = job_status_payload(job) if job else {"job_id": job_id, "status": "missing"}
+            if payload["status"] != last_status:
+                last_status = payload["status"]
+                yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+            if last_status in ("done", "failed", "missing"):
+                return
+            if time.monotonic() >= deadline:
+                yield "event: timeout\ndata: {}\n\n"
+                return
+            time.sleep(0.5)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/api/metrics")
+def get_metrics():
+    return metrics.snapshot()
+
+
+@app.websocket("/api/draft/ws")
+async def draft_ws(websocket: WebSocket):
+    # Live rubric hints for an in-progress draft. Nothing is written to the submissions table.
+    await websocket.accept()
+    session: DraftSession | None = None
+    reloaded = False
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except (KeyError, ValueError):
+                # Binary or malformed frames get an error reply instead of closing the socket.
+                await websocket.send_json({"type": "error", "detail": "Messages must be JSON text frames."})
+                continue
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "start":
+                # The bank is checked once per connection, not on every restart of the draft.
+                if not reloaded:
+                    prompt_store.reload()
+                    reloaded = True
+                prompt = prompt_store.get_prompt_by_id(str(message.get("prompt_id") or ""))
+                if not prompt:
+                    await websocket.send_json({"type": "error", "detail": "Prompt not found"})
+                    continue
+                session = DraftSession(prompt)
+                session.update_text(str(message.get("text") or ""))
+            elif session is None:
+                await websocket.send_json({"type": "error", "detail": "Send a start message with prompt_id first."})
+                continue
+            elif kind == "update":
+                session.update_text(str(message.get("text") or ""))
+            elif kind == "splice":
+                try:
+                    start = int(message.get("start", 0))
+                    end = int(message.get("end", start))
+                except (TypeError, ValueError):
+                    await websocket.send_json({"type": "error", "detail": "start and end must be integers."})
+                    continue
+                session.splice(start, end, [str(p) for p in message.get("paragraphs") or []])
+            else:
+                await websocket.send_json({"type": "error", "detail": f"Unknown message type: {kind}"})
+                continue
+            await websocket.send_json({"type": "delta", **session.delta()})
+    except WebSocketDisconnect:
+        return
+
+
 @app.get("/api/history", response_model=list[HistoryItem])
 def history(student_id: str | None = Query(None), db: Session = Depends(get_db)):
     query = db.query(Submission)
@@ -176,38 +388,159 @@ def history(student_id: str | None = Query(None), db: Session = Depends(get_db))
     ]
 
 
+def _store_sentence_sets(db: Session, runtime_sets: list[dict]) -> list[str | None]:
+    # One transaction for the whole batch: served counts, any new items, and one cache row per set.
+    mark_served(db, [item for runtime_set in runtime_sets for item in runtime_set["items"]], commit=False)
+    tokens = [seal_sentence_set(runtime_set) for runtime_set in runtime_sets]
+    # Stateless mode: the token carries the answer key, so no cache row is needed.
+    unsealed = [runtime_set for runtime_set, token in zip(runtime_sets, tokens) if not token]
+    existing = {}
+    if unsealed:
+        set_ids = [runtime_set["set_id"] for runtime_set in unsealed]
+        existing = {
+            row.set_id: row for row in db.query(SentenceSetCache).filter(SentenceSetCache.set_id.in_(set_ids)).all()
+        }
+    new_rows = []
+    for runtime_set in unsealed:
+        # Only item keys and the seed are stored; the questions are rebuilt from the item store on demand.
+        payload_json = json.dumps(compact_sentence_set(runtime_set))
+        expires_at = set_expires_at(runtime_set)
+        row = existing.get(runtime_set["set_id"])
+        if row:
+            row.payload_json = payload_json
+            row.expires_at = expires_at
+        else:
+            new_rows.append(SentenceSetCache(set_id=runtime_set["set_id"], payload_json=payload_json, expires_at=expires_at))
+    db.add_all(new_rows)
+    db.commit()
+    # Served items leave the servable pool; the replenisher re-counts it off the request path.
+    inventory_replenisher.notify()
+    return tokens
+
+
+def _store_sentence_set(db: Session, runtime_set: dict) -> str | None:
+    return _store_sentence_sets(db, [runtime_set])[0]
+
+
+def _sentence_pool(db: Session, count: int, limit: int | None = None) -> tuple[list[dict], bool]:
+    # Sets are selected from the inventory; the model is only called inline on a cold start with no items.
+    pool = inventory_candidates(db, count, limit=limit)
+    if len(pool) < count * 3:
+        inventory_replenisher.notify()
+    return pool, not pool and inventory_is_empty(db)
+
+
 @app.post("/api/sentence/random", response_model=SentenceSetResponse)
 def sentence_random(
     count: int = Query(10, ge=1, le=10),
     difficulty: str = Query("hard", pattern="^(normal|hard|very_hard|extra_tough)$"),
     db: Session = Depends(get_db),
 ):
+    started = time.perf_counter()
+    pool, cold = _sentence_pool(db, count)
     try:
-        public_set = generate_sentence_set(count=count, difficulty=difficulty)
-        runtime_set = get_runtime_set(public_set["set_id"])
-        if runtime_set:
-            existing = db.query(SentenceSetCache).filter(SentenceSetCache.set_id == public_set["set_id"]).first()
-            payload_json = json.dumps(runtime_set)
-            if existing:
-                existing.payload_json = payload_json
-            else:
-                db.add(SentenceSetCache(set_id=public_set["set_id"], payload_json=payload_json))
-            db.commit()
-        return public_set
+        public_set = generate_sentence_set(count=count, difficulty=difficulty, candidate_pool=pool, generate=cold)
     except RuntimeError as exc:
         raise HTTPException(status_code=503, detail=str(exc)) from exc
+    runtime_set = get_runtime_set(public_set["set_id"])
+    if runtime_set:
+        set_token = _store_sentence_set(db, runtime_set)
+        if set_token:
+            public_set["set_token"] = set_token
+    metrics.observe("sentence_sets.assembly_seconds", time.perf_counter() - started)
+    return public_set
+
+
+@app.post("/api/sentence/random/stream")
+def sentence_random_stream(
+    count: int = Query(10, ge=1, le=10),
+    difficulty: str = Query("hard", pattern="^(normal|hard|very_hard|extra_tough)$"),
+):
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        pool, cold = _sentence_pool(db, count)
+
+    def stream():
+        first = True
+        try:
+            for event, data in iter_sentence_set(count=count, difficulty=difficulty, candidate_pool=pool, generate=cold):
+                if event == "question" and first:
+                    first = False
+                    metrics.observe("sentence_sets.first_question_seconds", time.perf_counter() - started)
+                if event == "complete":
+                    # The set is stored before the stream closes so it can be graded immediately.
+                    with SessionLocal() as db:
+                        set_token = _store_sentence_set(db, data)
+                    metrics.observe("sentence_sets.stream_total_seconds", time.perf_counter() - started)
+                    yield f"event: done\ndata: {json.dumps({'set_id': data['set_id'], 'set_token': set_token})}\n\n"
+                    return
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except RuntimeError as exc:
+            yield f"event: error\ndata: {json.dumps({'detail': str(exc)})}\n\n"
+        except Exception:
+            # Questions may already be on the client, so the stream has to end with an event it can act on.
+            logger.exception("Sentence set stream failed")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Could not finish the sentence set. Try again.'})}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.post("/api/sentence/classroom", response_model=ClassroomSetResponse)
+def sentence_classroom(payload: ClassroomSetRequest, db: Session = Depends(get_db)):
+    if payload.student_ids is not None and len(payload.student_ids) != payload.students:
+        raise HTTPException(status_code=422, detail="student_ids must have one entry per student.")
+    started = time.perf_counter()
+    # The whole class draws from one pool; it is read with room for every student's share in one query.
+    slots = payload.students * payload.count
+    pool, cold = _sentence_pool(db, payload.count, limit=max(slots * 2, payload.count * 12, 120))
+    if len(pool) < slots:
+        inventory_replenisher.notify()
+    try:
+        runtime_sets = generate_classroom_sets(
+            payload.students,
+            count=payload.count,
+            difficulty=payload.difficulty,
+            candidate_pool=pool,
+            max_shared=payload.max_shared,
+            max_item_reuse=payload.max_item_reuse,
+            generate=cold,
+        )
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    tokens = _store_sentence_sets(db, runtime_sets)
+    student_ids = payload.student_ids or [None] * payload.students
+    sets = []
+    for student_id, runtime_set, token in zip(student_ids, runtime_sets, tokens):
+        public_set = public_sentence_set(runtime_set)
+        public_set["student_id"] = student_id
+        public_set["set_token"] = token
+        sets.append(public_set)
+    distinct = len({q["item_key"] for runtime_set in runtime_sets for q in runtime_set["questions"]})
+    elapsed = time.perf_counter() - started
+    metrics.observe("sentence_sets.classroom_seconds", elapsed)
+    return {"sets": sets, "distinct_questions": distinct, "build_seconds": round(elapsed, 3)}
 
 
 @app.post("/api/sentence/submit", response_model=SentenceSubmitResponse)
 def sentence_submit(payload: SentenceSubmitRequest, db: Session = Depends(get_db)):
-    result = grade_sentence_set(payload.set_id, payload.answers)
-    if not result:
+    if payload.set_token:
+        opened = open_set_token(payload.set_token, payload.set_id)
+        if not opened:
+            raise HTTPException(status_code=404, detail="Sentence set not found. Start a new set.")
+        result = grade_sentence_set(payload.set_id, payload.answers, test_set=opened)
+    else:
+        result = grade_sentence_set(payload.set_id, payload.answers)
+    if not result and not payload.set_token:
         cached = db.query(SentenceSetCache).filter(SentenceSetCache.set_id == payload.set_id).first()
-        if cached:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if cached and (cached.expires_at is None or cached.expires_at > now):
             try:
                 restored = json.loads(cached.payload_json)
+                if isinstance(restored, dict) and restored.get("v") == 2:
+                    restored = rebuild_sentence_set(restored, items_by_keys(db, restored["items"]))
                 if isinstance(restored, dict):
-                    register_runtime_set(payload.set_id, restored)
+                    ttl = (cached.expires_at - now).total_seconds() if cached.expires_at else None
+                    register_runtime_set(payload.set_id, restored, ttl_seconds=ttl)
                     result = grade_sentence_set(payload.set_id, payload.answers)
             except json.JSONDecodeError:
                 result = None
@@ -24,6 +24,7 @@ class SentenceSetCache(Base):
     set_id = Column(String(64), unique=True, index=True, nullable=False)
     payload_json = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), index=True, nullable=True)
 
 
 class PromptUsage(Base):
@@ -46,3 +47,40 @@ class StudentPromptHistory(Base):
     prompt_id = Column(String(64), nullable=False, index=True)
     source_prompt_id = Column(String(64), nullable=False, index=True)
     assigned_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class RubricJob(Base):
+    __tablename__ = "rubric_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(64), unique=True, index=True, nullable=False)
+    prompt_id = Column(String(64), index=True, nullable=False)
+    status = Column(String(16), index=True, nullable=False, default="queued")
+    request_json = Column(Text, nullable=False)
+    result_json = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), index=True, nullable=True)
+
+
+class SentenceItem(Base):
+    __tablename__ = "sentence_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    item_key = Column(String(40), unique=True, index=True, nullable=False)
+    prompt = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    response_template_json = Column(Text, nullable=False)
+    pattern = Column(String(64), nullable=False)
+    family = Column(String(32), index=True, nullable=False)
+    format_group = Column(String(16), index=True, nullable=False)
+    context = Column(String(16), nullable=False)
+    topic = Column(String(32), nullable=False)
+    grammar_tags = Column(Text, nullable=False, default="")
+    source = Column(String(16), nullable=False, default="llm")
+    served_count = Column(Integer, nullable=False, default=0)
+    last_served_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
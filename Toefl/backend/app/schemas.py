@@ -16,10 +16,18 @@ class PromptResponse(BaseModel):
     student_posts: list[str] = Field(default_factory=list)
 
 
+class SimilarPrompt(BaseModel):
+    prompt_id: str
+    title: str | None = None
+    task_type: str | None = None
+    score: float
+
+
 class SubmitRequest(BaseModel):
     prompt_id: str
     user_text: str
     student_id: str | None = None
+    idempotency_key: str | None = None
 
 
 class SubmitResponse(BaseModel):
@@ -30,6 +38,7 @@ class SubmitResponse(BaseModel):
     feedback: dict[str, list[str]]
     improved_sample: str
     vocab_suggestions: list[str]
+    rubric_job_id: str | None = None
 
 
 class HistoryItem(BaseModel):
@@ -57,11 +66,32 @@ class SentenceSetResponse(BaseModel):
     time_minutes: int
     difficulty: str
     questions: list[SentenceQuestion]
+    set_token: str | None = None
+
+
+class ClassroomSetRequest(BaseModel):
+    students: int = Field(ge=1, le=100)
+    student_ids: list[str] | None = None
+    count: int = Field(10, ge=1, le=10)
+    difficulty: str = Field("hard", pattern="^(normal|hard|very_hard|extra_tough)$")
+    max_shared: int | None = Field(None, ge=0)
+    max_item_reuse: int | None = Field(None, ge=1)
+
+
+class ClassroomSet(SentenceSetResponse):
+    student_id: str | None = None
+
+
+class ClassroomSetResponse(BaseModel):
+    sets: list[ClassroomSet]
+    distinct_questions: int
+    build_seconds: float
 
 
 class SentenceSubmitRequest(BaseModel):
     set_id: str
     answers: dict[str, str]
+    set_token: str | None = None
 
 
 class SentenceSubmitResponse(BaseModel):
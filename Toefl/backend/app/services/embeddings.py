@@ -0,0 +1,51 @@
+import hashlib
+import re
+from functools import lru_cache
+
+import numpy as np
+
+EMBEDDING_DIM = 128
+_TOKEN_RE = re.compile(r"\b\w+\b")
+# For ASCII text, \w is exactly [A-Za-z0-9_], so mapping everything else to spaces and splitting gives the
+# same tokens as the regex at a fraction of the cost.
+_ASCII_NON_WORD = {c: " " for c in range(128) if not (chr(c).isalnum() or chr(c) == "_")}
+
+
+def _tokenize(text: str) -> list[str]:
+    text = (text or "").lower()
+    return text.translate(_ASCII_NON_WORD).split() if text.isascii() else _TOKEN_RE.findall(text)
+
+
+@lru_cache(maxsize=1 << 16)
+def _token_feature(token: str, dim: int) -> tuple[int, float]:
+    # blake2b is stable across processes and machines, unlike the salted built-in hash().
+    h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return h % dim, -1.0 if h >> 63 else 1.0
+
+
+class LocalHashEmbedding:
+    # Signed feature hashing: each token adds +1 or -1 to one bucket, so collisions tend to cancel
+    # instead of piling up, and rows are L2-normalized.
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def name(self) -> str:
+        return "local_hash_embedding"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        # The batch is tokenized up front and each distinct token is hashed once; the per-token work is array indexing.
+        token_lists = [_tokenize(text) for text in texts]
+        flat_tokens = [tok for tokens in token_lists for tok in tokens]
+        vocab = {tok: i for i, tok in enumerate(dict.fromkeys(flat_tokens))}
+        ids = np.fromiter(map(vocab.__getitem__, flat_tokens), dtype=np.int64, count=len(flat_tokens))
+        features = np.array([_token_feature(tok, self.dim) for tok in vocab], dtype=np.float64).reshape(-1, 2)
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), [len(tokens) for tokens in token_lists])
+        flat = rows * self.dim + features[ids, 0].astype(np.int64)
+        matrix = np.bincount(flat, weights=features[ids, 1], minlength=len(texts) * self.dim)
+        matrix = matrix.astype(np.float32).reshape(len(texts), self.dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        return self.embed(list(input)).tolist()
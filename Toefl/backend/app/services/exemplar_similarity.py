@@ -0,0 +1,116 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import chain
+from typing import Any
+
+import numpy as np
+
+from .embeddings import _token_feature
+from .metrics import metrics
+from .text_index import STOPWORDS, light_stem
+
+# Topic signal for grading: a response's hashed bag of content-word unigrams and bigrams, compared by cosine
+# with the prompt's model answer (from ingest --enrich) and with the prompt's own task text. Bigrams never
+# cross a paragraph break, so a text's vector is the sum of its paragraphs' vectors (live grading relies on it).
+EXEMPLAR_SIGNAL = os.getenv("GRADING_EXEMPLAR_SIGNAL", "1") != "0"
+NGRAM_DIM = int(os.getenv("GRADING_NGRAM_DIM", "512"))
+_WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+_PARAGRAPH_RE = re.compile(r"\n{2,}")
+_SKIP = STOPWORDS | {
+    "the", "and", "for", "are", "was", "were", "you", "our", "his", "her", "its", "did", "has", "had", "can",
+    "not", "but", "all", "any", "how", "why", "who", "may", "because", "think", "believe", "also", "dear",
+    "regards", "sincerely", "best", "thank", "thanks", "please", "would", "like",
+}
+_stem = lru_cache(maxsize=1 << 16)(light_stem)
+
+
+def _grams(paragraph: str) -> list[str]:
+    stems = [_stem(t) for t in _WORD_RE.findall(paragraph.lower()) if len(t) >= 3 and t not in _SKIP]
+    return stems + [f"{a} {b}" for a, b in zip(stems, stems[1:])]
+
+
+def ngram_counts(text: str, dim: int = NGRAM_DIM) -> np.ndarray:
+    # Signed hashed counts (not normalized) so paragraph vectors can be added and subtracted.
+    grams = [g for para in _PARAGRAPH_RE.split(text or "") for g in _grams(para)]
+    if not grams:
+        return np.zeros(dim, dtype=np.float32)
+    features = np.fromiter(chain.from_iterable(_token_feature(g, dim) for g in grams), dtype=np.float64, count=2 * len(grams))
+    return np.bincount(features[0::2].astype(np.int64), weights=features[1::2], minlength=dim).astype(np.float32)
+
+
+def _normalized(vec: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+def task_text(prompt: dict[str, Any]) -> str:
+    parts = [
+        prompt.get("subject") or "",
+        "\n\n".join(str(b) for b in prompt.get("bullet_points") or []),
+        prompt.get("professor_prompt") or "",
+        "\n\n".join(str(p) for p in prompt.get("student_posts") or []),
+    ]
+    text = "\n\n".join(p for p in parts if p)
+    return text or str(prompt.get("raw_text") or "")
+
+
+class ExemplarIndex:
+    # Two normalized rows per prompt (model answer, task text), built the first time a prompt is graded and
+    # kept in a bounded LRU keyed by prompt id, so nothing is decoded or vectorized up front. Scoring is then
+    # one (2, dim) @ (dim,) product. The cache is cleared whenever the prompt bank changes.
+    def __init__(self, dim: int = NGRAM_DIM, max_prompts: int = 4096):
+        self.dim = dim
+        self.max_prompts = max_prompts
+        self._lock = threading.Lock()
+        self._rows: OrderedDict[str, tuple[np.ndarray, bool]] = OrderedDict()
+
+    def _prompt_rows(self, prompt: dict[str, Any]) -> tuple[np.ndarray, bool]:
+        answer = prompt.get("model_answer") or ""
+        rows = np.stack([_normalized(ngram_counts(answer, self.dim)), _normalized(ngram_counts(task_text(prompt), self.dim))])
+        return rows, bool(answer)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._rows.clear()
+
+    def _rows_for(self, prompt: dict[str, Any]) -> tuple[np.ndarray, bool]:
+        pid = str(prompt.get("prompt_id") or "")
+        with self._lock:
+            cached = self._rows.get(pid)
+            if cached is not None:
+                self._rows.move_to_end(pid)
+                return cached
+        started = time.perf_counter()
+        rows = self._prompt_rows(prompt)
+        metrics.observe("grading.exemplar_build_seconds", time.perf_counter() - started)
+        if pid:
+            with self._lock:
+                self._rows[pid] = rows
+                while len(self._rows) > self.max_prompts:
+                    self._rows.popitem(last=False)
+        return rows
+
+    def similarity_from_counts(self, prompt: dict[str, Any], counts: np.ndarray) -> dict[str, float | None] | None:
+        if not counts.any():
+            return None
+        rows, has_answer = self._rows_for(prompt)
+        sims = rows @ _normalized(counts)
+        metrics.inc("grading.exemplar_signal")
+        return {
+            "exemplar": round(float(sims[0]), 3) if has_answer else None,
+            "prompt": round(float(sims[1]), 3),
+        }
+
+    def similarity(self, prompt: dict[str, Any], text: str) -> dict[str, float | None] | None:
+        return self.similarity_from_counts(prompt, ngram_counts(text, self.dim))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+exemplar_index = ExemplarIndex(max_prompts=int(os.getenv("GRADING_EXEMPLAR_CACHE_SIZE", "4096")))
+metrics.register_gauge("grading.exemplar_prompts", lambda: len(exemplar_index))
@@ -1,5 +1,22 @@
 import re
-from typing import Any
+from typing import Any, Callable
+
+from .exemplar_similarity import EXEMPLAR_SIGNAL, exemplar_index
+from .text_index import TextIndex, content_terms
+from .vocabulary import vocabulary_engine
+
+# Bump whenever scoring output changes so cached results keyed on it are not reused.
+GRADER_VERSION = "5"
+TRANSITION_RE = re.compile(r"\b(first|however|therefore|for example|in conclusion|also|because)\b")
+POLITE_RE = re.compile(r"\b(please|would|could|appreciate|thank you)\b")
+STANCE_RE = re.compile(r"\b(i agree|i disagree|in my view|from my perspective)\b")
+SUBJECT_LINE_RE = re.compile(r"(?im)^subject\s*:")
+GREETING_RE = re.compile(r"(?im)^(dear|hello|hi)\b")
+SIGNOFF_RE = re.compile(r"(?im)\b(sincerely|best|regards|thank you)\b")
+# Cosine between the response's hashed n-grams and the model answer (or, without one, the task text).
+# On-topic responses measured 0.19-0.32 against the task text; unrelated ones stayed under 0.13.
+TOPIC_OFF = 0.08
+TOPIC_STRONG = 0.25
 
 
 def _word_count(text: str) -> int:
@@ -20,6 +37,51 @@ def extract_requirements(prompt: dict[str, Any]) -> dict[str, Any]:
     }
 
 
+def _adjacent_phrases(text: str) -> list[str]:
+    words = re.findall(r"[A-Za-z]+(?:'[A-Za-z]+)?", text or "")
+    content = set(content_terms(text, min_len=4))
+    return [f"{a} {b}" for a, b in zip(words, words[1:]) if a.lower() in content and b.lower() in content]
+
+
+def coverage_targets(req: dict[str, Any]) -> dict[str, Any]:
+    # What each coverage check looks for; live drafts reuse these so their matches agree with the final grade.
+    return {
+        "bullets": [
+            (bullet, content_terms(bullet, min_len=4, limit=4), _adjacent_phrases(bullet)) for bullet in req["bullet_points"]
+        ],
+        "professor": content_terms(req.get("professor_prompt") or "", min_len=5, limit=8),
+        "peers": [content_terms(post, min_len=5, limit=5) for post in req.get("student_posts", [])],
+    }
+
+
+def coverage_checks(
+    task_type: str | None, targets: dict[str, Any], match: Callable[[list[str], list[str]], list[dict[str, Any]]]
+) -> dict[str, Any]:
+    # `match(terms, phrases)` returns positioned matches, e.g. TextIndex.match_terms over the response.
+    if task_type == "email":
+        bullet_hits = []
+        for bullet, terms, phrases in targets["bullets"]:
+            matches = match(terms, phrases) if terms else []
+            bullet_hits.append({"bullet": bullet, "covered": bool(matches), "matches": matches})
+        return {
+            "task_coverage": bullet_hits,
+            "all_bullets_covered": all(x["covered"] for x in bullet_hits) if bullet_hits else True,
+        }
+    professor_terms = targets["professor"]
+    professor_matches = match(professor_terms, []) if professor_terms else []
+    peer_matches: list[dict[str, Any]] = []
+    for key_terms in targets["peers"]:
+        peer_matches = match(key_terms, []) if key_terms else []
+        if peer_matches:
+            break
+    return {
+        "responds_to_professor": bool(professor_matches) if professor_terms else True,
+        "references_or_builds_on_peers": bool(peer_matches),
+        "professor_matches": professor_matches,
+        "peer_matches": peer_matches,
+    }
+
+
 def validate_rules(prompt: dict[str, Any], user_text: str) -> dict[str, Any]:
     req = extract_requirements(prompt)
     wc = _word_count(user_text)
@@ -29,47 +91,52 @@ def validate_rules(prompt: dict[str, Any], user_text: str) -> dict[str, Any]:
         "meets_min_words": wc >= req["min_words"],
     }
 
-    text_lower = user_text.lower()
+    index = TextIndex(user_text)
     if req["task_type"] == "email":
-        bullet_hits = []
-        for bullet in req["bullet_points"]:
-            tokens = [t for t in re.findall(r"[a-zA-Z]{4,}", bullet.lower())][:4]
-            covered = any(t in text_lower for t in tokens) if tokens else False
-            bullet_hits.append({"bullet": bullet, "covered": covered})
-
-        checks.update(
-            {
-                "email_format": {
-                    "has_subject_line": bool(re.search(r"(?im)^subject\s*:", user_text)),
-                    "has_greeting": bool(re.search(r"(?im)^(dear|hello|hi)\b", user_text.strip())),
-                    "has_signoff": bool(re.search(r"(?im)\b(sincerely|best|regards|thank you)\b", user_text)),
-                },
-                "task_coverage": bullet_hits,
-                "all_bullets_covered": all(x["covered"] for x in bullet_hits) if bullet_hits else True,
-            }
-        )
-    else:
-        professor_terms = [t.lower() for t in re.findall(r"[a-zA-Z]{5,}", req.get("professor_prompt") or "")][:8]
-        responds_to_professor = any(t in text_lower for t in professor_terms) if professor_terms else True
-        refs_peer = False
-        for post in req.get("student_posts", []):
-            key_terms = [t.lower() for t in re.findall(r"[a-zA-Z]{5,}", post)][:5]
-            if any(t in text_lower for t in key_terms):
-                refs_peer = True
-                break
-        checks.update(
-            {
-                "responds_to_professor": responds_to_professor,
-                "references_or_builds_on_peers": refs_peer,
-            }
-        )
+        checks["email_format"] = {
+            "has_subject_line": bool(SUBJECT_LINE_RE.search(user_text)),
+            "has_greeting": bool(GREETING_RE.search(user_text.strip())),
+            "has_signoff": bool(SIGNOFF_RE.search(user_text)),
+        }
+    checks.update(
+        coverage_checks(req["task_type"], coverage_targets(req), lambda terms, phrases: index.match_terms(terms, phrases=phrases))
+    )
 
+    if EXEMPLAR_SIGNAL:
+        similarity = exemplar_index.similarity(prompt, user_text)
+        if similarity is not None:
+            checks["topic_similarity"] = similarity
     return checks
 
 
-def score_rubric(prompt: dict[str, Any], user_text: str, checks: dict[str, Any]) -> dict[str, float]:
-    wc = checks["word_count"]
+def topic_overlap(checks: dict[str, Any]) -> tuple[float, str] | None:
+    similarity = checks.get("topic_similarity")
+    if not similarity:
+        return None
+    if similarity.get("exemplar") is not None:
+        return similarity["exemplar"], "the model answer"
+    return similarity["prompt"], "the task"
+
+
+def text_signals(user_text: str) -> dict[str, Any]:
+    lowered = user_text.lower()
     sentences = re.split(r"(?<=[.!?])\s+", user_text.strip()) if user_text.strip() else []
+    return {
+        "sentence_count": len(sentences),
+        "has_paragraph_break": "\n\n" in user_text,
+        "has_transition": bool(TRANSITION_RE.search(lowered)),
+        "unique_words": len(set(re.findall(r"\b\w+\b", lowered))),
+        "has_polite_register": bool(POLITE_RE.search(lowered)),
+        "has_stance_marker": bool(STANCE_RE.search(lowered)),
+    }
+
+
+def score_rubric(
+    prompt: dict[str, Any], user_text: str, checks: dict[str, Any], signals: dict[str, Any] | None = None
+) -> dict[str, float]:
+    wc = checks["word_count"]
+    signals = signals if signals is not None else text_signals(user_text)
+    sentence_count = signals["sentence_count"]
 
     def clamp(v: float) -> float:
         return round(max(0.0, min(5.0, v)), 1)
@@ -96,17 +163,25 @@ def score_rubric(prompt: dict[str, Any], user_text: str, checks: dict[str, Any])
         if checks.get("meets_min_words"):
             task += 0.8
 
-    org = 0.7 + (1.2 if len(sentences) >= 4 else 0) + (1.0 if "\n\n" in user_text else 0) + (
-        1.0 if re.search(r"\b(first|however|therefore|for example|in conclusion|also|because)\b", user_text.lower()) else 0
+    # Catches developed responses that are about something else; short ones are already capped below.
+    overlap = topic_overlap(checks)
+    if overlap is not None and wc >= 40:
+        if overlap[0] < TOPIC_OFF:
+            task -= 0.6
+        elif overlap[0] >= TOPIC_STRONG:
+            task += 0.3
+
+    org = 0.7 + (1.2 if sentence_count >= 4 else 0) + (1.0 if signals["has_paragraph_break"] else 0) + (
+        1.0 if signals["has_transition"] else 0
     )
-    avg_len = (wc / max(1, len(sentences))) if sentences else 0
-    grammar = 0.8 + (1.3 if len(sentences) >= 3 else 0) + (1.0 if 8 <= avg_len <= 30 else 0)
-    vocab = 0.9 + (1.2 if len(set(re.findall(r"\b\w+\b", user_text.lower()))) > 40 else 0)
+    avg_len = (wc / max(1, sentence_count)) if sentence_count else 0
+    grammar = 0.8 + (1.3 if sentence_count >= 3 else 0) + (1.0 if 8 <= avg_len <= 30 else 0)
+    vocab = 0.9 + (1.2 if signals["unique_words"] > 40 else 0)
 
     if prompt.get("task_type") == "email":
-        vocab += 0.9 if re.search(r"\b(please|would|could|appreciate|thank you)\b", user_text.lower()) else 0
+        vocab += 0.9 if signals["has_polite_register"] else 0
     else:
-        vocab += 0.6 if re.search(r"\b(i agree|i disagree|in my view|from my perspective)\b", user_text.lower()) else 0
+        vocab += 0.6 if signals["has_stance_marker"] else 0
 
     scores = {
         "Task Fulfillment": clamp(task),
@@ -145,6 +220,11 @@ def explain_scores(prompt: dict[str, Any], checks: dict[str, Any], rubric: dict[
             f"{'yes' if checks.get('references_or_builds_on_peers') else 'no'}, min words="
             f"{'met' if checks.get('meets_min_words') else 'not met'}."
         )
+    overlap = topic_overlap(checks)
+    if overlap is not None:
+        score, reference = overlap
+        level = "low, so check that you stay on topic" if score < TOPIC_OFF else "strong" if score >= TOPIC_STRONG else "moderate"
+        task_expl += f" Topic overlap with {reference} is {level} ({score:.2f})."
 
     return {
         "Task Fulfillment": task_expl,
@@ -225,6 +305,9 @@ def generate_feedback(prompt: dict[str, Any], checks: dict[str, Any], rubric: di
 
 
 def build_improved_sample(prompt: dict[str, Any]) -> str:
+    # Prompts enriched at ingest time (scripts/ingest_pdf.py --enrich) carry a validated model answer.
+    if prompt.get("model_answer"):
+        return prompt["model_answer"]
     if prompt.get("task_type") == "email":
         bullets = prompt.get("bullet_points", [])
         bullet_lines = [f"{i+1}. {b}: I am addressing this point clearly with relevant details." for i, b in enumerate(bullets)]
@@ -248,10 +331,8 @@ def build_improved_sample(prompt: dict[str, Any]) -> str:
     )
 
 
-def vocab_suggestions(user_text: str) -> list[str]:
-    words = {"beneficial", "feasible", "compelling", "consequently", "moreover", "substantial", "I recommend", "in contrast"}
-    used = set(re.findall(r"\b[\w']+\b", user_text.lower()))
-    return [w for w in words if w.lower() not in used][:8]
+def vocab_suggestions(user_text: str, task_type: str | None = None) -> list[str]:
+    return vocabulary_engine.suggest(user_text, task_type=task_type, limit=8)
 
 
 def evaluate_submission(prompt: dict[str, Any], user_text: str) -> dict[str, Any]:
@@ -266,5 +347,5 @@ def evaluate_submission(prompt: dict[str, Any], user_text: str) -> dict[str, Any
         "overall_score": overall,
         "feedback": generate_feedback(prompt, checks, rubric),
         "improved_sample": build_improved_sample(prompt),
-        "vocab_suggestions": vocab_suggestions(user_text),
+        "vocab_suggestions": vocab_suggestions(user_text, prompt.get("task_type")),
     }
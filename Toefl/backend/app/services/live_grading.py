@@ -0,0 +1,216 @@
+import re
+from collections import Counter
+from typing import Any
+
+import numpy as np
+
+from .grading import (
+    GREETING_RE,
+    POLITE_RE,
+    SIGNOFF_RE,
+    STANCE_RE,
+    SUBJECT_LINE_RE,
+    TRANSITION_RE,
+    coverage_checks,
+    coverage_targets,
+    extract_requirements,
+    score_rubric,
+)
+from .exemplar_similarity import EXEMPLAR_SIGNAL, NGRAM_DIM, exemplar_index, ngram_counts
+from .text_index import TextIndex, light_stem
+
+PARAGRAPH_SPLIT_RE = re.compile(r"(\n{2,})")
+# Same patterns and text variants that validate_rules / text_signals search.
+_FLAG_PATTERNS = {
+    "subject_line": (SUBJECT_LINE_RE, "raw"),
+    "greeting": (GREETING_RE, "raw"),
+    "greeting_lead": (GREETING_RE, "lstripped"),
+    "signoff": (SIGNOFF_RE, "raw"),
+    "transition": (TRANSITION_RE, "lower"),
+    "polite": (POLITE_RE, "lower"),
+    "stance": (STANCE_RE, "lower"),
+}
+
+
+def split_paragraphs(text: str) -> list[tuple[str, str]]:
+    # (paragraph, separator after it); the last paragraph has an empty separator.
+    parts = PARAGRAPH_SPLIT_RE.split(text or "")
+    return list(zip(parts[0::2], parts[1::2] + [""]))
+
+
+# Per-connection draft state. Totals are kept per paragraph so an edit only pays for the paragraphs it touched,
+# while the aggregates stay identical to what validate_rules / text_signals compute on the joined text.
+class DraftSession:
+    def __init__(self, prompt: dict[str, Any]):
+        self.prompt = prompt
+        req = extract_requirements(prompt)
+        self._task_type = req["task_type"]
+        self._min_words = req["min_words"]
+        self._targets = coverage_targets(req)
+        self._paragraphs: list[dict[str, Any]] = []
+        # Separator after each paragraph, so match offsets refer to the joined text.
+        self._seps: list[str] = []
+        self._token_counts: Counter[str] = Counter()
+        self._totals: Counter[str] = Counter()
+        # Sum of the paragraphs' hashed n-gram counts, which is the joined text's vector.
+        self._ngrams = np.zeros(NGRAM_DIM, dtype=np.float32)
+        self._last_state: dict[str, Any] = {}
+        self.reanalyzed = 0
+
+    def _analyze(self, text: str) -> dict[str, Any]:
+        self.reanalyzed += 1
+        stripped = text.strip()
+        lowered = text.lower()
+        tokens = re.findall(r"\b\w+\b", lowered)
+        index = TextIndex(text)
+        variants = {"raw": text, "lstripped": text.lstrip(), "lower": lowered}
+        flags = {name: bool(pattern.search(variants[kind])) for name, (pattern, kind) in _FLAG_PATTERNS.items()}
+        return {
+            "text": text,
+            "words": len(tokens),
+            "sentences": len(re.split(r"(?<=[.!?])\s+", stripped)) if stripped else 0,
+            "open_ending": bool(stripped) and stripped[-1] not in ".!?",
+            "tokens": Counter(tokens),
+            "index": index,
+            "flags": flags,
+            "ngrams": ngram_counts(text) if EXEMPLAR_SIGNAL else None,
+        }
+
+    def _apply(self, para: dict[str, Any], sign: int) -> None:
+        for tok, n in para["tokens"].items():
+            self._token_counts[tok] += sign * n
+            if self._token_counts[tok] <= 0:
+                del self._token_counts[tok]
+        self._totals["words"] += sign * para["words"]
+        self._totals["sentences"] += sign * para["sentences"]
+        if para["sentences"]:
+            self._totals["open_endings"] += sign * int(para["open_ending"])
+        for name, hit in para["flags"].items():
+            self._totals[name] += sign * int(hit)
+        if para["ngrams"] is not None:
+            self._ngrams += sign * para["ngrams"]
+
+    def _replace(self, start: int, end: int, texts: list[str]) -> None:
+        removed = self._paragraphs[start:end]
+        reusable = {p["text"]: p for p in removed}
+        replacement = [reusable.pop(text, None) or self._analyze(text) for text in texts]
+        for para in removed:
+            self._apply(para, -1)
+        for para in replacement:
+            self._apply(para, 1)
+        self._paragraphs[start:end] = replacement
+
+    def splice(self, start: int, end: int, paragraphs: list[str]) -> None:
+        start = max(0, min(start, len(self._paragraphs)))
+        end = max(start, min(end, len(self._paragraphs)))
+        pieces = [piece for p in paragraphs for piece in split_paragraphs(p)]
+        self._replace(start, end, [text for text, _ in pieces])
+        # Spliced paragraphs are joined to their neighbours by a blank line; the last one has no separator.
+        self._seps[start:end] = [sep for _, sep in pieces]
+        self._seps = [sep or "\n\n" for sep in self._seps]
+        if self._seps:
+            self._seps[-1] = ""
+
+    def update_text(self, text: str) -> None:
+        incoming = split_paragraphs(text)
+        texts = [t for t, _ in incoming]
+        old = [p["text"] for p in self._paragraphs]
+        # Keep the common prefix and suffix; only the middle block is re-analyzed.
+        prefix = 0
+        while prefix < min(len(old), len(texts)) and old[prefix] == texts[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < min(len(old), len(texts)) - prefix and old[len(old) - 1 - suffix] == texts[len(texts) - 1 - suffix]:
+            suffix += 1
+        self._replace(prefix, len(old) - suffix, texts[prefix : len(texts) - suffix])
+        self._seps = [sep for _, sep in incoming]
+
+    def _sentence_count(self) -> int:
+        # Paragraphs that do not end in terminal punctuation merge with the next one when split on the joined text.
+        count = self._totals["sentences"] - self._totals["open_endings"]
+        for para in reversed(self._paragraphs):
+            if para["sentences"]:
+                return count + int(para["open_ending"])
+        return count
+
+    def _has_greeting(self) -> bool:
+        if self._totals["greeting"] > 0:
+            return True
+        # The joined text is stripped before the greeting check, so the first paragraph may start after whitespace.
+        for para in self._paragraphs:
+            if para["sentences"]:
+                return para["flags"]["greeting_lead"]
+        return False
+
+    def _match(self, terms: list[str], phrases: list[str]) -> list[dict[str, Any]]:
+        # TextIndex.match_terms over the joined text, assembled from each paragraph's cached index. Coverage
+        # phrases are word pairs, so the only phrase a paragraph break can split is last word + first word.
+        matches: list[dict[str, Any]] = []
+        pairs = [(phrase, [light_stem(w) for w in phrase.lower().split()]) for phrase in phrases]
+        offset = 0
+        last: tuple[str, int] | None = None
+        for para, sep in zip(self._paragraphs, self._seps):
+            index = para["index"]
+            for m in index.match_terms(terms, phrases=phrases):
+                matches.append({"term": m["term"], "start": m["start"] + offset, "end": m["end"] + offset})
+            if len(index):
+                first_stem, _, first_end = index.token(0)
+                if last is not None:
+                    for phrase, stems in pairs:
+                        if stems == [last[0], first_stem]:
+                            matches.append({"term": phrase, "start": last[1], "end": first_end + offset})
+                last_stem, last_start, _ = index.token(-1)
+                last = (last_stem, last_start + offset)
+            offset += len(para["text"]) + len(sep)
+        matches.sort(key=lambda x: (x["start"], -x["end"]))
+        return matches
+
+    def _checks(self) -> dict[str, Any]:
+        wc = self._totals["words"]
+        checks: dict[str, Any] = {
+            "word_count": wc,
+            "min_words_required": self._min_words,
+            "meets_min_words": wc >= self._min_words,
+        }
+        if self._task_type == "email":
+            checks["email_format"] = {
+                "has_subject_line": self._totals["subject_line"] > 0,
+                "has_greeting": self._has_greeting(),
+                "has_signoff": self._totals["signoff"] > 0,
+            }
+        checks.update(coverage_checks(self._task_type, self._targets, self._match))
+        if EXEMPLAR_SIGNAL:
+            similarity = exemplar_index.similarity_from_counts(self.prompt, self._ngrams)
+            if similarity is not None:
+                checks["topic_similarity"] = similarity
+        return checks
+
+    def state(self) -> dict[str, Any]:
+        checks = self._checks()
+        signals = {
+            "sentence_count": self._sentence_count(),
+            "has_paragraph_break": len(self._paragraphs) > 1,
+            "has_transition": self._totals["transition"] > 0,
+            "unique_words": len(self._token_counts),
+            "has_polite_register": self._totals["polite"] > 0,
+            "has_stance_marker": self._totals["stance"] > 0,
+        }
+        rubric = score_rubric(self.prompt, "", checks, signals=signals)
+        return {
+            "rule_checks": checks,
+            "rubric_scores": rubric,
+            "overall_score": round(sum(rubric.values()) / len(rubric), 2),
+        }
+
+    def delta(self) -> dict[str, Any]:
+        current = self.state()
+        out: dict[str, Any] = {}
+        for section in ("rule_checks", "rubric_scores"):
+            before = self._last_state.get(section, {})
+            changed = {k: v for k, v in current[section].items() if before.get(k) != v}
+            if changed:
+                out[section] = changed
+        if current["overall_score"] != self._last_state.get("overall_score"):
+            out["overall_score"] = current["overall_score"]
+        self._last_state = current
+        return out
@@ -0,0 +1,89 @@
+import math
+import threading
+from collections import deque
+from typing import Any, Callable
+
+
+class Histogram:
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._recent: deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._recent.append(value)
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return None
+        idx = min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))
+        return samples[idx]
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": self.max if self.count else None,
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._histograms: dict[str, Histogram] = {}
+        self._gauges: dict[str, Callable[[], Any]] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def counter(self, name: str) -> float:
+        return self._counters.get(name, 0)
+
+    def histogram(self, name: str) -> Histogram:
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            return hist
+
+    def observe(self, name: str, value: float) -> None:
+        self.histogram(name).observe(value)
+
+    def register_gauge(self, name: str, fn: Callable[[], Any]) -> None:
+        self._gauges[name] = fn
+
+    def ratio(self, hits: str, misses: str) -> float | None:
+        h, m = self.counter(hits), self.counter(misses)
+        return round(h / (h + m), 4) if h + m else None
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+        gauges: dict[str, Any] = {}
+        for name, fn in self._gauges.items():
+            try:
+                gauges[name] = fn()
+            except Exception:
+                gauges[name] = None
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": {name: h.snapshot() for name, h in sorted(histograms.items())},
+        }
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,116 @@
+import hashlib
+import heapq
+import os
+import random
+import re
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from .metrics import metrics
+from .text_index import STOPWORDS, light_stem
+
+_WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+# Short function words carry no topic, and paraphrases swap them freely ("did you" / "have you").
+_FUNCTION_WORDS = STOPWORDS | {
+    "the", "and", "for", "are", "was", "were", "you", "your", "our", "his", "her", "its", "did", "has", "had",
+    "can", "yet", "not", "but", "all", "any", "how", "why", "who", "may", "i'm", "i've", "we're",
+}
+_PRIME = (1 << 61) - 1
+
+
+def shingles(prompt: str, answer: str) -> set[str]:
+    out: set[str] = set()
+    for side, text in (("p", prompt), ("a", answer)):
+        for tok in _WORD_RE.findall((text or "").lower()):
+            if len(tok) >= 3 and tok not in _FUNCTION_WORDS:
+                out.add(f"{side}:{light_stem(tok)}")
+    return out
+
+
+# MinHash signatures over content-stem shingles of prompt and answer, banded for LSH lookups.
+# Candidates from shared buckets are confirmed by signature agreement (an estimate of Jaccard similarity).
+class NearDuplicateIndex:
+    def __init__(self, max_items: int = 5000, threshold: float = 0.6, bands: int = 16, rows: int = 4):
+        self.max_items = max_items
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        rng = random.Random(1337)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(bands * rows)]
+        self._lock = threading.Lock()
+        self._items: OrderedDict[int, dict[str, Any]] = OrderedDict()
+        self._buckets: dict[tuple[int, int], set[int]] = {}
+        self._next_id = 0
+
+    def signature(self, prompt: str, answer: str) -> tuple[int, ...] | None:
+        hashed = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+            for s in shingles(prompt, answer)
+        ]
+        if not hashed:
+            return None
+        return tuple(min((a * x + b) % _PRIME for x in hashed) for a, b in self._perms)
+
+    def _band_keys(self, sig: tuple[int, ...]) -> list[tuple[int, int]]:
+        r = self.rows
+        return [(band, hash(sig[band * r : band * r + r])) for band in range(self.bands)]
+
+    def _best_match(self, sig: tuple[int, ...]) -> tuple[int | None, float]:
+        candidates: set[int] = set()
+        for key in self._band_keys(sig):
+            candidates.update(self._buckets.get(key, ()))
+        best, best_sim = None, 0.0
+        for item_id in candidates:
+            other = self._items[item_id]["sig"]
+            sim = sum(1 for x, y in zip(sig, other) if x == y) / len(sig)
+            if sim > best_sim:
+                best, best_sim = item_id, sim
+        return best, best_sim
+
+    def is_near_duplicate(self, prompt: str, answer: str) -> bool:
+        sig = self.signature(prompt, answer)
+        if sig is None:
+            return False
+        with self._lock:
+            best, sim = self._best_match(sig)
+            if best is None or sim < self.threshold:
+                return False
+            # Stems the model keeps paraphrasing rank first in the avoid hint.
+            self._items[best]["hits"] += 1
+        metrics.inc("sentence_near_dup.rejected")
+        return True
+
+    def add(self, prompt: str, answer: str) -> None:
+        sig = self.signature(prompt, answer)
+        if sig is None:
+            return
+        with self._lock:
+            item_id = self._next_id
+            self._next_id += 1
+            self._items[item_id] = {"stem": prompt.strip(), "sig": sig, "hits": 0}
+            for key in self._band_keys(sig):
+                self._buckets.setdefault(key, set()).add(item_id)
+            while len(self._items) > self.max_items:
+                old_id, old = self._items.popitem(last=False)
+                for key in self._band_keys(old["sig"]):
+                    bucket = self._buckets.get(key)
+                    if bucket is not None:
+                        bucket.discard(old_id)
+                        if not bucket:
+                            del self._buckets[key]
+
+    def avoid_stems(self, limit: int = 30) -> list[str]:
+        with self._lock:
+            ranked = heapq.nlargest(limit, self._items.items(), key=lambda kv: (kv[1]["hits"], kv[0]))
+            return [item["stem"] for _, item in ranked]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+near_duplicate_index = NearDuplicateIndex(
+    max_items=int(os.getenv("SENTENCE_NEAR_DUP_WINDOW", "5000")),
+    threshold=float(os.getenv("SENTENCE_NEAR_DUP_THRESHOLD", "0.6")),
+)
+metrics.register_gauge("sentence_near_dup.indexed", lambda: len(near_duplicate_index))
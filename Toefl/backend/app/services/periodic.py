@@ -0,0 +1,45 @@
+import logging
+import threading
+from typing import Callable
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    def __init__(self, name: str, interval: float, fn: Callable[[], None]):
+        self.name = name
+        self._interval = interval
+        self._fn = fn
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._fn()
+            except Exception:
+                metrics.inc(f"{self.name}.errors")
+                logger.exception("Periodic task %s failed", self.name)
+            self._wake.wait(self._interval)
+            self._wake.clear()
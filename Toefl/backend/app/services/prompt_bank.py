@@ -0,0 +1,145 @@
+import json
+import mmap
+import os
+import struct
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+
+from .prompt_index import TASK_CODES
+
+# Compact prompt bank written by scripts/ingest_pdf.py next to prompts.json:
+#   header | records (compact UTF-8 JSON, back to back) | offset index | prompt ids (newline separated)
+# Only the header, the index and the ids are read at startup; a record is decoded when it is accessed.
+# The file is mapped read-only, so every worker on the host shares the same page-cache pages.
+_MAGIC = b"TPBANK01"
+_HEADER = struct.Struct("<8sIQQQ")  # magic, count, index offset, ids offset, ids length
+_INDEX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4"), ("task", "u1"), ("pad", "V3")])
+
+
+class PromptBankWriter:
+    # Streams records as they arrive; the index and ids go after them and the header is patched on close.
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        self._fh = open(self._tmp, "wb")
+        self._fh.write(bytes(_HEADER.size))
+        self._index: list[tuple[int, int, int, bytes]] = []
+        self._ids: list[str] = []
+
+    def write(self, prompt: dict[str, Any]) -> None:
+        record = json.dumps(prompt, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._index.append((self._fh.tell(), len(record), TASK_CODES.get(prompt.get("task_type"), 0), b""))
+        self._fh.write(record)
+        # Ids are newline separated, so they must not contain one.
+        self._ids.append(str(prompt.get("prompt_id") or "").replace("\n", " "))
+        self.count += 1
+
+    def close(self) -> None:
+        index_offset = self._fh.tell()
+        self._fh.write(np.array(self._index, dtype=_INDEX_DTYPE).tobytes())
+        ids = "\n".join(self._ids).encode("utf-8")
+        ids_offset = self._fh.tell()
+        self._fh.write(ids)
+        self._fh.seek(0)
+        self._fh.write(_HEADER.pack(_MAGIC, self.count, index_offset, ids_offset, len(ids)))
+        self._fh.close()
+        self._tmp.replace(self.path)
+
+    def abort(self) -> None:
+        self._fh.close()
+        self._tmp.unlink(missing_ok=True)
+
+    def __enter__(self) -> "PromptBankWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class PromptBank(Sequence):
+    # Read-only prompt sequence with id and task-type lookups that never decode records. Backed either by
+    # a mapped bank file or, for prompts.json, by the already parsed list.
+    def __init__(self, ids: list[str], task_codes: np.ndarray, records: list[dict[str, Any]] | None = None):
+        self.ids = ids
+        self.task_codes = task_codes
+        self._records = records
+        # A repeated id resolves to its first occurrence, as a linear scan of prompts.json would.
+        self._positions: dict[str, int] = {}
+        for i, pid in enumerate(ids):
+            if pid:
+                self._positions.setdefault(pid, i)
+        self._map: mmap.mmap | None = None
+        self._index: np.ndarray | None = None
+        self.source = "json" if records is not None else "empty"
+
+    @classmethod
+    def from_prompts(cls, prompts: Iterable[dict[str, Any]]) -> "PromptBank":
+        records = list(prompts)
+        ids = [str(p.get("prompt_id") or "") for p in records]
+        codes = np.array([TASK_CODES.get(p.get("task_type"), 0) for p in records], dtype=np.int8)
+        return cls(ids, codes, records)
+
+    @classmethod
+    def open(cls, path: Path) -> "PromptBank":
+        with open(path, "rb") as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mm) < _HEADER.size:
+            mm.close()
+            raise ValueError(f"{path} is not a prompt bank")
+        magic, count, index_offset, ids_offset, ids_length = _HEADER.unpack_from(mm, 0)
+        if magic != _MAGIC or ids_offset + ids_length > len(mm):
+            mm.close()
+            raise ValueError(f"{path} is not a prompt bank")
+        index = np.frombuffer(mm, dtype=_INDEX_DTYPE, count=count, offset=index_offset)
+        ids = mm[ids_offset : ids_offset + ids_length].decode("utf-8").split("\n") if count else []
+        bank = cls(ids, index["task"].astype(np.int8))
+        bank._map, bank._index = mm, index
+        bank.source = "mmap"
+        return bank
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if self._records is not None:
+            return self._records[i]
+        offset, length = int(self._index["offset"][i]), int(self._index["length"][i])
+        return json.loads(self._map[offset : offset + length])
+
+    def position(self, prompt_id: str) -> int | None:
+        return self._positions.get(prompt_id) if prompt_id else None
+
+    def get(self, prompt_id: str) -> dict[str, Any] | None:
+        i = self.position(prompt_id)
+        return None if i is None else self[i]
+
+    def indices(self, task_type: str) -> list[int]:
+        return np.flatnonzero(self.task_codes == TASK_CODES.get(task_type, -1)).tolist()
+
+    def select(self, indices: list[int]) -> "PromptView":
+        return PromptView(self, indices)
+
+
+class PromptView(Sequence):
+    # A subset of a bank (for random.choice / random.sample) that decodes only the records it hands out.
+    def __init__(self, bank: PromptBank, indices: list[int]):
+        self.bank = bank
+        self.indices = indices
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.bank[j] for j in self.indices[i]]
+        return self.bank[self.indices[i]]
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from .grading import score_rubric, validate_rules
+from .text_index import content_terms
+
+logger = logging.getLogger(__name__)
+
+# Offline enrichment for scripts/ingest_pdf.py --enrich: a validated model answer and a keyword profile
+# per prompt, generated once and stored in the prompt record. Bump ENRICH_VERSION when the request or the
+# validation changes so checkpointed answers are regenerated.
+ENRICH_VERSION = 1
+ENRICH_MODEL_URL = os.getenv("ENRICH_MODEL_URL", "https://api.openai.com/v1/chat/completions")
+ENRICH_MODEL = os.getenv("ENRICH_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+MIN_KEYWORDS = 6
+MAX_KEYWORDS = 12
+ANSWER_WORDS = {"email": (80, 220), "discussion": (100, 260)}
+# Heuristic Task Fulfillment a model email must reach; discussion checks are all required outright.
+MIN_EMAIL_TASK_SCORE = 4.0
+_KEYWORD_RE = re.compile(r"^[a-z][a-z' -]{1,40}$")
+_TASK_FIELDS = ("task_type", "to_field", "subject", "bullet_points", "professor_prompt", "student_posts")
+
+
+def enrichment_key(prompt: dict[str, Any]) -> str:
+    # Keyed by what the answer depends on, not the prompt id, so renumbered or re-namespaced prompts reuse it.
+    task = {k: prompt.get(k) for k in _TASK_FIELDS}
+    task["raw_text"] = prompt.get("raw_text")
+    blob = json.dumps([ENRICH_VERSION, task], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def format_model_answer(prompt: dict[str, Any], body: str) -> str:
+    body = (body or "").strip()
+    if prompt.get("task_type") != "email" or re.match(r"(?i)^to\s*:", body):
+        return body
+    # Same header layout as the request-time sample.
+    return (
+        f"To: {prompt.get('to_field') or 'Program Coordinator'}\n"
+        f"Subject: {prompt.get('subject') or 'Response to Your Request'}\n\n{body}"
+    )
+
+
+def answer_problems(prompt: dict[str, Any], answer: str) -> list[str]:
+    # A model answer is kept only if the heuristic grader would treat it as a complete response.
+    checks = validate_rules(prompt, answer)
+    problems = []
+    low, high = ANSWER_WORDS.get(prompt.get("task_type") or "", (80, 260))
+    if not low <= checks["word_count"] <= high:
+        problems.append(f"{checks['word_count']} words")
+    if prompt.get("task_type") == "email":
+        fmt = checks.get("email_format", {})
+        if not checks.get("all_bullets_covered", True):
+            problems.append("misses a bullet point")
+        if not fmt.get("has_greeting") or not fmt.get("has_signoff"):
+            problems.append("no greeting or sign-off")
+        task_score = score_rubric(prompt, answer, checks)["Task Fulfillment"]
+        if task_score < MIN_EMAIL_TASK_SCORE:
+            problems.append(f"task fulfillment {task_score}")
+    else:
+        if not checks.get("responds_to_professor"):
+            problems.append("does not answer the professor")
+        if prompt.get("student_posts") and not checks.get("references_or_builds_on_peers"):
+            problems.append("ignores the student posts")
+    return problems
+
+
+def keyword_profile(keywords: Any, answer: str) -> list[str]:
+    out: list[str] = []
+    for kw in keywords if isinstance(keywords, list) else []:
+        kw = re.sub(r"\s+", " ", str(kw or "").strip().lower())
+        if _KEYWORD_RE.match(kw) and kw not in out:
+            out.append(kw)
+    # Topped up from the answer body (not the To/Subject header) when the model returns few usable keywords.
+    body = re.sub(r"(?im)^\s*(to|subject)\s*:.*$", "", answer)
+    for term in content_terms(body, min_len=5):
+        if len(out) >= MIN_KEYWORDS:
+            break
+        if term not in out:
+            out.append(term)
+    return out[:MAX_KEYWORDS]
+
+
+def _extract_json_array(text: str) -> list[Any]:
+    text = (text or "").strip()
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end == -1:
+        return []
+    try:
+        data = json.loads(text[start : end + 1])
+    except ValueError:
+        return []
+    return data if isinstance(data, list) else []
+
+
+class RateLimiter:
+    # Spaces requests evenly: at most `per_minute` calls start in any minute, across all threads.
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next_at)
+            self._next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+class PromptEnricher:
+    # Streams prompts through batched, rate-limited model calls. Every accepted answer is appended to an
+    # NDJSON checkpoint as soon as it is validated, so an interrupted run resumes where it stopped and
+    # unchanged prompts are never sent again.
+    def __init__(
+        self,
+        checkpoint: Path,
+        model: str = ENRICH_MODEL,
+        url: str = ENRICH_MODEL_URL,
+        api_key: str | None = None,
+        batch_size: int = 5,
+        concurrency: int = 2,
+        per_minute: float = 30,
+        max_attempts: int = 2,
+        timeout: float = 90,
+    ):
+        self.model = model
+        self.url = url
+        self.api_key = api_key
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.timeout = timeout
+        self.limiter = RateLimiter(per_minute)
+        self.summary = {"reused": 0, "generated": 0, "failed": 0, "calls": 0}
+        self._lock = threading.Lock()
+        self._done: dict[str, dict[str, Any]] = {}
+        checkpoint.parent.mkdir(parents=True, exist_ok=True)
+        if checkpoint.exists():
+            with open(checkpoint, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by an interrupted run
+                    if entry.get("version") == ENRICH_VERSION and entry.get("model_answer"):
+                        self._done[entry["key"]] = entry
+        self._fh = open(checkpoint, "a", encoding="utf-8")
+        if self._fh.tell() and not checkpoint.read_bytes().endswith(b"\n"):
+            self._fh.write("\n")
+
+    def _request(self, prompts: list[dict[str, Any]]) -> dict[int, dict[str, Any]]:
+        tasks = []
+        for i, p in enumerate(prompts):
+            task = {"id": i, **{k: p.get(k) for k in _TASK_FIELDS if p.get(k)}}
+            task["raw_text"] = str(p.get("raw_text") or "")[:2000]
+            tasks.append(task)
+        instruction = (
+            "Write a model answer scoring 5/5 for each TOEFL writing task below, plus 6-10 keywords or short "
+            "phrases that a strong answer to that task would use. Emails: 120-180 words, start with a greeting to "
+            "the recipient, address every bullet point in order, end with a sign-off; write the body only. "
+            "Academic discussions: 120-180 words, answer the professor's question with a clear opinion and "
+            "build on at least one student's post by name. "
+            'Return ONLY a JSON array of objects with keys "id", "model_answer", "keywords".\n'
+            f"Tasks: {json.dumps(tasks, ensure_ascii=False)}"
+        )
+        body = {
+            "model": self.model,
+            "temperature": 0.4,
+            "messages": [
+                {"role": "system", "content": "You are an expert TOEFL writing tutor. Return strict JSON only."},
+                {"role": "user", "content": instruction},
+            ],
+        }
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        req = urllib.request.Request(self.url, data=json.dumps(body).encode("utf-8"), headers=headers, method="POST")
+        self.limiter.wait()
+        with self._lock:
+            self.summary["calls"] += 1
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            payload = json.loads(resp.read().decode("utf-8"))
+        items = _extract_json_array(payload["choices"][0]["message"]["content"])
+        return {item["id"]: item for item in items if isinstance(item, dict) and isinstance(item.get("id"), int)}
+
+    def _record(self, key: str, prompt: dict[str, Any], item: dict[str, Any]) -> bool:
+        answer = format_model_answer(prompt, str(item.get("model_answer") or ""))
+        problems = answer_problems(prompt, answer)
+        if problems:
+            logger.info("Rejected model answer for %s: %s", prompt.get("prompt_id"), ", ".join(problems))
+            return False
+        entry = {
+            "key": key,
+            "version": ENRICH_VERSION,
+            "model": self.model,
+            "model_answer": answer,
+            "keywords": keyword_profile(item.get("keywords"), answer),
+        }
+        with self._lock:
+            self._done[key] = entry
+            self._fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._fh.flush()
+            self.summary["generated"] += 1
+        return True
+
+    def _run_batch(self, batch: list[tuple[str, dict[str, Any]]]) -> None:
+        # Prompts whose answer is missing or fails validation are sent again on the next attempt.
+        pending = batch
+        for _ in range(self.max_attempts):
+            try:
+                items = self._request([p for _, p in pending])
+            except Exception as exc:
+                logger.warning("Enrichment request for %s prompts failed: %s", len(pending), exc)
+                items = {}
+            pending = [(key, p) for i, (key, p) in enumerate(pending) if not (i in items and self._record(key, p, items[i]))]
+            if not pending:
+                return
+        with self._lock:
+            self.summary["failed"] += len(pending)
+
+    def enrich(self, prompts: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        # Works through a bounded window at a time, so the output order and memory use match the input stream.
+        window = self.batch_size * self.concurrency * 2
+        it = iter(prompts)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while chunk := list(islice(it, window)):
+                keyed = [(enrichment_key(p), p) for p in chunk]
+                missing = list({key: (key, p) for key, p in keyed if key not in self._done}.values())
+                reused = len(keyed) - sum(1 for key, _ in keyed if key not in self._done)
+                with self._lock:
+                    self.summary["reused"] += reused
+                batches = [missing[i : i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+                list(pool.map(self._run_batch, batches))
+                for key, prompt in keyed:
+                    entry = self._done.get(key)
+                    if entry:
+                        prompt = {**prompt, "model_answer": entry["model_answer"], "keywords": entry["keywords"]}
+                    yield prompt
+
+    def close(self) -> dict[str, int]:
+        self._fh.close()
+        return self.summary
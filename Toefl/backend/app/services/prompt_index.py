@@ -0,0 +1,175 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .embeddings import EMBEDDING_DIM, LocalHashEmbedding
+from .metrics import metrics
+
+try:
+    import chromadb
+except ImportError:
+    chromadb = None
+
+logger = logging.getLogger(__name__)
+
+PROMPT_INDEX_DIR = Path(
+    os.getenv("PROMPT_INDEX_DIR", str(Path(__file__).resolve().parents[3] / "data" / "prompts" / "chroma"))
+)
+COLLECTION_NAME = "toefl_prompts"
+# Email variants built from the same templates share a lot of boilerplate (about 0.5-0.8 cosine),
+# so only near-restatements of an already served prompt are rejected by default.
+VARIANT_MAX_SIMILARITY = float(os.getenv("PROMPT_VARIANT_MAX_SIMILARITY", "0.9"))
+
+
+TASK_CODES = {"email": 1, "discussion": 2}
+
+
+def _task_codes(meta: list[dict[str, Any]]) -> np.ndarray:
+    return np.array([TASK_CODES.get(m["task_type"], 0) for m in meta], dtype=np.int8)
+
+
+def prompt_text(prompt: dict[str, Any]) -> str:
+    parts = [
+        prompt.get("subject") or "",
+        " ".join(str(b) for b in prompt.get("bullet_points") or []),
+        prompt.get("professor_prompt") or "",
+        prompt.get("raw_text") or "",
+    ]
+    return " ".join(p for p in parts if p)
+
+
+class PromptIndex:
+    # The prompt bank as one normalized float32 matrix: a k-NN query is a single matrix-vector product
+    # plus argpartition. Vectors come from the Chroma index written by scripts/ingest_pdf.py; if that is
+    # missing, the bank is embedded in-process with the same (deterministic) embedding.
+    def __init__(self, chroma_dir: Path = PROMPT_INDEX_DIR):
+        self.chroma_dir = chroma_dir
+        # Re-entrant: the first bank load imports prompt_store, whose initial reload calls invalidate().
+        self._lock = threading.RLock()
+        self._loaded = False
+        # (embedding, matrix, ids, meta, task_codes, source), replaced as a whole on reload so a query
+        # running concurrently always sees one consistent load.
+        self._data: tuple = (
+            LocalHashEmbedding(EMBEDDING_DIM),
+            np.zeros((0, EMBEDDING_DIM), dtype=np.float32),
+            [],
+            [],
+            np.zeros(0, dtype=np.int8),
+            "empty",
+        )
+
+    @property
+    def source(self) -> str:
+        return self._data[5]
+
+    def _load_chroma(self) -> tuple | None:
+        if chromadb is None or not self.chroma_dir.exists():
+            return None
+        try:
+            client = chromadb.PersistentClient(path=str(self.chroma_dir))
+            collection = client.get_collection(COLLECTION_NAME)
+            data = collection.get(include=["embeddings", "metadatas"])
+        except Exception:
+            logger.warning("Could not read prompt index at %s; embedding the prompt bank instead.", self.chroma_dir)
+            return None
+        if not data["ids"]:
+            return None
+        dim = int((collection.metadata or {}).get("embedding_dim") or EMBEDDING_DIM)
+        matrix = np.asarray(data["embeddings"], dtype=np.float32).reshape(len(data["ids"]), dim)
+        meta = [{"title": (m or {}).get("title"), "task_type": (m or {}).get("task_type")} for m in data["metadatas"]]
+        return LocalHashEmbedding(dim), matrix, list(data["ids"]), meta, _task_codes(meta), "chroma"
+
+    def _load_bank(self) -> tuple:
+        # Imported here: prompt_store itself uses this module for variant dedup.
+        from .prompt_store import prompt_store
+
+        prompts = [p for p in prompt_store.all_prompts() if p.get("prompt_id")]
+        # Same document text as the Chroma index (the raw prompt), so both sources rank alike.
+        embedding = LocalHashEmbedding(EMBEDDING_DIM)
+        matrix = embedding.embed([p.get("raw_text") or "" for p in prompts])
+        ids = [str(p["prompt_id"]) for p in prompts]
+        meta = [{"title": p.get("title"), "task_type": p.get("task_type")} for p in prompts]
+        return embedding, matrix, ids, meta, _task_codes(meta), "bank"
+
+    def ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            started = time.perf_counter()
+            self._data = self._load_chroma() or self._load_bank()
+            self._loaded = True
+            metrics.observe("prompt_index.load_seconds", time.perf_counter() - started)
+            logger.info("Prompt index loaded from %s: %s prompts", self.source, len(self))
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded = False
+
+    def search(
+        self, text: str, k: int = 5, task_type: str | None = None, exclude: set[str] | None = None
+    ) -> list[dict[str, Any]]:
+        self.ensure_loaded()
+        started = time.perf_counter()
+        embedding, matrix, ids, meta, task_codes, _ = self._data
+        if not ids:
+            return []
+        scores = matrix @ embedding.embed([text])[0]
+        if task_type:
+            scores = np.where(task_codes == TASK_CODES.get(task_type, -1), scores, -np.inf)
+        # Over-fetch a little so excluded ids do not leave the result short.
+        want = min(len(ids), k + len(exclude or ()))
+        top = np.argpartition(scores, len(ids) - want)[len(ids) - want :]
+        top = top[np.argsort(-scores[top])]
+        out = []
+        for i in top:
+            if not np.isfinite(scores[i]) or (exclude and ids[i] in exclude):
+                continue
+            out.append({"prompt_id": ids[i], **meta[i], "score": round(float(scores[i]), 4)})
+            if len(out) >= k:
+                break
+        metrics.observe("prompt_index.query_seconds", time.perf_counter() - started)
+        return out
+
+    def __len__(self) -> int:
+        return len(self._data[2])
+
+
+class ServedPromptWindow:
+    # Vectors of the last `size` served prompts in a ring buffer; one product answers "too close to any?".
+    def __init__(self, size: int = 2000, threshold: float = VARIANT_MAX_SIMILARITY):
+        self.threshold = threshold
+        self.embedding = LocalHashEmbedding(EMBEDDING_DIM)
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((size, EMBEDDING_DIM), dtype=np.float32)
+        self._count = 0
+
+    def similarity(self, prompt: dict[str, Any]) -> float:
+        # Highest cosine to any prompt in the window.
+        vec = self.embedding.embed([prompt_text(prompt)])[0]
+        with self._lock:
+            filled = self._vectors[: min(self._count, len(self._vectors))]
+            return float((filled @ vec).max()) if len(filled) else 0.0
+
+    def too_similar(self, prompt: dict[str, Any]) -> bool:
+        if self.similarity(prompt) >= self.threshold:
+            metrics.inc("prompt_index.variants_rejected")
+            return True
+        return False
+
+    def remember(self, prompt: dict[str, Any]) -> None:
+        vec = self.embedding.embed([prompt_text(prompt)])[0]
+        with self._lock:
+            self._vectors[self._count % len(self._vectors)] = vec
+            self._count += 1
+
+
+prompt_index = PromptIndex()
+served_email_window = ServedPromptWindow()
+metrics.register_gauge("prompt_index.size", lambda: len(prompt_index))
@@ -1,5 +1,6 @@
 import json
 import hashlib
+import logging
 import os
 import random
 import re
@@ -8,7 +9,20 @@ import uuid
 from collections import deque
 from pathlib import Path
 
+from .exemplar_similarity import exemplar_index
+from .metrics import metrics
+from .prompt_bank import PromptBank
+from .prompt_index import prompt_index, served_email_window
+
+logger = logging.getLogger(__name__)
+
 PROMPTS_JSON_PATH = Path(__file__).resolve().parents[3] / "data" / "prompts" / "prompts.json"
+# Written by scripts/ingest_pdf.py after the bank itself; its version changes only when the sources do.
+PROMPTS_META_PATH = PROMPTS_JSON_PATH.with_name("prompts.meta.json")
+# Binary copy of prompts.json (see prompt_bank.py); mapped instead of parsed unless PROMPT_BANK_MMAP=0.
+PROMPTS_BANK_PATH = PROMPTS_JSON_PATH.with_name("prompts.bank")
+PROMPT_BANK_MMAP = os.getenv("PROMPT_BANK_MMAP", "1") != "0"
+EMAIL_FALLBACK_ATTEMPTS = 16
 RECIPIENT_POOL = [
     "Professor Alvarez",
     "Professor Singh",
@@ -187,7 +201,7 @@ TOEFL_EMAIL_ACTIONS = [
 
 class PromptStore:
     def __init__(self):
-        self._prompts = []
+        self._bank = PromptBank.from_prompts([])
         self._runtime_prompts: dict[str, dict] = {}
         self._email_pool: list[dict] = []
         self._seen_email_signatures: set[str] = set()
@@ -200,6 +214,8 @@ class PromptStore:
         self._recent_topic_set: set[str] = set()
         self._max_recent_topics = 200
         self._monitored_person_names = self._build_monitored_name_set()
+        self._bank_stat: tuple | None = None
+        self.bank_version: str | None = None
         self.reload()
 
     def _generate_global_name_pool_llm(self, count: int = 400) -> list[str]:
@@ -261,26 +277,62 @@ class PromptStore:
             sampled.update(t.lower() for t in re.findall(r"[a-zA-Z]{3,}", recipient))
         return sampled
 
+    def _file_stat(self, path: Path) -> tuple | None:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
     def reload(self):
-        if PROMPTS_JSON_PATH.exists():
-            self._prompts = json.loads(PROMPTS_JSON_PATH.read_text(encoding="utf-8"))
-        else:
-            self._prompts = []
+        # Called per request, so it only stats files: the bank is re-read when the ingest version stamp
+        # changes, or, for banks written without one, when prompts.json itself changes.
+        stat = (
+            self._file_stat(PROMPTS_META_PATH),
+            self._file_stat(PROMPTS_JSON_PATH),
+            self._file_stat(PROMPTS_BANK_PATH) if PROMPT_BANK_MMAP else None,
+        )
+        if stat == self._bank_stat:
+            return
+        version = None
+        if stat[0] is not None:
+            try:
+                version = json.loads(PROMPTS_META_PATH.read_text(encoding="utf-8")).get("version")
+            except (OSError, ValueError):
+                version = None
+        self._bank_stat = stat
+        if version is not None and version == self.bank_version:
+            return
+        self._bank = self._load_bank(stat[1], stat[2])
+        self.bank_version = version
+        prompt_index.invalidate()
+        exemplar_index.invalidate()
+
+    def _load_bank(self, json_stat: tuple | None, bank_stat: tuple | None) -> PromptBank:
+        # The binary bank is written right after prompts.json; an older one means the JSON was edited by hand.
+        if bank_stat is not None and (json_stat is None or bank_stat[0] >= json_stat[0]):
+            try:
+                return PromptBank.open(PROMPTS_BANK_PATH)
+            except (OSError, ValueError):
+                logger.warning("Could not map %s; loading %s instead.", PROMPTS_BANK_PATH, PROMPTS_JSON_PATH)
+        if json_stat is None:
+            return PromptBank.from_prompts([])
+        return PromptBank.from_prompts(json.loads(PROMPTS_JSON_PATH.read_text(encoding="utf-8")))
+
+    def all_prompts(self) -> list[dict]:
+        return list(self._bank)
 
     def get_prompt_by_id(self, prompt_id: str):
         if prompt_id in self._runtime_prompts:
             return self._runtime_prompts[prompt_id]
-        for prompt in self._prompts:
-            if prompt.get("prompt_id") == prompt_id:
-                return prompt
+        prompt = self._bank.get(prompt_id)
+        if prompt is not None:
+            return prompt
         # Fallback for generated runtime ids after process restart:
         # gen-{task_type}-{base_prompt_id}-{8hex}
         m = re.match(r"^gen-(email|discussion)-(.+)-[0-9a-f]{8}$", prompt_id or "")
         if m:
-            base_prompt_id = m.group(2)
-            for prompt in self._prompts:
-                if str(prompt.get("prompt_id")) == base_prompt_id:
-                    return prompt
+            return self._bank.get(m.group(2))
         return None
 
     def _make_email_variant(self, base: dict) -> dict:
@@ -648,7 +700,8 @@ class PromptStore:
                 "Connect your argument to a real-world example.",
             ]
         )
-        if professor_prompt:
+        # An enriched prompt keeps its question as written, so the precomputed answer still fits it.
+        if professor_prompt and not base.get("model_answer"):
             professor_prompt = f"{professor_prompt} {add_on}"
         variant["professor_prompt"] = professor_prompt
         variant["student_posts"] = posts
@@ -656,18 +709,42 @@ class PromptStore:
         return variant
 
     def source_ids_by_type(self, task_type: str) -> list[str]:
-        base_ids = [str(p.get("prompt_id")) for p in self._prompts if p.get("task_type") == task_type and p.get("prompt_id")]
+        ids = self._bank.ids
+        base_ids = [ids[i] for i in self._bank.indices(task_type) if ids[i]]
         if task_type == "email":
             llm_ids = [f"llm-{s}" for s in self._seen_email_signatures]
             return base_ids + llm_ids
         return base_ids
 
+    def _fallback_email_variant(self, candidates: list[dict]) -> tuple[dict, dict]:
+        # The pool had nothing far enough from recently served prompts: build fresh variants from any base and
+        # keep the first one outside the window, or the least similar one if the window is saturated.
+        best: tuple[float, dict, dict] | None = None
+        for _ in range(EMAIL_FALLBACK_ATTEMPTS):
+            base = random.choice(candidates)
+            variant = self._make_email_variant(base)
+            if self._email_signature(variant) in self._seen_email_signatures:
+                continue
+            score = served_email_window.similarity(variant)
+            if score < served_email_window.threshold:
+                return base, variant
+            if best is None or score < best[0]:
+                best = (score, base, variant)
+        metrics.inc("prompt_store.email_window_saturated")
+        if best is None:
+            base = random.choice(candidates)
+            return base, self._make_email_variant(base)
+        return best[1], best[2]
+
     def random_by_type(self, task_type: str, generate_new: bool = True, exclude_source_ids: set[str] | None = None):
-        candidates = [p for p in self._prompts if p.get("task_type") == task_type]
+        # Filtering works on ids; only the prompts actually picked are decoded.
+        indices = self._bank.indices(task_type)
         if exclude_source_ids and task_type != "email":
-            filtered = [p for p in candidates if str(p.get("prompt_id")) not in exclude_source_ids]
+            ids = self._bank.ids
+            filtered = [i for i in indices if ids[i] not in exclude_source_ids]
             if filtered:
-                candidates = filtered
+                indices = filtered
+        candidates = self._bank.select(indices)
         if not candidates:
             return None
         base = random.choice(candidates)
@@ -678,12 +755,24 @@ class PromptStore:
             avoid = set(exclude_source_ids or set())
             # keep only unused items in pool
             self._email_pool = [v for v in self._email_pool if str(v.get("source_prompt_id")) not in avoid]
-            if not self._email_pool:
+            variant = None
+            if base.get("model_answer"):
+                # An enriched prompt is served as written, so its precomputed answer still matches the
+                # recipient, subject and bullets. It goes through the same repeat checks as a variant.
+                source_try = str(base.get("prompt_id") or "")
+                sig_try = self._email_signature(base)
+                if (
+                    source_try not in avoid
+                    and sig_try not in self._seen_email_signatures
+                    and not served_email_window.too_similar(base)
+                ):
+                    variant = {**base, "source_prompt_id": source_try}
+            as_written = variant is not None
+            if not as_written and not self._email_pool:
                 generated = self._generate_email_pool_with_llm(candidates, avoid_signatures=avoid, count=24)
                 if generated:
                     self._email_pool.extend(generated)
-            variant = None
-            for _ in range(8):
+            for _ in range(0 if as_written else 8):
                 candidate_variant = (
                     self._email_pool.pop()
                     if self._email_pool
@@ -693,11 +782,18 @@ class PromptStore:
                 source_try = str(candidate_variant.get("source_prompt_id") or f"llm-{sig_try}")
                 if source_try in avoid or sig_try in self._seen_email_signatures:
                     continue
+                # Exact signatures miss reworded copies; near-restatements of recently served prompts are skipped too.
+                if served_email_window.too_similar(candidate_variant):
+                    continue
                 candidate_variant["source_prompt_id"] = source_try
                 variant = candidate_variant
                 break
             if variant is None:
-                variant = self._make_email_variant(base)
+                base, variant = self._fallback_email_variant(candidates)
+            if not as_written:
+                # The precomputed answer was written for the base prompt's recipient, subject and bullets.
+                variant.pop("model_answer", None)
+                variant.pop("keywords", None)
             sig = self._email_signature(variant)
             source_id = str(variant.get("source_prompt_id") or f"llm-{sig}")
             variant["source_prompt_id"] = source_id
@@ -708,6 +804,7 @@ class PromptStore:
                     self._remember_topic(t)
                     break
             self._remember_email_signature(sig)
+            served_email_window.remember(variant)
         else:
             variant = self._make_discussion_variant(base)
         source_id = str(variant.get("source_prompt_id") or base.get("prompt_id", "x"))
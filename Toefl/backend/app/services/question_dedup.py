@@ -0,0 +1,129 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Sliding-window Bloom filter in a memory-mapped file shared by every worker on the host.
+# The window is split into generations; when the current one fills up, the oldest is cleared
+# and reused, so keys expire roughly `window` insertions after they were added.
+_MAGIC = b"TQDEDUP1"
+_HEADER = struct.Struct("<8sIIIIII")  # magic, generations, bits per generation, hashes, capacity, current, reserved
+_COUNT = struct.Struct("<I")
+_GENERATIONS = 4
+DEDUP_PATH = Path(__file__).resolve().parents[3] / "data" / "sentence_dedup.bin"
+
+
+class SharedQuestionFilter:
+    def __init__(self, path: str, window: int = 300, error_rate: float = 0.001):
+        self.path = path
+        self.capacity = max(64, math.ceil(window / (_GENERATIONS - 1)))
+        bits = math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.bits = (bits + 63) // 64 * 64
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self._gen_bytes = self.bits // 8
+        self._counts_offset = _HEADER.size
+        self._data_offset = _HEADER.size + _COUNT.size * _GENERATIONS
+        self._size = self._data_offset + self._gen_bytes * _GENERATIONS
+        self._open_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._fd: int | None = None
+        self._map: mmap.mmap | None = None
+
+    def _ensure_open(self) -> mmap.mmap:
+        if self._map is not None:
+            return self._map
+        with self._open_lock:
+            if self._map is not None:
+                return self._map
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._fd = fd
+            with self._locked(exclusive=True):
+                header = os.pread(fd, _HEADER.size, 0)
+                expected = (_MAGIC, _GENERATIONS, self.bits, self.hashes, self.capacity)
+                if len(header) < _HEADER.size or _HEADER.unpack(header)[:5] != expected or os.fstat(fd).st_size != self._size:
+                    # New file or one written with a different window/error rate: start empty.
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self._size)
+                    os.pwrite(fd, _HEADER.pack(*expected, 0, 0), 0)
+            self._map = mmap.mmap(fd, self._size)
+            return self._map
+
+    @contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        if fcntl is None or self._fd is None:
+            yield
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _positions(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def _in_generation(self, mm: mmap.mmap, gen: int, positions: list[int]) -> bool:
+        base = self._data_offset + gen * self._gen_bytes
+        return all(mm[base + (p >> 3)] & (1 << (p & 7)) for p in positions)
+
+    def _contains(self, mm: mmap.mmap, positions: list[int]) -> bool:
+        return any(self._in_generation(mm, gen, positions) for gen in range(_GENERATIONS))
+
+    def __contains__(self, key: str) -> bool:
+        mm = self._ensure_open()
+        positions = self._positions(key)
+        with self._thread_lock, self._locked(exclusive=False):
+            return self._contains(mm, positions)
+
+    def add(self, key: str) -> bool:
+        # Returns False when the key was already inside the window.
+        mm = self._ensure_open()
+        positions = self._positions(key)
+        with self._thread_lock, self._locked(exclusive=True):
+            if self._contains(mm, positions):
+                return False
+            current = _HEADER.unpack_from(mm, 0)[5]
+            count_at = self._counts_offset + current * _COUNT.size
+            count = _COUNT.unpack_from(mm, count_at)[0]
+            if count >= self.capacity:
+                current = (current + 1) % _GENERATIONS
+                base = self._data_offset + current * self._gen_bytes
+                mm[base : base + self._gen_bytes] = bytes(self._gen_bytes)
+                count_at = self._counts_offset + current * _COUNT.size
+                count = 0
+                _HEADER.pack_into(mm, 0, _MAGIC, _GENERATIONS, self.bits, self.hashes, self.capacity, current, 0)
+            base = self._data_offset + current * self._gen_bytes
+            for p in positions:
+                mm[base + (p >> 3)] |= 1 << (p & 7)
+            _COUNT.pack_into(mm, count_at, count + 1)
+            return True
+
+    def size(self) -> int:
+        mm = self._ensure_open()
+        with self._thread_lock, self._locked(exclusive=False):
+            return sum(_COUNT.unpack_from(mm, self._counts_offset + g * _COUNT.size)[0] for g in range(_GENERATIONS))
+
+    def close(self) -> None:
+        with self._open_lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
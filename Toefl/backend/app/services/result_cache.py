@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any
+
+from .grading import GRADER_VERSION
+from .metrics import metrics
+
+
+def normalize_submission_text(text: str) -> str:
+    return unicodedata.normalize("NFC", (text or "").replace("\r\n", "\n").replace("\r", "\n")).strip()
+
+
+def text_digest(normalized_text: str) -> str:
+    return hashlib.sha256(normalized_text.encode("utf-8")).hexdigest()
+
+
+def result_cache_key(prompt: dict[str, Any], normalized_text: str) -> tuple[str, str, str, str]:
+    # The prompt's content is part of the key, so editing a prompt in the bank never replays a stale grade.
+    content = json.dumps(prompt, sort_keys=True, ensure_ascii=False, default=str)
+    prompt_digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return (str(prompt.get("prompt_id")), prompt_digest, text_digest(normalized_text), GRADER_VERSION)
+
+
+class SubmissionResultCache:
+    def __init__(self, max_entries: int = 2048, max_idempotency_keys: int = 4096):
+        self._lock = threading.Lock()
+        self._results: OrderedDict[tuple[str, str, str, str], dict[str, Any]] = OrderedDict()
+        self._idempotency: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._max_entries = max_entries
+        self._max_idempotency_keys = max_idempotency_keys
+
+    def get(self, key: tuple[str, str, str, str]) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                metrics.inc("submit_cache.misses")
+                return None
+            self._results.move_to_end(key)
+        metrics.inc("submit_cache.hits")
+        return entry
+
+    def put(self, key: tuple[str, str, str, str], result: dict[str, Any], prompt_snapshot: dict[str, Any]) -> dict[str, Any]:
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                # `written_for` maps a student to the response their stored row was given (with its rubric job).
+                entry = self._results[key] = {"result": result, "prompt": prompt_snapshot, "written_for": {}}
+            self._results.move_to_end(key)
+            while len(self._results) > self._max_entries:
+                self._results.popitem(last=False)
+                metrics.inc("submit_cache.evictions")
+        return entry
+
+    def mark_written(self, key: tuple[str, str, str, str], student_id: str | None) -> bool:
+        # Returns False when this student already has a stored row for the same graded text. Anonymous
+        # submissions cannot be told apart, so each one is stored.
+        if student_id is None:
+            return True
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return True
+            if student_id in entry["written_for"]:
+                return False
+            entry["written_for"][student_id] = None
+            return True
+
+    def remember_written(
+        self, key: tuple[str, str, str, str], student_id: str | None, response: dict[str, Any]
+    ) -> None:
+        if student_id is None:
+            return
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None:
+                entry["written_for"][student_id] = response
+
+    def written_response(self, key: tuple[str, str, str, str], student_id: str | None) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._results.get(key)
+            return entry["written_for"].get(student_id) if entry is not None else None
+
+    def lookup_idempotency_key(self, idempotency_key: str) -> dict[str, Any] | None:
+        with self._lock:
+            found = self._idempotency.get(idempotency_key)
+            if found is not None:
+                self._idempotency.move_to_end(idempotency_key)
+            return found
+
+    def remember_idempotency_key(
+        self, idempotency_key: str, submission: tuple[str, str, str | None], result: dict[str, Any]
+    ) -> None:
+        # `submission` is (prompt_id, text digest, student_id): a retry matches on what the client sent,
+        # even if the bank was reloaded in between.
+        with self._lock:
+            self._idempotency[idempotency_key] = {"submission": submission, "result": result}
+            self._idempotency.move_to_end(idempotency_key)
+            while len(self._idempotency) > self._max_idempotency_keys:
+                self._idempotency.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+
+submission_cache = SubmissionResultCache(max_entries=int(os.getenv("SUBMIT_CACHE_SIZE", "2048")))
+metrics.register_gauge("submit_cache.size", lambda: len(submission_cache))
+metrics.register_gauge("submit_cache.hit_ratio", lambda: metrics.ratio("submit_cache.hits", "submit_cache.misses"))
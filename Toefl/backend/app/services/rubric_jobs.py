@@ -0,0 +1,321 @@
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import RubricJob
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RUBRIC_KEYS = ["Task Fulfillment", "Organization & Coherence", "Grammar & Sentence Structure", "Vocabulary & Tone"]
+MAX_ATTEMPTS = 3
+# A failed job waits RETRY_BASE_SECONDS * 2^(attempts - 1), capped, so an unreachable model is not hammered.
+RETRY_BASE_SECONDS = float(os.getenv("RUBRIC_RETRY_BASE_SECONDS", "5"))
+RETRY_MAX_SECONDS = float(os.getenv("RUBRIC_RETRY_MAX_SECONDS", "300"))
+# How often the dispatcher requeues jobs left running by a worker that died.
+RECOVER_INTERVAL_SECONDS = float(os.getenv("RUBRIC_RECOVER_INTERVAL_SECONDS", "30"))
+
+
+def rubric_model_enabled() -> bool:
+    return os.getenv("RUBRIC_MODEL_ENABLED", "0") == "1"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _extract_json_object(text: str) -> dict[str, Any] | None:
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.startswith("json"):
+            text = text[4:].strip()
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end == -1:
+        return None
+    try:
+        data = json.loads(text[start : end + 1])
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _call_rubric_model(prompt: dict[str, Any], user_text: str, heuristic: dict[str, Any]) -> dict[str, Any]:
+    url = os.getenv("RUBRIC_MODEL_URL", "https://api.openai.com/v1/chat/completions")
+    model = os.getenv("RUBRIC_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    api_key = os.getenv("OPENAI_API_KEY")
+    task = {
+        "task_type": prompt.get("task_type"),
+        "to_field": prompt.get("to_field"),
+        "subject": prompt.get("subject"),
+        "bullet_points": prompt.get("bullet_points") or [],
+        "professor_prompt": prompt.get("professor_prompt"),
+        "student_posts": prompt.get("student_posts") or [],
+        "raw_text": str(prompt.get("raw_text") or "")[:2000],
+    }
+    instruction = (
+        "Score this TOEFL writing response on a 0-5 scale (one decimal) for each rubric dimension: "
+        f"{', '.join(RUBRIC_KEYS)}. "
+        "Return ONLY a JSON object with keys: rubric_scores (object keyed by dimension), "
+        "explanations (object keyed by dimension, one or two sentences each). "
+        f"Task: {json.dumps(task)}\n"
+        f"Heuristic pre-scores for reference: {json.dumps(heuristic.get('rubric_scores', {}))}\n"
+        f"Response:\n{user_text}"
+    )
+    body = {
+        "model": model,
+        "temperature": 0.2,
+        "messages": [
+            {"role": "system", "content": "You are a strict TOEFL writing rater. Return strict JSON only."},
+            {"role": "user", "content": instruction},
+        ],
+    }
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    req = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), headers=headers, method="POST")
+    timeout = float(os.getenv("RUBRIC_MODEL_TIMEOUT", "60"))
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        payload = json.loads(resp.read().decode("utf-8"))
+    content = payload["choices"][0]["message"]["content"]
+    parsed = _extract_json_object(content)
+    if not parsed or not isinstance(parsed.get("rubric_scores"), dict):
+        raise ValueError("Model response did not contain rubric_scores.")
+    scores: dict[str, float] = {}
+    for key in RUBRIC_KEYS:
+        value = parsed["rubric_scores"].get(key)
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"Model response is missing a numeric score for {key}.")
+        scores[key] = round(max(0.0, min(5.0, float(value))), 1)
+    explanations = parsed.get("explanations") if isinstance(parsed.get("explanations"), dict) else {}
+    return {
+        "model": model,
+        "rubric_scores": scores,
+        "explanations": {k: str(explanations.get(k) or heuristic.get("explanations", {}).get(k, "")) for k in RUBRIC_KEYS},
+        "overall_score": round(sum(scores.values()) / len(scores), 2),
+    }
+
+
+def enqueue_rubric_job(db: Session, prompt: dict[str, Any], user_text: str, heuristic: dict[str, Any]) -> str:
+    job_id = f"rubric-{uuid.uuid4().hex[:12]}"
+    request = {"prompt": prompt, "user_text": user_text, "heuristic": heuristic}
+    db.add(
+        RubricJob(
+            job_id=job_id,
+            prompt_id=str(prompt.get("prompt_id") or ""),
+            status="queued",
+            request_json=json.dumps(request),
+            created_at=_utcnow(),
+        )
+    )
+    db.commit()
+    metrics.inc("rubric_jobs.enqueued")
+    rubric_job_runner.notify()
+    return job_id
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+
+
+def _retry_or_fail(job: RubricJob, error: str) -> None:
+    job.error = error
+    job.status = "queued" if job.attempts < MAX_ATTEMPTS else "failed"
+    if job.status == "queued":
+        job.next_attempt_at = _utcnow() + timedelta(seconds=retry_delay_seconds(job.attempts))
+        metrics.inc("rubric_jobs.retries_scheduled")
+    else:
+        job.finished_at = _utcnow()
+        metrics.inc("rubric_jobs.failed")
+
+
+def job_status_payload(job: RubricJob) -> dict[str, Any]:
+    out: dict[str, Any] = {"job_id": job.job_id, "status": job.status, "attempts": job.attempts}
+    if job.result_json:
+        out["result"] = json.loads(job.result_json)
+    if job.error:
+        out["error"] = job.error
+    if job.status == "queued" and job.next_attempt_at:
+        out["next_attempt_at"] = job.next_attempt_at.isoformat()
+    if job.finished_at and job.created_at:
+        out["latency_seconds"] = round((job.finished_at - job.created_at).total_seconds(), 3)
+    return out
+
+
+class RubricJobRunner:
+    def __init__(self, max_workers: int = 2, poll_interval: float = 2.0):
+        self._max_workers = max(1, max_workers)
+        self._poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
+        # Jobs this process has claimed and not finished; stop() puts them back in the queue.
+        self._claimed: set[int] = set()
+        self._executor: ThreadPoolExecutor | None = None
+        self._dispatcher: threading.Thread | None = None
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def start(self) -> None:
+        if not rubric_model_enabled() or self._dispatcher is not None:
+            return
+        self._recover_interrupted()
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="rubric-job")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="rubric-job-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def stop(self) -> None:
+        if self._dispatcher is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._dispatcher.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._dispatcher = None
+        self._executor = None
+        with self._inflight_lock:
+            claimed = list(self._claimed)
+        if claimed:
+            # Cancelled or interrupted jobs are queued again instead of staying `running` until they look stale.
+            with SessionLocal() as db:
+                db.execute(
+                    update(RubricJob)
+                    .where(RubricJob.id.in_(claimed), RubricJob.status == "running")
+                    .values(status="queued", attempts=RubricJob.attempts - 1)
+                )
+                db.commit()
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _recover_interrupted(self) -> None:
+        # Jobs left running by a dead process go back to the queue; recent ones may belong to a live worker.
+        stale_before = _utcnow() - timedelta(seconds=float(os.getenv("RUBRIC_MODEL_TIMEOUT", "60")) + 30)
+        with self._inflight_lock:
+            own = list(self._claimed)
+        with SessionLocal() as db:
+            db.execute(
+                update(RubricJob)
+                .where(RubricJob.status == "running", RubricJob.started_at < stale_before, RubricJob.id.not_in(own))
+                .values(status="queued")
+            )
+            db.commit()
+
+    def _claim(self, limit: int) -> list[int]:
+        claimed: list[int] = []
+        now = _utcnow()
+        with SessionLocal() as db:
+            due = or_(RubricJob.next_attempt_at.is_(None), RubricJob.next_attempt_at <= now)
+            query = db.query(RubricJob.id).filter(RubricJob.status == "queued", due).order_by(RubricJob.id).limit(limit)
+            ids = [row[0] for row in query.all()]
+            for pk in ids:
+                # Conditional update so concurrent processes never claim the same job.
+                res = db.execute(
+                    update(RubricJob)
+                    .where(RubricJob.id == pk, RubricJob.status == "queued")
+                    .values(status="running", started_at=_utcnow(), attempts=RubricJob.attempts + 1)
+                )
+                if res.rowcount == 1:
+                    claimed.append(pk)
+            db.commit()
+        return claimed
+
+    def _dispatch_loop(self) -> None:
+        recovered_at = time.monotonic()
+        while not self._stop.is_set():
+            if time.monotonic() - recovered_at >= RECOVER_INTERVAL_SECONDS:
+                recovered_at = time.monotonic()
+                try:
+                    self._recover_interrupted()
+                except Exception:
+                    logger.exception("Failed to requeue interrupted rubric jobs")
+            with self._inflight_lock:
+                free = self._max_workers - self._inflight
+            if free > 0:
+                try:
+                    claimed = self._claim(free)
+                except Exception:
+                    logger.exception("Failed to claim rubric jobs")
+                    claimed = []
+                for pk in claimed:
+                    with self._inflight_lock:
+                        self._inflight += 1
+                        self._claimed.add(pk)
+                    self._executor.submit(self._run, pk)
+                if claimed:
+                    continue
+            self._wake.wait(self._poll_interval)
+            self._wake.clear()
+
+    def _run(self, pk: int) -> None:
+        try:
+            with SessionLocal() as db:
+                job = db.get(RubricJob, pk)
+                if job is None:
+                    return
+                request = json.loads(job.request_json)
+                started = time.perf_counter()
+                try:
+                    enriched = _call_rubric_model(request["prompt"], request["user_text"], request["heuristic"])
+                except Exception as exc:
+                    metrics.inc("rubric_jobs.model_errors")
+                    _retry_or_fail(job, str(exc))
+                    db.commit()
+                    return
+                metrics.observe("rubric_jobs.model_seconds", time.perf_counter() - started)
+                result = dict(request["heuristic"])
+                result.update(
+                    {
+                        "rubric_scores": enriched["rubric_scores"],
+                        "explanations": enriched["explanations"],
+                        "overall_score": enriched["overall_score"],
+                        "heuristic_rubric_scores": request["heuristic"].get("rubric_scores", {}),
+                        "scored_by": enriched["model"],
+                    }
+                )
+                job.result_json = json.dumps(result)
+                job.error = None
+                job.status = "done"
+                job.finished_at = _utcnow()
+                db.commit()
+                metrics.inc("rubric_jobs.completed")
+                if job.started_at and job.created_at:
+                    metrics.observe("rubric_jobs.queue_wait_seconds", (job.started_at - job.created_at).total_seconds())
+                    metrics.observe("rubric_jobs.total_seconds", (job.finished_at - job.created_at).total_seconds())
+        except Exception as exc:
+            logger.exception("Rubric job %s crashed", pk)
+            # Anything outside the model call (bad request JSON, a failed commit) must not leave the job running.
+            try:
+                with SessionLocal() as db:
+                    job = db.get(RubricJob, pk)
+                    if job is not None and job.status == "running":
+                        _retry_or_fail(job, f"Job crashed: {exc}")
+                        db.commit()
+            except Exception:
+                logger.exception("Could not release rubric job %s", pk)
+        finally:
+            with self._inflight_lock:
+                self._inflight -= 1
+                self._claimed.discard(pk)
+            self._wake.set()
+
+
+rubric_job_runner = RubricJobRunner(max_workers=int(os.getenv("RUBRIC_JOB_WORKERS", "2")))
+metrics.register_gauge("rubric_jobs.inflight", lambda: rubric_job_runner.inflight)
@@ -1,11 +1,18 @@
+import hashlib
 import random
 import uuid
 import os
 import json
 import urllib.request
 import re
-from collections import deque
-from typing import Any
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from typing import Any, Iterator
+
+from .metrics import metrics
+from .near_duplicates import NearDuplicateIndex, near_duplicate_index
+from .question_dedup import DEDUP_PATH, SharedQuestionFilter
+from .sentence_sets import runtime_sets
 
 QUESTION_BANK = [
     {
@@ -190,11 +197,18 @@ QUESTION_BANK = [
     },
 ]
 
-_runtime_sets: dict[str, dict[str, Any]] = {}
-_used_question_keys: set[str] = set()
-_used_question_order: deque[str] = deque()
-_MAX_USED_QUESTION_MEMORY = 300
 _last_llm_error: str | None = None
+_default_rng = random.Random()
+LLM_TIMEOUT_SECONDS = float(os.getenv("SENTENCE_LLM_TIMEOUT", "40"))
+LLM_CONCURRENCY = int(os.getenv("SENTENCE_LLM_CONCURRENCY", "4"))
+LLM_PARALLEL_BATCHES = int(os.getenv("SENTENCE_LLM_PARALLEL_BATCHES", "2"))
+HEDGE_DEFAULT_DELAY = 8.0
+HEDGE_MIN_SAMPLES = 5
+# HTTP calls and batch orchestration use separate pools so a waiting batch never holds a request slot.
+_llm_executor = ThreadPoolExecutor(max_workers=max(1, LLM_CONCURRENCY), thread_name_prefix="sentence-llm")
+# Upper bound on batches in flight at once; a bulk classroom build uses all of them in a single round.
+LLM_MAX_BATCHES = max(1, LLM_PARALLEL_BATCHES) * 2
+_batch_executor = ThreadPoolExecutor(max_workers=LLM_MAX_BATCHES, thread_name_prefix="sentence-batch")
 DECOY_WORDS = ["already", "usually", "probably", "around", "earlier", "today", "quickly", "carefully", "really", "maybe", "still", "just"]
 TOPIC_CANDIDATES = [
     "travel and transportation",
@@ -265,6 +279,29 @@ TOPIC_ACTIONS = [
     "clarifying constraints",
     "prioritizing next steps",
 ]
+REQUIRED_FAMILIES = ["statement_response", "interrogative", "reply_to_question"]
+TARGET_GRAMMAR_TAGS = [
+    "subject_verb_order",
+    "tense_time",
+    "auxiliaries",
+    "question_word_order",
+    "articles_determiners",
+    "prepositions",
+    "modals",
+    "clauses",
+    "comparatives_superlatives",
+    "conditionals",
+    "passive_voice",
+]
+# Servable items (not inside the dedup window) the inventory replenisher keeps per family and grammar tag.
+INVENTORY_FAMILY_TARGET = int(os.getenv("SENTENCE_INVENTORY_TARGET", "60"))
+INVENTORY_TAG_TARGET = int(os.getenv("SENTENCE_INVENTORY_TAG_TARGET", "20"))
+# A served question is not served again for about this many questions. The inventory rotates by the
+# replenisher topping up servable items, not by shortening this window.
+question_filter = SharedQuestionFilter(
+    os.getenv("SENTENCE_DEDUP_PATH", str(DEDUP_PATH)),
+    window=int(os.getenv("SENTENCE_DEDUP_WINDOW", "20000")),
+)
 TOPIC_KEYWORDS: dict[str, list[str]] = {
     "travel": ["airport", "bus", "train", "flight", "trip", "commute", "hotel", "seats"],
     "work": ["manager", "report", "meeting", "assignment", "deadline", "office", "team"],
@@ -283,14 +320,15 @@ def _is_word(token: str) -> bool:
     return bool(re.fullmatch(r"[A-Za-z]+(?:'[A-Za-z]+)?", token))
 
 
-def _build_template(answer: str) -> tuple[list[str], list[str]]:
+def _build_template(answer: str, rng: random.Random | None = None) -> tuple[list[str], list[str]]:
+    rng = rng or _default_rng
     parts = _tokenize(answer)
     word_indices = [i for i, p in enumerate(parts) if _is_word(p)]
     if len(word_indices) <= 2:
         return (parts, [])
 
     keep_count = max(1, min(3, len(word_indices) // 3))
-    keep_indices = set(random.sample(word_indices, k=keep_count))
+    keep_indices = set(rng.sample(word_indices, k=keep_count))
     template: list[str] = []
     hidden_words: list[str] = []
     for i, token in enumerate(parts):
@@ -299,7 +337,7 @@ def _build_template(answer: str) -> tuple[list[str], list[str]]:
             hidden_words.append(token)
         else:
             template.append(token)
-    random.shuffle(hidden_words)
+    rng.shuffle(hidden_words)
     return template, hidden_words
 
 
@@ -481,188 +519,188 @@ def _select_topic_diverse(items: list[dict[str, Any]], count: int) -> list[dict[
     return out[:count]
 
 
-def _select_balanced(items: list[dict[str, Any]], count: int) -> list[dict[str, Any]]:
-    if len(items) <= count:
-        return items[:count]
+_GRAMMAR_BITS = {tag: 1 << i for i, tag in enumerate(TARGET_GRAMMAR_TAGS)}
+_ALL_GRAMMAR_BITS = (1 << len(TARGET_GRAMMAR_TAGS)) - 1
+# How many unused items per bucket are compared when choosing the next pick.
+_SELECT_WINDOW = 24
+
+
+def _selector_features(item: dict[str, Any]) -> tuple[str, str, str, str, int]:
+    prompt, answer = item.get("prompt", ""), item.get("answer", "")
+    mask = 0
+    for tag in item.get("grammar_tags") or ():
+        mask |= _GRAMMAR_BITS.get(tag, 0)
+    return (
+        item.get("family") or _pattern_family(prompt, answer),
+        item.get("format_group") or _format_group(str(item.get("pattern", ""))),
+        item.get("topic") or _infer_topic(prompt, answer),
+        str(item.get("context", "")),
+        mask,
+    )
 
-    pool = list(items)
-    random.shuffle(pool)
-    out: list[dict[str, Any]] = []
-    used_ids: set[int] = set()
 
-    # 1) Seed required families first so every set includes all key types when available.
-    required_families = ["statement_response", "interrogative", "reply_to_question"]
-    for family in required_families:
-        for i, item in enumerate(pool):
-            if i in used_ids:
+class _SelectorIndex:
+    # Features are computed once per item and indexed into buckets by family, format, context and grammar tag.
+    def __init__(self, items: list[dict[str, Any]]):
+        self.items = items
+        self.features = [_selector_features(item) for item in items]
+        self.buckets: dict[tuple[str, str], list[int]] = {}
+        for i, (family, fmt, _, context, mask) in enumerate(self.features):
+            self.buckets.setdefault(("family", family), []).append(i)
+            self.buckets.setdefault(("format", fmt), []).append(i)
+            self.buckets.setdefault(("context", context), []).append(i)
+            while mask:
+                low = mask & -mask
+                self.buckets.setdefault(("tag", str(low.bit_length() - 1)), []).append(i)
+                mask ^= low
+
+    def select(self, count: int) -> list[dict[str, Any]]:
+        return [self.items[i] for i in self.select_indices(count)]
+
+    def select_indices(self, count: int, fixed: list[int] | None = None) -> list[int]:
+        # `fixed` items were already handed out (streamed) and stay in the set; the rest is balanced around them.
+        fixed = fixed or []
+        if len(self.items) <= count:
+            return fixed + [i for i in range(len(self.items)) if i not in fixed][: count - len(fixed)]
+        selection = _BalancedSelection(self, count)
+        for i in fixed:
+            selection.take(i)
+        return selection.run()
+
+    def seed(self, count: int) -> list[int]:
+        selection = _BalancedSelection(self, count)
+        selection.seed_families()
+        return selection.picked
+
+
+class _BalancedSelection:
+    # Each pick compares a small window of unused bucket members, read from a random offset, by how much
+    # uncovered family/context/grammar/topic they add, so the cost does not grow with the pool size.
+    def __init__(self, index: _SelectorIndex, count: int):
+        self.index = index
+        self.count = count
+        self.starts: dict[tuple[str, str], int] = {}
+        self.used: set[int] = set()
+        self.picked: list[int] = []
+        self.families: dict[str, int] = {}
+        self.formats: dict[str, int] = {}
+        self.topics: set[str] = set()
+        self.contexts: set[str] = set()
+        self.grammar = 0
+
+    def full(self) -> bool:
+        return len(self.picked) >= self.count
+
+    def _available(self, i: int) -> bool:
+        return i not in self.used
+
+    def _window(self, key: tuple[str, str]) -> list[int]:
+        bucket = self.index.buckets.get(key) or []
+        if not bucket:
+            return []
+        start = self.starts.get(key)
+        if start is None:
+            start = self.starts[key] = random.randrange(len(bucket))
+        out: list[int] = []
+        for step in range(len(bucket)):
+            i = bucket[(start + step) % len(bucket)]
+            if not self._available(i):
                 continue
-            if _pattern_family(item.get("prompt", ""), item.get("answer", "")) == family:
-                out.append(item)
-                used_ids.add(i)
+            out.append(i)
+            if len(out) >= _SELECT_WINDOW:
                 break
+        return out
 
-    # If room permits, add one more interrogative and one more reply-to-question for better coverage.
-    if count >= 8:
-        for family in ["interrogative", "reply_to_question"]:
-            for i, item in enumerate(pool):
-                if len(out) >= count:
-                    break
-                if i in used_ids:
+    def _gain(self, i: int, needed_contexts: set[str]) -> int:
+        family, _, topic, context, mask = self.index.features[i]
+        gain = 3 * (family in REQUIRED_FAMILIES and not self.families.get(family))
+        gain += 2 * (context in needed_contexts)
+        gain += 2 * (mask & ~self.grammar & _ALL_GRAMMAR_BITS).bit_count()
+        gain += topic not in self.topics
+        return gain
+
+    def take(self, i: int) -> None:
+        family, fmt, topic, context, mask = self.index.features[i]
+        self.used.add(i)
+        self.picked.append(i)
+        self.families[family] = self.families.get(family, 0) + 1
+        self.formats[fmt] = self.formats.get(fmt, 0) + 1
+        self.topics.add(topic)
+        self.contexts.add(context)
+        self.grammar |= mask
+
+    def take_best(self, keys: list[tuple[str, str]], needed_contexts: set[str], min_gain: int = 0) -> bool:
+        best, best_score = -1, -1.0
+        for key in keys:
+            for i in self._window(key):
+                gain = self._gain(i, needed_contexts)
+                if gain < min_gain:
                     continue
-                if _pattern_family(item.get("prompt", ""), item.get("answer", "")) == family:
-                    out.append(item)
-                    used_ids.add(i)
+                score = gain + random.random()
+                if score > best_score:
+                    best, best_score = i, score
+        if best < 0:
+            return False
+        self.take(best)
+        return True
+
+    def seed_families(self) -> None:
+        # 1) Seed required families so every set includes all key types when available,
+        # plus one more interrogative and reply-to-question when there is room.
+        wanted = {family: 1 for family in REQUIRED_FAMILIES}
+        if self.count >= 8:
+            wanted["interrogative"] = wanted["reply_to_question"] = 2
+        for family, target in wanted.items():
+            while not self.full() and self.families.get(family, 0) < target:
+                if not self.take_best([("family", family)], {"social", "campus"} - self.contexts):
                     break
 
-    # 2) Enforce format quotas to avoid question-heavy sets.
-    # Target profile: mostly statements, some questions, and optional exclamation.
-    target_statement = max(3, int(round(count * 0.5)))
-    target_question = max(2, int(round(count * 0.25)))
-    target_exclamation = 1 if count >= 8 else 0
-
-    format_buckets: dict[str, list[tuple[int, dict[str, Any]]]] = {}
-    for i, item in enumerate(pool):
-        fg = _format_group(str(item.get("pattern", "")))
-        format_buckets.setdefault(fg, []).append((i, item))
-
-    def take_from_bucket(fmt: str, n: int) -> None:
-        nonlocal out, used_ids
-        bucket = format_buckets.get(fmt) or []
-        random.shuffle(bucket)
-        taken = 0
-        for idx, pick in bucket:
-            if len(out) >= count or taken >= n:
-                break
-            if idx in used_ids:
-                continue
-            out.append(pick)
-            used_ids.add(idx)
-            taken += 1
-
-    current_question = sum(1 for x in out if _format_group(str(x.get("pattern", ""))) == "question")
-    current_statement = sum(1 for x in out if _format_group(str(x.get("pattern", ""))) == "statement")
-    current_exclamation = sum(1 for x in out if _format_group(str(x.get("pattern", ""))) == "exclamation")
-
-    take_from_bucket("statement", max(0, target_statement - current_statement))
-    take_from_bucket("question", max(0, target_question - current_question))
-    take_from_bucket("exclamation", max(0, target_exclamation - current_exclamation))
-
-    # If we still have room, top up with non-question first.
-    for fmt in ["statement", "exclamation", "question"]:
-        if len(out) >= count:
-            break
-        take_from_bucket(fmt, count - len(out))
-
-    # 3) Re-check families after quota fill and backfill if still missing.
-    required_family_set = {"statement_response", "interrogative", "reply_to_question"}
-    present = set(_pattern_family(x.get("prompt", ""), x.get("answer", "")) for x in out)
-    missing_families = required_family_set - present
-    if missing_families and len(out) < count:
-        for i, item in enumerate(pool):
-            if len(out) >= count:
-                break
-            if i in used_ids:
-                continue
-            fam = _pattern_family(item.get("prompt", ""), item.get("answer", ""))
-            if fam in missing_families:
-                out.append(item)
-                used_ids.add(i)
-                missing_families.discard(fam)
-            if not missing_families:
-                break
+    def run(self) -> list[int]:
+        count = self.count
+        needed_contexts = {"social", "campus"}
+        self.seed_families()
+
+        # 2) Format quotas: mostly statements, some questions, and an optional exclamation.
+        quotas = [
+            ("statement", max(3, int(round(count * 0.5)))),
+            ("question", max(2, int(round(count * 0.25)))),
+            ("exclamation", 1 if count >= 8 else 0),
+        ]
+        for fmt, target in quotas:
+            while not self.full() and self.formats.get(fmt, 0) < target:
+                if not self.take_best([("format", fmt)], needed_contexts - self.contexts):
+                    break
 
-    # 4) Add topic variety next.
-    topic_buckets: dict[str, list[tuple[int, dict[str, Any]]]] = {}
-    for i, item in enumerate(pool):
-        if i in used_ids:
-            continue
-        tk = _infer_topic(item.get("prompt", ""), item.get("answer", ""))
-        topic_buckets.setdefault(tk, []).append((i, item))
-    topic_order = sorted(topic_buckets.keys(), key=lambda t: len(topic_buckets[t]), reverse=True)
-    topic_target = min(max(4, count // 2), count - len(out))
-    while len(out) < count and topic_target > 0:
-        progressed = False
-        for t in topic_order:
-            if topic_target <= 0 or len(out) >= count:
+        # 3) Cover missing families, reply contexts and grammar focus areas, largest gain first.
+        while not self.full():
+            missing_contexts = needed_contexts - self.contexts
+            keys = [("family", f) for f in REQUIRED_FAMILIES if not self.families.get(f)]
+            keys += [("context", c) for c in sorted(missing_contexts)]
+            missing_bits = _ALL_GRAMMAR_BITS & ~self.grammar
+            keys += [("tag", str(b)) for b in range(len(TARGET_GRAMMAR_TAGS)) if missing_bits >> b & 1]
+            if not keys or not self.take_best(keys, missing_contexts, min_gain=2):
                 break
-            bucket = topic_buckets.get(t) or []
-            if not bucket:
-                continue
-            idx, pick = bucket.pop()
-            if idx in used_ids:
-                continue
-            out.append(pick)
-            used_ids.add(idx)
-            topic_target -= 1
-            progressed = True
-        if not progressed:
-            break
 
-    # 5) Ensure both reply contexts (social/campus) appear when possible.
-    needed_contexts = {"social", "campus"}
-    for existing in out:
-        needed_contexts.discard(str(existing.get("context", "")))
-    if needed_contexts and len(out) < count:
-        for i, item in enumerate(pool):
-            if len(out) >= count:
-                break
-            if i in used_ids:
-                continue
-            if str(item.get("context", "")) in needed_contexts:
-                out.append(item)
-                used_ids.add(i)
-                needed_contexts.discard(str(item.get("context", "")))
-            if not needed_contexts:
-                break
+        # 4) Top up non-question formats first, preferring new topics.
+        for fmt in ["statement", "exclamation", "question"]:
+            while not self.full() and self.take_best([("format", fmt)], set()):
+                pass
+        return self.picked
 
-    # 6) Ensure core grammar focus areas are represented when possible.
-    target_grammar = {
-        "subject_verb_order",
-        "tense_time",
-        "auxiliaries",
-        "question_word_order",
-        "articles_determiners",
-        "prepositions",
-        "modals",
-        "clauses",
-        "comparatives_superlatives",
-        "conditionals",
-        "passive_voice",
-    }
-    existing_tags: set[str] = set()
-    for existing in out:
-        existing_tags.update(set(existing.get("grammar_tags", set())))
-    missing = target_grammar - existing_tags
-    if missing and len(out) < count:
-        for i, item in enumerate(pool):
-            if len(out) >= count:
-                break
-            if i in used_ids:
-                continue
-            tags = set(item.get("grammar_tags", set()))
-            if tags.intersection(missing):
-                out.append(item)
-                used_ids.add(i)
-                missing -= tags
-            if not missing:
-                break
 
-    # 7) Fill remaining slots from the rest.
-    for i, item in enumerate(pool):
-        if len(out) >= count:
-            break
-        if i in used_ids:
-            continue
-        out.append(item)
-        used_ids.add(i)
-    return out[:count]
+def _select_balanced(items: list[dict[str, Any]], count: int) -> list[dict[str, Any]]:
+    if len(items) <= count:
+        return items[:count]
+    return _SelectorIndex(items).select(count)
 
 
 def _question_key(prompt: str, answer: str) -> str:
     return _normalize_sentence(prompt)
 
 
-def _coerce_valid_template(answer: str, template: list[str] | None) -> tuple[list[str], list[str]]:
+def _coerce_valid_template(
+    answer: str, template: list[str] | None, rng: random.Random | None = None
+) -> tuple[list[str], list[str]]:
     if template and isinstance(template, list):
         cleaned = [str(x).strip() for x in template if str(x).strip()]
         blank_count = cleaned.count("__")
@@ -671,7 +709,50 @@ def _coerce_valid_template(answer: str, template: list[str] | None) -> tuple[lis
             rebuilt = _rebuild_from_template(cleaned, hidden)
             if len(hidden) == blank_count and rebuilt and _normalize_for_compare(rebuilt) == _normalize_for_compare(answer):
                 return cleaned, hidden
-    return _build_template(answer)
+    return _build_template(answer, rng)
+
+
+def item_key(prompt: str, answer: str) -> str:
+    # The answer is part of the key: the same prompt with a different answer is a different item to grade.
+    text = f"{_question_key(prompt, answer)}\n{_normalize_sentence(answer)}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+
+
+def build_item_record(
+    prompt: str, answer: str, template: list[str] | None = None, pattern: str | None = None
+) -> dict[str, Any] | None:
+    prompt = (prompt or "").strip()
+    answer = (answer or "").strip()
+    if not prompt or not answer:
+        return None
+    template, hidden = _coerce_valid_template(answer, template)
+    blank_count = template.count("__")
+    if blank_count <= 0 or len(hidden) < blank_count:
+        return None
+    pattern = pattern or _infer_pattern_label(prompt, answer)
+    return {
+        "item_key": item_key(prompt, answer),
+        "prompt": prompt,
+        "answer": answer,
+        "response_template": template,
+        "pattern": pattern,
+        "family": _pattern_family(prompt, answer),
+        "format_group": _format_group(pattern),
+        "context": _infer_context_label(prompt, answer),
+        "topic": _infer_topic(prompt, answer),
+        "grammar_tags": _infer_grammar_tags(prompt, answer),
+    }
+
+
+def generate_candidate_items(
+    count: int, avoid_prompts: list[str] | None = None, focus: str | None = None, batches: int = 1
+) -> list[dict[str, Any]]:
+    records = []
+    for g in _generate_batches(batches, count, avoid_prompts=avoid_prompts, focus=focus):
+        record = build_item_record(g["prompt"], g["answer"], g.get("response_template"), g.get("pattern"))
+        if record:
+            records.append(record)
+    return records
 
 
 def _extract_json(text: str) -> list[dict[str, Any]]:
@@ -708,18 +789,96 @@ def _extract_json(text: str) -> list[dict[str, Any]]:
     return clean
 
 
-def _generate_with_llm(count: int, avoid_prompts: list[str] | None = None) -> list[dict[str, str]]:
+def _request_completion(model: str, instruction: str, api_key: str) -> str:
+    payload = {
+        "model": model,
+        "temperature": 0.9,
+        "messages": [
+            {"role": "system", "content": "You create TOEFL sentence-building items."},
+            {"role": "user", "content": instruction},
+        ],
+    }
+    req = urllib.request.Request(
+        "https://api.openai.com/v1/chat/completions",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        },
+        method="POST",
+    )
+    started = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=LLM_TIMEOUT_SECONDS) as resp:
+        body = json.loads(resp.read().decode("utf-8"))
+    content = body["choices"][0]["message"]["content"]
+    if not _extract_json(content):
+        raise ValueError(f"{model} returned no usable items.")
+    metrics.observe(f"sentence_llm.seconds.{model}", time.perf_counter() - started)
+    return content
+
+
+def _hedge_delay(model: str) -> float:
+    configured = os.getenv("SENTENCE_LLM_HEDGE_DELAY")
+    if configured:
+        return float(configured)
+    hist = metrics.histogram(f"sentence_llm.seconds.{model}")
+    p95 = hist.quantile(0.95) if hist.count >= HEDGE_MIN_SAMPLES else None
+    if p95 is None:
+        return HEDGE_DEFAULT_DELAY
+    return max(0.5, min(LLM_TIMEOUT_SECONDS, p95))
+
+
+def _hedged_completion(models: list[str], instruction: str, api_key: str) -> str:
+    global _last_llm_error
+    # The next model is started when the current one fails or outlives its p95; the first valid response wins.
+    pending: dict[Future, str] = {}
+    remaining = list(models)
+    last_exc: Exception | None = None
+    wait_for = 0.0
+    while remaining or pending:
+        if remaining and (not pending or wait_for <= 0):
+            model = remaining.pop(0)
+            if pending:
+                metrics.inc("sentence_llm.hedges")
+            pending[_llm_executor.submit(_request_completion, model, instruction, api_key)] = model
+            wait_for = _hedge_delay(model)
+        done, _ = wait(pending, timeout=wait_for if remaining else None, return_when=FIRST_COMPLETED)
+        if not done:
+            wait_for = 0
+            continue
+        for fut in done:
+            model = pending.pop(fut)
+            try:
+                content = fut.result()
+            except Exception as exc:
+                metrics.inc(f"sentence_llm.errors.{model}")
+                last_exc = exc
+                continue
+            for other in pending:
+                # Requests already on the wire cannot be interrupted; their results are simply dropped.
+                other.cancel()
+            metrics.inc(f"sentence_llm.wins.{model}")
+            _last_llm_error = None
+            return content
+        wait_for = 0
+    _last_llm_error = str(last_exc) if last_exc else "Unknown OpenAI request failure."
+    return ""
+
+
+def _generate_with_llm(count: int, avoid_prompts: list[str] | None = None, focus: str | None = None) -> list[dict[str, str]]:
     global _last_llm_error
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         _last_llm_error = "OPENAI_API_KEY is not set."
         return []
     primary_model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    model_candidates = [primary_model, "gpt-4o-mini", "gpt-5"]
+    model_candidates = list(dict.fromkeys([primary_model, "gpt-4o-mini", "gpt-5"]))
     avoid_text = ""
     if avoid_prompts:
         sample = "; ".join(avoid_prompts[:30])
         avoid_text = f" Do not reuse or paraphrase these prompt stems: {sample}."
+    if focus:
+        avoid_text += f" Prioritize items that exercise: {focus}."
 
     instruction = (
         f"Generate {count} TOEFL Build-a-Sentence items in this exact format. "
@@ -739,38 +898,8 @@ def _generate_with_llm(count: int, avoid_prompts: list[str] | None = None) -> li
         "Include some items where prompt is a statement and response_template is a follow-up question ending with '?'."
         + avoid_text
     )
-    content = ""
-    last_exc: Exception | None = None
-    for model in model_candidates:
-        payload = {
-            "model": model,
-            "temperature": 0.9,
-            "messages": [
-                {"role": "system", "content": "You create TOEFL sentence-building items."},
-                {"role": "user", "content": instruction},
-            ],
-        }
-        req = urllib.request.Request(
-            "https://api.openai.com/v1/chat/completions",
-            data=json.dumps(payload).encode("utf-8"),
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}",
-            },
-            method="POST",
-        )
-        try:
-            with urllib.request.urlopen(req, timeout=40) as resp:
-                body = json.loads(resp.read().decode("utf-8"))
-            content = body["choices"][0]["message"]["content"]
-            _last_llm_error = None
-            break
-        except Exception as exc:
-            last_exc = exc
-            continue
-
+    content = _hedged_completion(model_candidates, instruction, api_key)
     if not content:
-        _last_llm_error = str(last_exc) if last_exc else "Unknown OpenAI request failure."
         return []
     rows = _extract_json(content)
     valid: list[dict[str, Any]] = []
@@ -810,148 +939,389 @@ def _generate_with_llm(count: int, avoid_prompts: list[str] | None = None) -> li
     return valid
 
 
-def _apply_difficulty_options(options: list[str], blank_count: int, difficulty: str) -> list[str]:
+def _generate_batches(
+    batches: int, count: int, avoid_prompts: list[str] | None = None, focus: str | None = None
+) -> list[dict[str, Any]]:
+    if batches <= 1:
+        return _generate_with_llm(count, avoid_prompts=avoid_prompts, focus=focus)
+    futures = [_batch_executor.submit(_generate_with_llm, count, avoid_prompts, focus) for _ in range(batches)]
+    out: list[dict[str, Any]] = []
+    for fut in as_completed(futures):
+        try:
+            out.extend(fut.result())
+        except Exception:
+            continue
+    return out
+
+
+def _apply_difficulty_options(
+    options: list[str], blank_count: int, difficulty: str, rng: random.Random | None = None
+) -> list[str]:
+    rng = rng or _default_rng
     out = list(options[:blank_count])
     if difficulty == "normal":
-        random.shuffle(out)
+        rng.shuffle(out)
         return out
     if difficulty == "hard":
-        if random.random() < 0.45:
-            extra_count = random.choice([1, 2])
+        if rng.random() < 0.45:
+            extra_count = rng.choice([1, 2])
         else:
             extra_count = 0
     elif difficulty == "very_hard":
-        extra_count = random.choice([2, 3])
+        extra_count = rng.choice([2, 3])
     else:
-        extra_count = random.choice([3, 4, 5])
+        extra_count = rng.choice([3, 4, 5])
     if extra_count > 0:
         existing = set(w.lower() for w in out)
         candidates = [w for w in DECOY_WORDS if w.lower() not in existing]
-        random.shuffle(candidates)
+        rng.shuffle(candidates)
         out.extend(candidates[:extra_count])
-    random.shuffle(out)
+    rng.shuffle(out)
     return out
 
 
-def generate_sentence_set(count: int = 10, difficulty: str = "hard") -> dict[str, Any]:
-    global _used_question_keys
-    fresh: list[dict[str, Any]] = []
-    seen_batch: set[str] = set()
-    for _ in range(8):
-        avoid = list(_used_question_keys.union(seen_batch))
-        generated = _generate_with_llm(max(count * 8, 80), avoid_prompts=avoid)
-        for g in generated:
-            key = _question_key(g["prompt"], g["answer"])
-            if key in _used_question_keys or key in seen_batch:
-                continue
-            seen_batch.add(key)
-            fresh.append(g)
-            if len(fresh) >= count:
-                break
-        if len(fresh) >= count:
-            break
-    if len(fresh) < count:
-        for q in QUESTION_BANK:
-            key = _question_key(q["prompt"], q["answer"])
-            if key in _used_question_keys or key in seen_batch:
-                continue
-            seen_batch.add(key)
-            fresh.append(
-                {
-                    "prompt": q["prompt"],
-                    "answer": q["answer"],
-                    "response_template": q["response_template"],
-                    "pattern": q.get("pattern", _infer_pattern_label(q["prompt"], q["answer"])),
-                    "context": _infer_context_label(q["prompt"], q["answer"]),
-                    "grammar_tags": _infer_grammar_tags(q["prompt"], q["answer"]),
-                }
-            )
-            if len(fresh) >= count:
-                break
-    if len(fresh) < count:
-        detail = _last_llm_error or "LLM returned insufficient unique items."
-        raise RuntimeError(f"Unable to generate enough non-repeating sentence questions. {detail}")
-    picks = _select_balanced(fresh, count)
-    set_id = f"sentence-{uuid.uuid4().hex[:8]}"
-    questions = []
-    for i, item in enumerate(picks, start=1):
-        s = item["answer"]
-        template, options = _coerce_valid_template(s, item.get("response_template"))
-        random.shuffle(options)
+SET_TITLE = "Build a Sentence"
+SET_DIRECTIONS = "Move the words in the boxes to create grammatical sentences."
+SET_TIME_MINUTES = 5
+
+
+def _question_rng(seed: int, number: int) -> random.Random:
+    # One stream per question, so a question rebuilds identically regardless of its neighbours.
+    return random.Random(f"{seed}:{number}")
+
 
+def _build_question(number: int, item: dict[str, Any], difficulty: str, seed: int) -> dict[str, Any]:
+    rng = _question_rng(seed, number)
+    s = item["answer"]
+    template, options = _coerce_valid_template(s, item.get("response_template"), rng)
+    rng.shuffle(options)
+
+    blank_count = template.count("__")
+    if blank_count <= 0 or len(options) < blank_count:
+        template, options = _build_template(s, rng)
         blank_count = template.count("__")
-        if blank_count <= 0 or len(options) < blank_count:
-            template, options = _build_template(s)
-            blank_count = template.count("__")
-            if len(options) < blank_count:
-                words = [w for w in _tokenize(s) if _is_word(w)]
-                while len(options) < blank_count and words:
-                    options.append(words[len(options) % len(words)])
-
-        options = _apply_difficulty_options(options, blank_count, difficulty)
-        options = [opt.lower() for opt in options]
-
-        questions.append(
-            {
-                "question_id": f"q{i}",
-                "prompt": item["prompt"],
-                "response_template": template,
-                "tokens": options,
-                "answer": s,
-            }
-        )
+        if len(options) < blank_count:
+            words = [w for w in _tokenize(s) if _is_word(w)]
+            while len(options) < blank_count and words:
+                options.append(words[len(options) % len(words)])
+
+    options = _apply_difficulty_options(options, blank_count, difficulty, rng)
+    options = [opt.lower() for opt in options]
+    return {
+        "question_id": f"q{number}",
+        "item_key": item["item_key"],
+        "prompt": item["prompt"],
+        "response_template": template,
+        "tokens": options,
+        "answer": s,
+    }
+
+
+def public_question(q: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "question_id": q["question_id"],
+        "prompt": q["prompt"],
+        "response_template": q["response_template"],
+        "tokens": q["tokens"],
+    }
+
 
-    time_minutes = 5
-    runtime_payload = {
+class _CandidatePool:
+    # Candidates for one request: normalized to stored-item records and deduplicated against recently
+    # served items and each other. Model output is also checked against paraphrases of served items;
+    # inventory items were checked against each other when they were stored.
+    def __init__(self, window: int):
+        self.items: list[dict[str, Any]] = []
+        self.seen: set[str] = set()
+        self.batch_index = NearDuplicateIndex(max_items=max(window, 400))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def accept(self, item: dict[str, Any], stored: bool = False) -> bool:
+        prompt, answer = item["prompt"], item["answer"]
+        if "item_key" not in item:
+            # Everything is normalized to a stored-item record so the set can be rebuilt from item keys.
+            item = build_item_record(prompt, answer, item.get("response_template"), item.get("pattern"))
+            if item is None:
+                return False
+            prompt, answer = item["prompt"], item["answer"]
+        key = _question_key(prompt, answer)
+        if key in self.seen or key in question_filter:
+            return False
+        if not stored and near_duplicate_index.is_near_duplicate(prompt, answer):
+            return False
+        if self.batch_index.is_near_duplicate(prompt, answer):
+            return False
+        self.seen.add(key)
+        self.batch_index.add(prompt, answer)
+        self.items.append(item)
+        return True
+
+    def top_up(self, target: int, rounds: int, batches: int, batch_size: int) -> None:
+        for _ in range(rounds):
+            if len(self.items) >= target:
+                return
+            avoid = near_duplicate_index.avoid_stems(20) + [item["prompt"] for item in self.items[:10]]
+            for g in _generate_batches(batches, batch_size, avoid_prompts=avoid):
+                if self.accept(g) and len(self.items) >= target:
+                    break
+        if len(self.items) < target:
+            for q in QUESTION_BANK:
+                if len(self.items) >= target:
+                    break
+                self.accept(q)
+
+
+def _runtime_payload(
+    set_id: str,
+    difficulty: str,
+    seed: int,
+    questions: list[dict[str, Any]],
+    items: list[dict[str, Any]],
+    time_minutes: int = SET_TIME_MINUTES,
+) -> dict[str, Any]:
+    return {
         "set_id": set_id,
-        "title": "Build a Sentence",
-        "directions": "Move the words in the boxes to create grammatical sentences.",
+        "title": SET_TITLE,
+        "directions": SET_DIRECTIONS,
         "time_minutes": time_minutes,
         "difficulty": difficulty,
+        "seed": seed,
         "questions": questions,
+        "items": items,
     }
-    _runtime_sets[set_id] = runtime_payload
-    for q in questions:
-        _remember_question_key(_question_key(q["prompt"], q["answer"]))
-    public_questions = [
-        {
-            "question_id": q["question_id"],
-            "prompt": q["prompt"],
-            "response_template": q["response_template"],
-            "tokens": q["tokens"],
-        }
-        for q in questions
-    ]
+
+
+def public_sentence_set(payload: dict[str, Any]) -> dict[str, Any]:
     return {
+        "set_id": payload["set_id"],
+        "title": payload["title"],
+        "directions": payload["directions"],
+        "time_minutes": payload["time_minutes"],
+        "difficulty": payload["difficulty"],
+        "questions": [public_question(q) for q in payload["questions"]],
+    }
+
+
+def _remember_set(payload: dict[str, Any]) -> None:
+    for q in payload["questions"]:
+        _remember_question_key(_question_key(q["prompt"], q["answer"]))
+        near_duplicate_index.add(q["prompt"], q["answer"])
+
+
+def _pool_exhausted() -> RuntimeError:
+    return RuntimeError("Not enough unused sentence questions are available right now. Try again shortly.")
+
+
+def iter_sentence_set(
+    count: int = 10,
+    difficulty: str = "hard",
+    candidate_pool: list[dict[str, Any]] | None = None,
+    generate: bool = True,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    # Yields ("header", ...), one ("question", ...) per question as soon as it is final, then
+    # ("complete", runtime_payload) once the set is registered for grading. With generate=False the set
+    # is selected from candidate_pool alone and the model is never called.
+    set_id = f"sentence-{uuid.uuid4().hex[:8]}"
+    seed = random.getrandbits(32)
+    yield "header", {
         "set_id": set_id,
-        "title": "Build a Sentence",
-        "directions": "Move the words in the boxes to create grammatical sentences.",
-        "time_minutes": time_minutes,
+        "title": SET_TITLE,
+        "directions": SET_DIRECTIONS,
+        "time_minutes": SET_TIME_MINUTES,
         "difficulty": difficulty,
-        "questions": public_questions,
+        "count": count,
+    }
+    pool = _CandidatePool(window=count * 40)
+
+    for item in candidate_pool or []:
+        pool.accept(item, stored=True)
+    if len(pool) < count and not generate:
+        raise _pool_exhausted()
+
+    questions: list[dict[str, Any]] = []
+    committed: list[int] = []
+    if len(pool) < count:
+        # Required-family seeds belong to every balanced set, so they go out before the model is called.
+        committed = _SelectorIndex(pool.items).seed(count)
+        for i in committed:
+            questions.append(_build_question(len(questions) + 1, pool.items[i], difficulty, seed))
+            yield "question", public_question(questions[-1])
+        pool.top_up(count, rounds=4, batches=LLM_PARALLEL_BATCHES, batch_size=max(count * 4, 40))
+    if len(pool) < count:
+        detail = _last_llm_error or "LLM returned insufficient unique items."
+        raise RuntimeError(f"Unable to generate enough non-repeating sentence questions. {detail}")
+    picks = _SelectorIndex(pool.items).select_indices(count, fixed=committed)
+    for i in picks[len(committed) :]:
+        questions.append(_build_question(len(questions) + 1, pool.items[i], difficulty, seed))
+        yield "question", public_question(questions[-1])
+
+    runtime_payload = _runtime_payload(set_id, difficulty, seed, questions, [pool.items[i] for i in picks])
+    runtime_sets.put(set_id, runtime_payload)
+    _remember_set(runtime_payload)
+    yield "complete", runtime_payload
+
+
+def generate_sentence_set(
+    count: int = 10,
+    difficulty: str = "hard",
+    candidate_pool: list[dict[str, Any]] | None = None,
+    generate: bool = True,
+) -> dict[str, Any]:
+    public_set: dict[str, Any] = {}
+    for event, data in iter_sentence_set(count, difficulty, candidate_pool, generate):
+        if event == "header":
+            public_set = {k: v for k, v in data.items() if k != "count"}
+            public_set["questions"] = []
+        elif event == "question":
+            public_set["questions"].append(data)
+    return public_set
+
+
+class _ClassroomSelection(_BalancedSelection):
+    # A balanced selection for one student that also respects the class-wide overlap limits:
+    # an item may go to at most `max_item_reuse` students, and two students share at most `max_shared` items.
+    def __init__(
+        self,
+        index: _SelectorIndex,
+        count: int,
+        uses: list[int],
+        holders: list[list[int]],
+        max_shared: int,
+        max_item_reuse: int,
+    ):
+        super().__init__(index, count)
+        self.uses = uses
+        self.holders = holders
+        self.max_shared = max_shared
+        self.max_item_reuse = max_item_reuse
+        self.shared: dict[int, int] = {}
+
+    def _available(self, i: int) -> bool:
+        if i in self.used or self.uses[i] >= self.max_item_reuse:
+            return False
+        return all(self.shared.get(s, 0) < self.max_shared for s in self.holders[i])
+
+    def take(self, i: int) -> None:
+        super().take(i)
+        for s in self.holders[i]:
+            self.shared[s] = self.shared.get(s, 0) + 1
+
+    def run(self) -> list[int]:
+        super().run()
+        # The balancing passes only look at their own buckets; fill from anything the limits still allow.
+        for i in range(len(self.index.items)):
+            if self.full():
+                break
+            if self._available(i):
+                self.take(i)
+        return self.picked
+
+
+def generate_classroom_sets(
+    students: int,
+    count: int = 10,
+    difficulty: str = "hard",
+    candidate_pool: list[dict[str, Any]] | None = None,
+    max_shared: int | None = None,
+    max_item_reuse: int | None = None,
+    generate: bool = True,
+) -> list[dict[str, Any]]:
+    # All students draw from one shared pool, topped up by a single round of parallel LLM batches when
+    # generate is set, so the cost of a class is at most one generation round plus cheap per-student selection.
+    max_shared = count if max_shared is None else max(0, min(max_shared, count))
+    max_item_reuse = students if max_item_reuse is None else max(1, max_item_reuse)
+    slots = students * count
+    # Distinct items needed if every item were reused as often as allowed, with headroom for balancing.
+    target = min(slots, max(count * 3, -(-slots // max_item_reuse)))
+
+    pool = _CandidatePool(window=target * 4)
+    for item in candidate_pool or []:
+        pool.accept(item, stored=True)
+    if len(pool) < target and generate:
+        batch_size = max(count * 4, 40)
+        batches = max(LLM_PARALLEL_BATCHES, min(-(-(target - len(pool)) // batch_size), LLM_MAX_BATCHES))
+        pool.top_up(target, rounds=1, batches=batches, batch_size=batch_size)
+    if len(pool) < count and not generate:
+        raise _pool_exhausted()
+    if len(pool) < count:
+        detail = _last_llm_error or "LLM returned insufficient unique items."
+        raise RuntimeError(f"Unable to generate enough non-repeating sentence questions. {detail}")
+
+    index = _SelectorIndex(pool.items)
+    uses = [0] * len(pool.items)
+    holders: list[list[int]] = [[] for _ in pool.items]
+    payloads: list[dict[str, Any]] = []
+    for student in range(students):
+        selection = _ClassroomSelection(index, count, uses, holders, max_shared, max_item_reuse)
+        picks = selection.run()
+        if len(picks) < count:
+            metrics.inc("sentence_classroom.overlap_exhausted")
+            raise RuntimeError(
+                f"Only {len(pool)} distinct questions are available, which is not enough for {students} students "
+                f"with at most {max_shared} shared questions per pair and {max_item_reuse} students per question."
+            )
+        for i in picks:
+            uses[i] += 1
+            holders[i].append(student)
+        set_id = f"sentence-{uuid.uuid4().hex[:8]}"
+        seed = random.getrandbits(32)
+        questions = [_build_question(n, pool.items[i], difficulty, seed) for n, i in enumerate(picks, start=1)]
+        payloads.append(_runtime_payload(set_id, difficulty, seed, questions, [pool.items[i] for i in picks]))
+
+    for payload in payloads:
+        runtime_sets.put(payload["set_id"], payload)
+        _remember_set(payload)
+    metrics.inc("sentence_classroom.sets", len(payloads))
+    return payloads
+
+
+def compact_sentence_set(payload: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "v": 2,
+        "set_id": payload["set_id"],
+        "difficulty": payload["difficulty"],
+        "time_minutes": payload["time_minutes"],
+        "seed": payload["seed"],
+        "items": [q["item_key"] for q in payload["questions"]],
     }
 
 
+def rebuild_sentence_set(record: dict[str, Any], items_by_key: dict[str, dict[str, Any]]) -> dict[str, Any] | None:
+    items = [items_by_key.get(key) for key in record["items"]]
+    if any(item is None for item in items):
+        return None
+    return _runtime_payload(
+        record["set_id"],
+        record["difficulty"],
+        record["seed"],
+        [_build_question(n, item, record["difficulty"], record["seed"]) for n, item in enumerate(items, start=1)],
+        items,
+        time_minutes=record["time_minutes"],
+    )
+
+
 def get_runtime_set(set_id: str) -> dict[str, Any] | None:
-    return _runtime_sets.get(set_id)
+    return runtime_sets.get(set_id)
+
+
+def register_runtime_set(set_id: str, payload: dict[str, Any], ttl_seconds: float | None = None) -> None:
+    runtime_sets.put(set_id, payload, ttl_seconds=ttl_seconds)
 
 
-def register_runtime_set(set_id: str, payload: dict[str, Any]) -> None:
-    _runtime_sets[set_id] = payload
+def question_recently_used(prompt: str, answer: str) -> bool:
+    return _question_key(prompt, answer) in question_filter
 
 
 def _remember_question_key(key: str) -> None:
-    if key in _used_question_keys:
-        return
-    _used_question_keys.add(key)
-    _used_question_order.append(key)
-    if len(_used_question_order) > _MAX_USED_QUESTION_MEMORY:
-        evicted = _used_question_order.popleft()
-        _used_question_keys.discard(evicted)
+    question_filter.add(key)
 
 
-def grade_sentence_set(set_id: str, answers: dict[str, str]) -> dict[str, Any] | None:
-    test_set = _runtime_sets.get(set_id)
+def grade_sentence_set(
+    set_id: str, answers: dict[str, str], test_set: dict[str, Any] | None = None
+) -> dict[str, Any] | None:
+    test_set = test_set or runtime_sets.get(set_id)
     if not test_set:
         return None
     explanations: list[dict[str, Any]] = []
@@ -0,0 +1,283 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import SentenceItem, SentenceSetCache
+from .metrics import metrics
+from .near_duplicates import NearDuplicateIndex, near_duplicate_index
+from .periodic import PeriodicTask
+from .sentence_builder import (
+    INVENTORY_FAMILY_TARGET,
+    INVENTORY_TAG_TARGET,
+    LLM_PARALLEL_BATCHES,
+    QUESTION_BANK,
+    REQUIRED_FAMILIES,
+    TARGET_GRAMMAR_TAGS,
+    build_item_record,
+    generate_candidate_items,
+    item_key,
+    question_recently_used,
+)
+
+logger = logging.getLogger(__name__)
+
+REPLENISH_BATCH = 40
+REPLENISH_MAX_BATCHES = 4
+# Servable counts are kept up to date as items are stored and served; a full scan only runs this often to pick
+# up items that aged out of the dedup window or were served by another worker.
+INVENTORY_RESYNC_SECONDS = float(os.getenv("SENTENCE_INVENTORY_RESYNC_SECONDS", "900"))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _row_to_item(row: SentenceItem) -> dict[str, Any]:
+    return {
+        "item_key": row.item_key,
+        "prompt": row.prompt,
+        "answer": row.answer,
+        "response_template": json.loads(row.response_template_json),
+        "pattern": row.pattern,
+        "family": row.family,
+        "format_group": row.format_group,
+        "context": row.context,
+        "topic": row.topic,
+        "grammar_tags": set(filter(None, row.grammar_tags.split(","))),
+    }
+
+
+class ServableCounts:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._family: Counter[str] = Counter()
+        self._grammar: Counter[str] = Counter()
+        self._synced_at: float | None = None
+
+    def _adjust(self, family: str, tags, sign: int) -> None:
+        self._family[family] += sign
+        for tag in tags:
+            self._grammar[tag] += sign
+
+    def resync(self, db: Session) -> None:
+        # Only servable items count: anything inside the dedup window cannot go into a set until it ages out.
+        family: Counter[str] = Counter()
+        grammar: Counter[str] = Counter()
+        rows = db.query(SentenceItem.prompt, SentenceItem.answer, SentenceItem.family, SentenceItem.grammar_tags)
+        for prompt, answer, fam, tags in rows.yield_per(1000):
+            if question_recently_used(prompt, answer):
+                continue
+            family[fam] += 1
+            grammar.update(filter(None, tags.split(",")))
+        with self._lock:
+            self._family, self._grammar = family, grammar
+            self._synced_at = time.monotonic()
+        metrics.inc("sentence_inventory.resyncs")
+
+    def stale(self) -> bool:
+        return self._synced_at is None or time.monotonic() - self._synced_at >= INVENTORY_RESYNC_SECONDS
+
+    def added(self, records: list[dict[str, Any]]) -> None:
+        with self._lock:
+            for r in records:
+                if not question_recently_used(r["prompt"], r["answer"]):
+                    self._adjust(r["family"], r["grammar_tags"], 1)
+
+    def served(self, items: list[dict[str, Any]]) -> None:
+        # Served items were servable when they were picked and are now inside the dedup window.
+        with self._lock:
+            for item in {i["item_key"]: i for i in items}.values():
+                self._adjust(item["family"], item["grammar_tags"], -1)
+
+    def snapshot(self) -> tuple[Counter[str], Counter[str]]:
+        with self._lock:
+            return Counter(self._family), Counter(self._grammar)
+
+
+servable_counts = ServableCounts()
+
+
+def store_items(db: Session, records: list[dict[str, Any]], source: str, commit: bool = True) -> int:
+    return len(_store_new_items(db, records, source, commit))
+
+
+def _store_new_items(db: Session, records: list[dict[str, Any]], source: str, commit: bool) -> list[dict[str, Any]]:
+    keys = [r["item_key"] for r in records]
+    existing = {row[0] for row in db.query(SentenceItem.item_key).filter(SentenceItem.item_key.in_(keys)).all()}
+    new: list[dict[str, Any]] = []
+    for r in records:
+        if r["item_key"] in existing:
+            continue
+        existing.add(r["item_key"])
+        new.append(r)
+        db.add(
+            SentenceItem(
+                item_key=r["item_key"],
+                prompt=r["prompt"],
+                answer=r["answer"],
+                response_template_json=json.dumps(r["response_template"]),
+                pattern=r["pattern"],
+                family=r["family"],
+                format_group=r["format_group"],
+                context=r["context"],
+                topic=r["topic"],
+                grammar_tags=",".join(sorted(r["grammar_tags"])),
+                source=source,
+            )
+        )
+    if new:
+        if commit:
+            db.commit()
+        servable_counts.added(new)
+        metrics.inc(f"sentence_inventory.added.{source}", len(new))
+    return new
+
+
+def rekey_items(db: Session) -> int:
+    # Items stored before the answer was part of item_key get their current key, and stored sets that refer
+    # to them are rewritten so they can still be rebuilt for grading.
+    renamed: dict[str, str] = {}
+    for row in db.query(SentenceItem).yield_per(1000):
+        key = item_key(row.prompt, row.answer)
+        if row.item_key != key:
+            renamed[row.item_key] = key
+    if not renamed:
+        return 0
+    for old, new in renamed.items():
+        db.execute(update(SentenceItem).where(SentenceItem.item_key == old).values(item_key=new))
+    for row in db.query(SentenceSetCache).all():
+        payload = json.loads(row.payload_json)
+        if any(key in renamed for key in payload.get("items") or ()):
+            payload["items"] = [renamed.get(key, key) for key in payload["items"]]
+            row.payload_json = json.dumps(payload)
+    db.commit()
+    logger.info("Re-keyed %s sentence items", len(renamed))
+    return len(renamed)
+
+
+def seed_inventory(db: Session) -> int:
+    records = [build_item_record(q["prompt"], q["answer"], q.get("response_template"), q.get("pattern")) for q in QUESTION_BANK]
+    return store_items(db, [r for r in records if r], source="bank")
+
+
+def inventory_candidates(db: Session, count: int, limit: int | None = None) -> list[dict[str, Any]]:
+    # Never-served items first (shuffled), then the longest unserved, so rows still inside the dedup window
+    # sort last and the selector sees a broad mix without reading the whole table.
+    limit = limit or max(count * 12, 120)
+    order = (SentenceItem.last_served_at, SentenceItem.served_count, func.random())
+    rows = db.query(SentenceItem).order_by(*order).limit(limit).all()
+    return [_row_to_item(r) for r in rows if not question_recently_used(r.prompt, r.answer)]
+
+
+def mark_served(db: Session, items: list[dict[str, Any]], commit: bool = True) -> None:
+    # Items that came straight from the model (cold start) are kept so the set can be rebuilt later.
+    new_keys = {r["item_key"] for r in _store_new_items(db, items, source="llm", commit=False)}
+    # Cold-start items were never counted as servable: their keys were remembered before they were stored.
+    servable_counts.served([item for item in items if item["item_key"] not in new_keys])
+    # An item handed to several students in one batch is counted once per student, in one UPDATE per count.
+    by_count: dict[int, list[str]] = {}
+    for key, n in Counter(item["item_key"] for item in items).items():
+        by_count.setdefault(n, []).append(key)
+    now = _utcnow()
+    for n, keys in by_count.items():
+        db.execute(
+            update(SentenceItem)
+            .where(SentenceItem.item_key.in_(keys))
+            .values(served_count=SentenceItem.served_count + n, last_served_at=now)
+        )
+    if commit:
+        db.commit()
+
+
+def items_by_keys(db: Session, keys: list[str]) -> dict[str, dict[str, Any]]:
+    rows = db.query(SentenceItem).filter(SentenceItem.item_key.in_(keys)).all()
+    return {row.item_key: _row_to_item(row) for row in rows}
+
+
+def inventory_is_empty(db: Session) -> bool:
+    return db.query(SentenceItem.id).first() is None
+
+
+def inventory_shortfalls(db: Session) -> dict[str, dict[str, int]]:
+    if servable_counts.stale():
+        servable_counts.resync(db)
+    family_counts, tag_counts = servable_counts.snapshot()
+    return {
+        "family": {
+            f: INVENTORY_FAMILY_TARGET - family_counts.get(f, 0)
+            for f in REQUIRED_FAMILIES
+            if family_counts.get(f, 0) < INVENTORY_FAMILY_TARGET
+        },
+        "grammar": {
+            t: INVENTORY_TAG_TARGET - tag_counts[t] for t in TARGET_GRAMMAR_TAGS if tag_counts[t] < INVENTORY_TAG_TARGET
+        },
+    }
+
+
+def inventory_size() -> int:
+    with SessionLocal() as db:
+        return db.query(func.count(SentenceItem.id)).scalar() or 0
+
+
+def _inventory_paraphrases(db: Session) -> NearDuplicateIndex:
+    rows = db.query(SentenceItem.prompt, SentenceItem.answer).all()
+    index = NearDuplicateIndex(max_items=len(rows) + REPLENISH_MAX_BATCHES * REPLENISH_BATCH * LLM_PARALLEL_BATCHES)
+    for prompt, answer in rows:
+        index.add(prompt, answer)
+    return index
+
+
+def replenish_inventory(db: Session) -> int:
+    added = 0
+    paraphrases: NearDuplicateIndex | None = None
+    for _ in range(REPLENISH_MAX_BATCHES):
+        shortfalls = inventory_shortfalls(db)
+        if not shortfalls["family"] and not shortfalls["grammar"]:
+            break
+        # New items must not paraphrase stored or recently served ones: sets are assembled from stored items
+        # with only the exact-repeat window applied.
+        if paraphrases is None:
+            paraphrases = _inventory_paraphrases(db)
+        focus_parts = [f.replace("_", " ") for f in shortfalls["family"]]
+        focus_parts += sorted(shortfalls["grammar"], key=lambda t: -shortfalls["grammar"][t])[:4]
+        avoid = [row[0] for row in db.query(SentenceItem.prompt).order_by(SentenceItem.id.desc()).limit(40).all()]
+        records = generate_candidate_items(
+            REPLENISH_BATCH, avoid_prompts=avoid, focus=", ".join(focus_parts), batches=LLM_PARALLEL_BATCHES
+        )
+        fresh = []
+        for r in records:
+            if paraphrases.is_near_duplicate(r["prompt"], r["answer"]):
+                continue
+            if near_duplicate_index.is_near_duplicate(r["prompt"], r["answer"]):
+                continue
+            paraphrases.add(r["prompt"], r["answer"])
+            fresh.append(r)
+        new = store_items(db, fresh, source="llm")
+        added += new
+        if not new:
+            break
+    return added
+
+
+def _replenish_once() -> None:
+    if not os.getenv("OPENAI_API_KEY"):
+        return
+    with SessionLocal() as db:
+        added = replenish_inventory(db)
+    if added:
+        logger.info("Sentence inventory replenished with %s items", added)
+
+
+inventory_replenisher = PeriodicTask(
+    "sentence_inventory.replenisher", float(os.getenv("SENTENCE_INVENTORY_REFILL_SECONDS", "300")), _replenish_once
+)
+metrics.register_gauge("sentence_inventory.size", inventory_size)
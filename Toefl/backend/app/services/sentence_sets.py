@@ -0,0 +1,134 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import and_, delete, func, or_
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import SentenceSetCache
+from .metrics import metrics
+from .periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Sets stay gradable for their time limit plus this grace period (late submits, slow networks, reloads).
+SET_GRACE_SECONDS = int(os.getenv("SENTENCE_SET_GRACE_SECONDS", "1800"))
+COMPACT_BATCH_SIZE = 500
+# Rows written before expires_at existed have no expiry; they are dropped after this age.
+LEGACY_MAX_AGE_SECONDS = 24 * 3600
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def set_ttl_seconds(payload: dict[str, Any]) -> float:
+    return float(payload.get("time_minutes") or 0) * 60 + SET_GRACE_SECONDS
+
+
+def set_expires_at(payload: dict[str, Any]) -> datetime:
+    return _utcnow() + timedelta(seconds=set_ttl_seconds(payload))
+
+
+class RuntimeSetStore:
+    def __init__(self, max_entries: int = 1024):
+        self._lock = threading.Lock()
+        self._sets: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._max_entries = max_entries
+
+    def get(self, set_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._sets.get(set_id)
+            if entry is None:
+                metrics.inc("sentence_sets.memory_misses")
+                return None
+            expires, payload = entry
+            if expires < time.monotonic():
+                del self._sets[set_id]
+                metrics.inc("sentence_sets.expired")
+                return None
+            self._sets.move_to_end(set_id)
+        metrics.inc("sentence_sets.memory_hits")
+        return payload
+
+    def put(self, set_id: str, payload: dict[str, Any], ttl_seconds: float | None = None) -> None:
+        ttl = set_ttl_seconds(payload) if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._sets[set_id] = (time.monotonic() + ttl, payload)
+            self._sets.move_to_end(set_id)
+            while len(self._sets) > self._max_entries:
+                self._sets.popitem(last=False)
+                metrics.inc("sentence_sets.evictions")
+
+    def prune(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (expires, _) in self._sets.items() if expires < now]
+            for k in expired:
+                del self._sets[k]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._sets)
+
+
+def _expired_filter(now: datetime):
+    legacy_cutoff = now - timedelta(seconds=LEGACY_MAX_AGE_SECONDS)
+    return or_(
+        SentenceSetCache.expires_at < now,
+        and_(SentenceSetCache.expires_at.is_(None), SentenceSetCache.created_at < legacy_cutoff),
+    )
+
+
+def compact_sentence_set_cache(db: Session, batch_size: int = COMPACT_BATCH_SIZE) -> dict[str, int]:
+    # Deletes in small batches so writers are never blocked behind one long SQLite transaction.
+    now = _utcnow()
+    rows = 0
+    payload_bytes = 0
+    batches = 0
+    while True:
+        batch = (
+            db.query(SentenceSetCache.id, func.length(SentenceSetCache.payload_json))
+            .filter(_expired_filter(now))
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        ids = [pk for pk, _ in batch]
+        db.execute(delete(SentenceSetCache).where(SentenceSetCache.id.in_(ids)))
+        db.commit()
+        rows += len(ids)
+        payload_bytes += sum(size or 0 for _, size in batch)
+        batches += 1
+        if len(batch) < batch_size:
+            break
+    metrics.inc("sentence_set_cache.compacted_rows", rows)
+    metrics.inc("sentence_set_cache.compacted_bytes", payload_bytes)
+    return {"rows": rows, "payload_bytes": payload_bytes, "batches": batches}
+
+
+def _compact_once() -> None:
+    pruned = runtime_sets.prune()
+    with SessionLocal() as db:
+        report = compact_sentence_set_cache(db)
+    if report["rows"] or pruned:
+        logger.info(
+            "Sentence set compaction: %s rows (%s payload bytes) in %s batches, %s in-memory sets expired",
+            report["rows"],
+            report["payload_bytes"],
+            report["batches"],
+            pruned,
+        )
+
+
+runtime_sets = RuntimeSetStore(max_entries=int(os.getenv("SENTENCE_SET_CACHE_SIZE", "1024")))
+sentence_set_compactor = PeriodicTask(
+    "sentence_set_cache.compactor", float(os.getenv("SENTENCE_SET_COMPACT_SECONDS", "600")), _compact_once
+)
+metrics.register_gauge("sentence_sets.in_memory", lambda: len(runtime_sets))
@@ -0,0 +1,76 @@
+import base64
+import hashlib
+import json
+import os
+import time
+import zlib
+from typing import Any
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+    InvalidTag = ValueError
+
+from .metrics import metrics
+from .sentence_sets import set_ttl_seconds
+
+TOKEN_VERSION = 1
+_AAD = b"toefl-sentence-set"
+_NONCE_BYTES = 12
+
+
+def _token_key() -> bytes | None:
+    secret = os.getenv("SENTENCE_SET_TOKEN_SECRET")
+    if not secret:
+        return None
+    if AESGCM is None:
+        # Silently issuing unsealed sets would leave a multi-worker deployment unable to grade them.
+        raise RuntimeError("SENTENCE_SET_TOKEN_SECRET is set but `cryptography` is not installed.")
+    return hashlib.sha256(secret.encode("utf-8")).digest()
+
+
+# Checked at import so a misconfigured worker fails at startup rather than on its first set.
+_token_key()
+
+
+def seal_sentence_set(payload: dict[str, Any]) -> str | None:
+    key = _token_key()
+    if key is None:
+        return None
+    # Question ids are positional (q1..qN), so only the answers need to travel.
+    compact = {
+        "id": payload["set_id"],
+        "d": payload.get("difficulty"),
+        "exp": int(time.time() + set_ttl_seconds(payload)),
+        "a": [q["answer"] for q in payload["questions"]],
+    }
+    raw = zlib.compress(json.dumps(compact, separators=(",", ":")).encode("utf-8"))
+    nonce = os.urandom(_NONCE_BYTES)
+    sealed = AESGCM(key).encrypt(nonce, raw, _AAD)
+    return base64.urlsafe_b64encode(bytes([TOKEN_VERSION]) + nonce + sealed).rstrip(b"=").decode("ascii")
+
+
+def open_set_token(token: str, set_id: str) -> dict[str, Any] | None:
+    key = _token_key()
+    if key is None or not token:
+        return None
+    try:
+        blob = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        if len(blob) <= 1 + _NONCE_BYTES or blob[0] != TOKEN_VERSION:
+            raise ValueError("unsupported token")
+        raw = AESGCM(key).decrypt(blob[1 : 1 + _NONCE_BYTES], blob[1 + _NONCE_BYTES :], _AAD)
+        compact = json.loads(zlib.decompress(raw))
+    except (InvalidTag, ValueError, zlib.error):
+        metrics.inc("set_tokens.rejected")
+        return None
+    if compact.get("id") != set_id or int(compact.get("exp") or 0) < time.time():
+        metrics.inc("set_tokens.expired_or_mismatched")
+        return None
+    metrics.inc("set_tokens.opened")
+    return {
+        "set_id": set_id,
+        "difficulty": compact.get("d"),
+        "questions": [{"question_id": f"q{i}", "answer": a} for i, a in enumerate(compact["a"], start=1)],
+    }
@@ -0,0 +1,120 @@
+import re
+from typing import Any
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?")
+STOPWORDS = {
+    "about", "after", "also", "been", "before", "being", "both", "could", "does", "each", "either", "from",
+    "have", "here", "into", "just", "many", "more", "most", "much", "must", "only", "other", "over", "should",
+    "some", "such", "than", "that", "their", "them", "then", "there", "these", "they", "this", "those", "very",
+    "what", "when", "where", "which", "while", "will", "with", "would", "your", "yours", "you're", "it's",
+}
+# Bullet instructions start with a task verb that students rarely repeat verbatim.
+INSTRUCTION_WORDS = {
+    "describe", "explain", "request", "propose", "confirm", "summarize", "clarify", "suggest", "state",
+    "provide", "offer", "mention", "tell", "give", "include", "write", "share", "express",
+}
+
+
+def light_stem(token: str) -> str:
+    t = token.lower()
+    if t.endswith("'s"):
+        t = t[:-2]
+    if len(t) > 4 and t.endswith("ies"):
+        t = t[:-3] + "y"
+    elif t.endswith("sses"):
+        t = t[:-2]
+    elif len(t) > 3 and t.endswith("s") and not t.endswith(("ss", "us", "is")):
+        t = t[:-1]
+    for suffix in ("ing", "ed"):
+        if t.endswith(suffix) and len(t) - len(suffix) >= 3:
+            t = t[: -len(suffix)]
+            if len(t) > 3 and t[-1] == t[-2] and t[-1] not in "lsz":
+                t = t[:-1]
+            break
+    if len(t) > 5 and t.endswith("ly"):
+        t = t[:-2]
+    if len(t) > 3 and t.endswith("e"):
+        t = t[:-1]
+    return t
+
+
+def content_terms(text: str, min_len: int = 4, limit: int | None = None) -> list[str]:
+    out: list[str] = []
+    seen: set[str] = set()
+    for m in _TOKEN_RE.finditer(text or ""):
+        tok = m.group().lower()
+        if len(tok) < min_len or tok in STOPWORDS or tok in INSTRUCTION_WORDS or tok in seen:
+            continue
+        seen.add(tok)
+        out.append(tok)
+        if limit is not None and len(out) >= limit:
+            break
+    return out
+
+
+class TextIndex:
+    def __init__(self, text: str):
+        self._spans: list[tuple[int, int]] = []
+        self._tokens: list[str] = []
+        self._stems: list[str] = []
+        self._positions: dict[str, list[int]] = {}
+        self._stem_positions: dict[str, list[int]] = {}
+        for m in _TOKEN_RE.finditer(text or ""):
+            tok = m.group().lower()
+            stem = light_stem(tok)
+            i = len(self._tokens)
+            self._spans.append(m.span())
+            self._tokens.append(tok)
+            self._stems.append(stem)
+            self._positions.setdefault(tok, []).append(i)
+            self._stem_positions.setdefault(stem, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    @property
+    def vocabulary(self) -> set[str]:
+        return set(self._positions)
+
+    def token(self, i: int) -> tuple[str, int, int]:
+        # Stem and character span of the i-th token; negative i counts from the end.
+        return self._stems[i], *self._spans[i]
+
+    def _token_positions(self, term: str, stem: bool) -> list[int]:
+        t = (term or "").lower()
+        if stem:
+            return self._stem_positions.get(light_stem(t), [])
+        return self._positions.get(t, [])
+
+    def contains(self, term: str, stem: bool = True) -> bool:
+        return bool(self._token_positions(term, stem))
+
+    def find_term(self, term: str, stem: bool = True) -> list[tuple[int, int]]:
+        return [self._spans[i] for i in self._token_positions(term, stem)]
+
+    def find_phrase(self, phrase: str, stem: bool = True) -> list[tuple[int, int]]:
+        parts = [m.group().lower() for m in _TOKEN_RE.finditer(phrase or "")]
+        if not parts:
+            return []
+        if len(parts) == 1:
+            return self.find_term(parts[0], stem=stem)
+        keys = [light_stem(p) for p in parts] if stem else parts
+        seq = self._stems if stem else self._tokens
+        out: list[tuple[int, int]] = []
+        # Only positions of the first word are candidates, so cost tracks its frequency, not essay length.
+        for start in self._token_positions(parts[0], stem):
+            end = start + len(keys)
+            if end <= len(seq) and seq[start:end] == keys:
+                out.append((self._spans[start][0], self._spans[end - 1][1]))
+        return out
+
+    def match_terms(self, terms: list[str], stem: bool = True, phrases: list[str] | None = None) -> list[dict[str, Any]]:
+        matches: list[dict[str, Any]] = []
+        for phrase in phrases or []:
+            for start, end in self.find_phrase(phrase, stem=stem):
+                matches.append({"term": phrase, "start": start, "end": end})
+        for term in terms:
+            for start, end in self.find_term(term, stem=stem):
+                matches.append({"term": term, "start": start, "end": end})
+        matches.sort(key=lambda x: (x["start"], -x["end"]))
+        return matches
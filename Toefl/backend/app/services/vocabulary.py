@@ -0,0 +1,115 @@
+import json
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+VOCAB_JSON_PATH = Path(__file__).resolve().parents[3] / "data" / "vocab" / "academic_vocabulary.json"
+_WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+# Weak words are flagged on first use; everything else only once it repeats.
+OVERUSE_THRESHOLD = 2
+
+
+class VocabularyEngine:
+    def __init__(self, path: Path = VOCAB_JSON_PATH):
+        self._path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._family_of: dict[str, str] = {}
+        self._band: dict[str, int] = {}
+        self._basic_of: dict[str, str] = {}
+        self._weak: set[str] = set()
+        self._upgrades: dict[str, list[dict[str, Any]]] = {}
+        self._phrases: dict[str, str] = {}
+        self._max_phrase_len = 1
+        self._general: list[dict[str, Any]] = []
+
+    def _ensure_loaded(self) -> None:
+        # Loaded on first use so worker startup does not pay for it.
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            data = json.loads(self._path.read_text(encoding="utf-8")) if self._path.exists() else {}
+            for fam in data.get("families", []):
+                self._band[fam["lemma"]] = int(fam["band"])
+                for form in fam["forms"]:
+                    self._family_of[form] = fam["lemma"]
+            for entry in data.get("basic_words", []):
+                lemma = entry["lemma"]
+                for form in entry["forms"]:
+                    self._basic_of[form] = lemma
+                if entry.get("weak"):
+                    self._weak.add(lemma)
+                self._upgrades[lemma] = sorted(entry["upgrades"], key=lambda u: self._band.get(u["family"], 99))
+            self._phrases = dict(data.get("phrases", {}))
+            self._max_phrase_len = max([len(p.split()) for p in self._phrases] or [1])
+            self._general = sorted(data.get("general", []), key=lambda u: self._band.get(u["family"], 99))
+            self._loaded = True
+
+    def analyze(self, text: str) -> tuple[Counter[str], set[str]]:
+        self._ensure_loaded()
+        tokens = _WORD_RE.findall((text or "").lower())
+        basic_counts: Counter[str] = Counter()
+        used_families: set[str] = set()
+        i = 0
+        while i < len(tokens):
+            matched = 0
+            for n in range(min(self._max_phrase_len, len(tokens) - i), 1, -1):
+                lemma = self._phrases.get(" ".join(tokens[i : i + n]))
+                if lemma:
+                    basic_counts[lemma] += 1
+                    matched = n
+                    break
+            if matched:
+                i += matched
+                continue
+            tok = tokens[i]
+            lemma = self._basic_of.get(tok)
+            if lemma:
+                basic_counts[lemma] += 1
+            family = self._family_of.get(tok)
+            if family:
+                used_families.add(family)
+            i += 1
+        return basic_counts, used_families
+
+    def _fits(self, upgrade: dict[str, Any], task_type: str | None, used_families: set[str]) -> bool:
+        if upgrade["family"] in used_families:
+            return False
+        contexts = upgrade.get("contexts")
+        return not (task_type and contexts and task_type not in contexts)
+
+    def suggest(self, text: str, task_type: str | None = None, limit: int = 8) -> list[str]:
+        basic_counts, used_families = self.analyze(text)
+        overused = [
+            (lemma, n)
+            for lemma, n in basic_counts.items()
+            if n >= OVERUSE_THRESHOLD or lemma in self._weak
+        ]
+        overused.sort(key=lambda x: (-x[1], x[0]))
+        out: list[str] = []
+        suggested: set[str] = set()
+        for lemma, count in overused:
+            picks = [u for u in self._upgrades.get(lemma, []) if self._fits(u, task_type, used_families)][:2]
+            picks = [u for u in picks if u["word"] not in suggested]
+            if not picks:
+                continue
+            suggested.update(u["word"] for u in picks)
+            times = f" (used {count}x)" if count > 1 else ""
+            out.append(f"{lemma}{times} -> {' / '.join(u['word'] for u in picks)}")
+            if len(out) >= limit:
+                return out
+        for upgrade in self._general:
+            if len(out) >= limit:
+                break
+            if upgrade["word"] in suggested or not self._fits(upgrade, task_type, used_families):
+                continue
+            suggested.add(upgrade["word"])
+            out.append(upgrade["word"])
+        return out
+
+
+vocabulary_engine = VocabularyEngine()
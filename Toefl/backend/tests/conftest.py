@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# The app opens its database and dedup file at import time, so they are pointed at a scratch directory
+# before any test module imports it.
+_scratch = tempfile.mkdtemp(prefix="toefl-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_scratch, 'test.db')}")
+os.environ.setdefault("SENTENCE_DEDUP_PATH", os.path.join(_scratch, "sentence_dedup.bin"))
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ.pop("SENTENCE_SET_TOKEN_SECRET", None)
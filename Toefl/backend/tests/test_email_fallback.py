@@ -0,0 +1,34 @@
+import app.services.prompt_store as prompt_store_module
+from app.services.metrics import metrics
+from app.services.prompt_index import ServedPromptWindow
+from app.services.prompt_store import PromptStore
+
+SERVED = {"title": "Library fine", "subject": "Overdue book fine", "raw_text": "Write to the librarian about a late fee."}
+FRESH = {"title": "Club budget", "subject": "Funding for the chess club", "raw_text": "Ask the dean for travel money."}
+
+
+def store_with_window(monkeypatch, variants):
+    window = ServedPromptWindow(size=16)
+    window.remember(SERVED)
+    monkeypatch.setattr(prompt_store_module, "served_email_window", window)
+    store = PromptStore()
+    queue = iter(variants)
+    monkeypatch.setattr(store, "_make_email_variant", lambda base: dict(next(queue)))
+    return store
+
+
+def test_fallback_skips_variants_inside_the_window(monkeypatch):
+    store = store_with_window(monkeypatch, [SERVED, SERVED, FRESH])
+    _, variant = store._fallback_email_variant([{"prompt_id": "e1"}])
+    assert variant == FRESH
+
+
+def test_saturated_window_serves_the_least_similar_variant(monkeypatch):
+    close = {**SERVED, "raw_text": SERVED["raw_text"] + " Mention the due date."}
+    store = store_with_window(monkeypatch, [SERVED, close] * prompt_store_module.EMAIL_FALLBACK_ATTEMPTS)
+    before = metrics.counter("prompt_store.email_window_saturated")
+    monkeypatch.setattr(prompt_store_module.served_email_window, "threshold", 0.0)
+    _, variant = store._fallback_email_variant([{"prompt_id": "e1"}])
+    assert variant == close
+    after = metrics.counter("prompt_store.email_window_saturated")
+    assert after == before + 1
@@ -0,0 +1,18 @@
+from app.services.near_duplicates import NearDuplicateIndex
+
+
+def test_near_duplicates_catch_paraphrases_only():
+    index = NearDuplicateIndex()
+    index.add("Are you going to the study group tonight?", "Yes, I am going to the study group after dinner.")
+    assert index.is_near_duplicate("Are you going to the study group tonight?", "Yes, I am going to the study group after dinner.")
+    assert not index.is_near_duplicate("Did the professor post the lab results?", "She posted them on the course page.")
+    assert index.avoid_stems() == ["Are you going to the study group tonight?"]
+
+
+def test_near_duplicate_window_is_bounded():
+    index = NearDuplicateIndex(max_items=2)
+    index.add("Where is the campus bookstore?", "It is next to the student center.")
+    index.add("When does the gym open?", "It opens at six in the morning.")
+    index.add("Who is leading the seminar?", "Professor Lee is leading it this week.")
+    assert len(index) == 2
+    assert not index.is_near_duplicate("Where is the campus bookstore?", "It is next to the student center.")
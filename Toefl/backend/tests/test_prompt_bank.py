@@ -0,0 +1,55 @@
+from app.services.prompt_bank import PromptBank, PromptBankWriter
+
+PROMPTS = [
+    {"prompt_id": "e1", "task_type": "email", "title": "Email 1", "bullet_points": ["Explain the issue"]},
+    {"prompt_id": "d1", "task_type": "discussion", "title": "Discussion 1", "professor_prompt": "Should students take a gap year?"},
+    {"prompt_id": "e2", "task_type": "email", "title": "Email 2 — café"},
+    {"prompt_id": "e1", "task_type": "email", "title": "Email 1 (repeat)"},
+]
+
+
+def test_written_bank_round_trips(tmp_path):
+    path = tmp_path / "prompts.bank"
+    with PromptBankWriter(path) as writer:
+        for prompt in PROMPTS:
+            writer.write(prompt)
+    bank = PromptBank.open(path)
+    assert bank.source == "mmap"
+    assert len(bank) == len(PROMPTS)
+    assert list(bank) == PROMPTS
+    assert bank[1:3] == PROMPTS[1:3]
+    assert bank.get("e2") == PROMPTS[2]
+    assert bank.get("missing") is None
+
+
+def test_open_and_from_prompts_agree(tmp_path):
+    path = tmp_path / "prompts.bank"
+    with PromptBankWriter(path) as writer:
+        for prompt in PROMPTS:
+            writer.write(prompt)
+    for bank in (PromptBank.open(path), PromptBank.from_prompts(PROMPTS)):
+        assert bank.indices("email") == [0, 2, 3]
+        assert bank.indices("discussion") == [1]
+        assert bank.indices("unknown") == []
+        view = bank.select(bank.indices("email"))
+        assert len(view) == 3
+        assert [p["title"] for p in view] == ["Email 1", "Email 2 — café", "Email 1 (repeat)"]
+        assert view[1:] == [PROMPTS[2], PROMPTS[3]]
+
+
+def test_duplicate_ids_resolve_to_first_occurrence():
+    bank = PromptBank.from_prompts(PROMPTS)
+    assert bank.position("e1") == 0
+    assert bank.get("e1")["title"] == "Email 1"
+
+
+def test_failed_write_leaves_no_bank(tmp_path):
+    path = tmp_path / "prompts.bank"
+    try:
+        with PromptBankWriter(path) as writer:
+            writer.write(PROMPTS[0])
+            raise RuntimeError("ingest failed")
+    except RuntimeError:
+        pass
+    assert not path.exists()
+    assert list(tmp_path.iterdir()) == []
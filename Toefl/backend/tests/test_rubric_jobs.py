@@ -0,0 +1,189 @@
+import json
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+import uvicorn
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "scripts"))
+
+from rubric_stub_server import create_app  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import RubricJob  # noqa: E402
+from app.services import rubric_jobs  # noqa: E402
+from app.services.prompt_store import prompt_store  # noqa: E402
+
+ESSAY = (
+    "Dear Professor Lee,\n\nI am writing to ask about the schedule for next week's workshop, because I have a lab "
+    "session at the same time. Could I attend the afternoon session instead? I would also like to know which "
+    "readings to prepare before the workshop begins.\n\nThank you for your help.\n\nBest regards,\nSam"
+)
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    def serve(fail_first: int = 0):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        stub = create_app(fail_first=fail_first)
+        server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + 10
+        while not server.started and time.monotonic() < deadline:
+            time.sleep(0.05)
+        servers.append((server, thread))
+        monkeypatch.setenv("RUBRIC_MODEL_ENABLED", "1")
+        monkeypatch.setenv("RUBRIC_MODEL_URL", f"http://127.0.0.1:{port}/v1/chat/completions")
+        monkeypatch.setenv("RUBRIC_MODEL", "stub-rater")
+        return stub
+
+    servers: list = []
+    yield serve
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+def _email_prompt_id() -> str:
+    prompt_store.reload()
+    return next(p["prompt_id"] for p in prompt_store.all_prompts() if p.get("task_type") == "email")
+
+
+def _poll(client: TestClient, job_id: str, until: set[str], timeout: float = 20.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        payload = client.get(f"/api/rubric-jobs/{job_id}").json()
+        if payload["status"] in until or time.monotonic() > deadline:
+            return payload
+        time.sleep(0.1)
+
+
+def test_job_completes_against_stub_model(stub_model):
+    stub = stub_model()
+    with TestClient(app) as client:
+        submitted = client.post("/api/submit", json={"prompt_id": _email_prompt_id(), "user_text": ESSAY}).json()
+        job_id = submitted["rubric_job_id"]
+        job = _poll(client, job_id, {"done", "failed"})
+    assert job["status"] == "done"
+    assert job["attempts"] == 1
+    assert job["result"]["scored_by"] == "stub-rater"
+    assert set(job["result"]["rubric_scores"].values()) == {4.2}
+    assert job["result"]["heuristic_rubric_scores"] == submitted["rubric_scores"]
+    assert stub.state.requests == 1
+
+
+def test_each_stored_submission_gets_its_own_job(stub_model):
+    stub_model()
+    body = {"prompt_id": _email_prompt_id(), "user_text": ESSAY + " Shared."}
+    with TestClient(app) as client:
+        first = client.post("/api/submit", json={**body, "student_id": "s-1"}).json()
+        second = client.post("/api/submit", json={**body, "student_id": "s-2"}).json()
+        repeat = client.post("/api/submit", json={**body, "student_id": "s-1"}).json()
+        anonymous = [client.post("/api/submit", json=body).json()["rubric_job_id"] for _ in range(2)]
+        for job_id in [first["rubric_job_id"], second["rubric_job_id"], *anonymous]:
+            assert _poll(client, job_id, {"done", "failed"})["status"] == "done"
+    assert first["rubric_job_id"] != second["rubric_job_id"]
+    assert repeat["rubric_job_id"] == first["rubric_job_id"]
+    assert anonymous[0] != anonymous[1]
+
+
+def test_failed_job_waits_before_retrying(stub_model, monkeypatch):
+    monkeypatch.setattr(rubric_jobs, "RETRY_BASE_SECONDS", 1.0)
+    stub = stub_model(fail_first=1)
+    with TestClient(app) as client:
+        job_id = client.post("/api/submit", json={"prompt_id": _email_prompt_id(), "user_text": ESSAY + " Again."}).json()[
+            "rubric_job_id"
+        ]
+        deadline = time.monotonic() + 10
+        while stub.state.requests < 1 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.3)
+        retrying = client.get(f"/api/rubric-jobs/{job_id}").json()
+        assert retrying["status"] == "queued"
+        assert retrying["attempts"] == 1
+        assert datetime.fromisoformat(retrying["next_attempt_at"]) > datetime.now(timezone.utc).replace(tzinfo=None)
+        assert stub.state.requests == 1
+        job = _poll(client, job_id, {"done", "failed"})
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+    assert stub.state.requests == 2
+
+
+def test_retry_delay_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr(rubric_jobs, "RETRY_BASE_SECONDS", 5.0)
+    monkeypatch.setattr(rubric_jobs, "RETRY_MAX_SECONDS", 30.0)
+    assert [rubric_jobs.retry_delay_seconds(n) for n in range(1, 6)] == [5.0, 10.0, 20.0, 30.0, 30.0]
+
+
+def _insert_job(**values) -> int:
+    with SessionLocal() as db:
+        job = RubricJob(job_id=f"rubric-test-{time.monotonic_ns()}", prompt_id="p", created_at=rubric_jobs._utcnow(), **values)
+        db.add(job)
+        db.commit()
+        return job.id
+
+
+def _job(pk: int) -> RubricJob:
+    with SessionLocal() as db:
+        return db.get(RubricJob, pk)
+
+
+def test_crash_outside_model_call_releases_the_job(monkeypatch):
+    monkeypatch.setattr(rubric_jobs, "RETRY_BASE_SECONDS", 0.0)
+    pk = _insert_job(status="running", attempts=1, request_json="not json")
+    runner = rubric_jobs.RubricJobRunner()
+    runner._run(pk)
+    job = _job(pk)
+    assert job.status == "queued"
+    assert job.error.startswith("Job crashed")
+    with SessionLocal() as db:
+        db.get(RubricJob, pk).status = "running"
+        db.get(RubricJob, pk).attempts = rubric_jobs.MAX_ATTEMPTS
+        db.commit()
+    runner._run(pk)
+    assert _job(pk).status == "failed"
+
+
+def test_stale_running_jobs_are_requeued_while_running(monkeypatch):
+    monkeypatch.setattr(rubric_jobs, "RECOVER_INTERVAL_SECONDS", 0.05)
+    monkeypatch.setattr(rubric_jobs.RubricJobRunner, "_claim", lambda self, limit: [])
+    started = rubric_jobs._utcnow() - timedelta(hours=1)
+    runner = rubric_jobs.RubricJobRunner(poll_interval=0.05)
+    monkeypatch.setenv("RUBRIC_MODEL_ENABLED", "1")
+    runner.start()
+    try:
+        pk = _insert_job(status="running", attempts=1, request_json="{}", started_at=started)
+        deadline = time.monotonic() + 5
+        while _job(pk).status == "running" and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        runner.stop()
+    assert _job(pk).status == "queued"
+
+
+def test_stop_requeues_claimed_jobs(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(rubric_jobs, "_call_rubric_model", lambda *args: release.wait(5) and {})
+    monkeypatch.setenv("RUBRIC_MODEL_ENABLED", "1")
+    pk = _insert_job(status="queued", request_json=json.dumps({"prompt": {}, "user_text": "", "heuristic": {}}))
+    runner = rubric_jobs.RubricJobRunner(poll_interval=0.05)
+    runner.start()
+    try:
+        deadline = time.monotonic() + 5
+        while _job(pk).status != "running" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert _job(pk).status == "running"
+    finally:
+        runner.stop()
+        release.set()
+    job = _job(pk)
+    assert (job.status, job.attempts) == ("queued", 0)
@@ -0,0 +1,56 @@
+import json
+
+from app.database import SessionLocal
+from app.models import SentenceItem, SentenceSetCache
+from app.services.sentence_builder import _question_key, _remember_question_key, build_item_record, item_key
+from app.services.sentence_inventory import (
+    items_by_keys,
+    mark_served,
+    rekey_items,
+    servable_counts,
+    store_items,
+)
+
+PROMPT = "Where should we meet before the seminar?"
+
+
+def test_items_with_the_same_prompt_keep_both_answers():
+    first = build_item_record(PROMPT, "We can meet outside the main library.")
+    second = build_item_record(PROMPT, "Let's meet at the cafe near the lab.")
+    assert first["item_key"] != second["item_key"]
+    with SessionLocal() as db:
+        assert store_items(db, [first, second], source="llm") == 2
+        stored = items_by_keys(db, [first["item_key"], second["item_key"]])
+    assert stored[second["item_key"]]["answer"] == "Let's meet at the cafe near the lab."
+
+
+def test_rekey_updates_items_and_stored_sets():
+    record = build_item_record("Did you finish the reading for Monday?", "I finished it on the bus this morning.")
+    with SessionLocal() as db:
+        store_items(db, [dict(record, item_key="legacy-key")], source="llm")
+        compact = {"v": 2, "set_id": "set-rekey", "difficulty": "hard", "time_minutes": 5, "seed": 1, "items": ["legacy-key"]}
+        db.add(SentenceSetCache(set_id="set-rekey", payload_json=json.dumps(compact)))
+        db.commit()
+        assert rekey_items(db) >= 1
+        assert rekey_items(db) == 0
+        key = item_key(record["prompt"], record["answer"])
+        assert db.query(SentenceItem).filter(SentenceItem.item_key == key).count() == 1
+        cached = db.query(SentenceSetCache).filter(SentenceSetCache.set_id == "set-rekey").one()
+        assert json.loads(cached.payload_json)["items"] == [key]
+
+
+def test_servable_counts_follow_stores_and_serves():
+    records = [
+        build_item_record("Are you joining the review session tonight?", "Yes, I will join it after my shift."),
+        build_item_record("Can you send me the slides from today?", "I will send them to you after lunch."),
+    ]
+    with SessionLocal() as db:
+        servable_counts.resync(db)
+        store_items(db, records, source="llm")
+        # Serving puts the item in the dedup window, which is what the full scan checks.
+        for item in records[:1]:
+            _remember_question_key(_question_key(item["prompt"], item["answer"]))
+        mark_served(db, records[:1])
+        incremental = servable_counts.snapshot()
+        servable_counts.resync(db)
+    assert incremental == servable_counts.snapshot()
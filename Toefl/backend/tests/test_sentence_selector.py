@@ -0,0 +1,99 @@
+import json
+import random
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.services.sentence_builder import (
+    _SELECT_WINDOW,
+    QUESTION_BANK,
+    REQUIRED_FAMILIES,
+    _BalancedSelection,
+    _select_balanced,
+    _SelectorIndex,
+    build_item_record,
+)
+
+FILLERS = ["this week", "after class", "for the seminar", "before lunch", "at the library", "with my team"]
+# [seed, pool size, count, guarantees] recorded from the multi-pass selector that _SelectorIndex replaced.
+REFERENCE = json.loads((Path(__file__).parent / "fixtures" / "selector_reference.json").read_text(encoding="utf-8"))
+
+
+def guarantees(picks: list[dict[str, Any]], count: int) -> dict[str, bool]:
+    statements = sum(1 for p in picks if p.get("format_group") == "statement")
+    return {
+        "families": set(REQUIRED_FAMILIES) <= {p.get("family") for p in picks},
+        "contexts": {"social", "campus"} <= {p.get("context") for p in picks},
+        "statement_quota": statements >= max(3, round(count * 0.5)),
+    }
+
+
+def seeded_pool(seed: int, size: int, skewed: bool = True) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    base = [r for r in (build_item_record(q["prompt"], q["answer"], q.get("response_template")) for q in QUESTION_BANK) if r]
+    # Skewed weights leave some families, formats or contexts scarce.
+    weights = [rng.choice([0.05, 1, 1, 4]) if skewed else 1 for _ in base]
+    pool = []
+    for i in range(size):
+        src = dict(rng.choices(base, weights)[0])
+        src["prompt"] = f"{src['prompt'].rstrip('.?!')} {rng.choice(FILLERS)} #{i}{src['prompt'][-1]}"
+        src["item_key"] = f"{src['item_key']}-{i}"
+        pool.append(src)
+    return pool
+
+
+@pytest.mark.parametrize("seed,size,count,held", REFERENCE)
+def test_selector_keeps_reference_guarantees(seed, size, count, held):
+    random.seed(seed)
+    got = guarantees(_select_balanced(seeded_pool(seed, size), count), count)
+    assert [name for name in held if not got[name]] == []
+
+
+@pytest.mark.parametrize("count", [5, 8, 10])
+def test_family_quotas_are_met_when_the_pool_allows(count):
+    for seed in range(30):
+        random.seed(seed)
+        picks = _select_balanced(seeded_pool(seed, 400, skewed=False), count)
+        families = [p["family"] for p in picks]
+        assert set(REQUIRED_FAMILIES) <= set(families)
+        if count >= 8:
+            assert families.count("interrogative") >= 2
+            assert families.count("reply_to_question") >= 2
+        assert guarantees(picks, count)["contexts"]
+
+
+@pytest.mark.parametrize("size", [6, 12, 300])
+def test_selection_never_repeats_a_question(size):
+    for seed in range(30):
+        random.seed(seed)
+        pool = seeded_pool(seed, size)
+        picks = _select_balanced(pool, 10)
+        assert len(picks) == min(10, size)
+        assert len({p["item_key"] for p in picks}) == len(picks)
+        assert len({p["prompt"] for p in picks}) == len(picks)
+
+
+def test_fixed_items_stay_first_and_are_not_picked_again():
+    random.seed(3)
+    index = _SelectorIndex(seeded_pool(3, 200))
+    fixed = [5, 17, 42]
+    picked = index.select_indices(10, fixed=fixed)
+    assert picked[:3] == fixed
+    assert len(picked) == 10
+    assert len(set(picked)) == 10
+
+
+def test_candidate_window_is_bounded_and_skips_used_items():
+    random.seed(9)
+    index = _SelectorIndex(seeded_pool(9, 500, skewed=False))
+    selection = _BalancedSelection(index, 10)
+    key = ("family", "statement_response")
+    first = selection._window(key)
+    assert len(first) == min(_SELECT_WINDOW, len(index.buckets[key]))
+    for i in first[:5]:
+        selection.take(i)
+    second = selection._window(key)
+    assert len(second) <= _SELECT_WINDOW
+    assert not set(second) & set(first[:5])
+    assert all(index.features[i][0] == "statement_response" for i in second)
@@ -0,0 +1,27 @@
+from app.services import sentence_sets
+from app.services.sentence_sets import RuntimeSetStore
+
+
+def test_runtime_sets_expire_after_their_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sentence_sets.time, "monotonic", lambda: now[0])
+    store = RuntimeSetStore()
+    store.put("a", {"set_id": "a"}, ttl_seconds=10)
+    store.put("b", {"set_id": "b"}, ttl_seconds=100)
+    assert store.get("a") == {"set_id": "a"}
+    now[0] += 50
+    assert store.get("a") is None
+    assert store.prune() == 0
+    now[0] += 100
+    assert store.prune() == 1
+    assert len(store) == 0
+
+
+def test_runtime_sets_evict_least_recently_used():
+    store = RuntimeSetStore(max_entries=2)
+    store.put("a", {"set_id": "a"}, ttl_seconds=60)
+    store.put("b", {"set_id": "b"}, ttl_seconds=60)
+    store.get("a")
+    store.put("c", {"set_id": "c"}, ttl_seconds=60)
+    assert store.get("b") is None
+    assert store.get("a") and store.get("c")
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from app.services import set_tokens
+from app.services.set_tokens import open_set_token, seal_sentence_set
+
+SET = {
+    "set_id": "set-1",
+    "difficulty": "hard",
+    "time_minutes": 5,
+    "questions": [{"question_id": "q1", "answer": "I can meet you after class."}, {"question_id": "q2", "answer": "Yes."}],
+}
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setenv("SENTENCE_SET_TOKEN_SECRET", "test-secret")
+
+
+def test_no_secret_means_no_token():
+    assert seal_sentence_set(SET) is None
+    assert open_set_token("anything", "set-1") is None
+
+
+def test_sealed_set_round_trips(secret):
+    token = seal_sentence_set(SET)
+    opened = open_set_token(token, "set-1")
+    assert opened == {
+        "set_id": "set-1",
+        "difficulty": "hard",
+        "questions": [
+            {"question_id": "q1", "answer": "I can meet you after class."},
+            {"question_id": "q2", "answer": "Yes."},
+        ],
+    }
+
+
+def test_token_is_bound_to_its_set_and_secret(secret, monkeypatch):
+    token = seal_sentence_set(SET)
+    assert open_set_token(token, "set-2") is None
+    assert open_set_token(token[:-4] + "AAAA", "set-1") is None
+    monkeypatch.setenv("SENTENCE_SET_TOKEN_SECRET", "other-secret")
+    assert open_set_token(token, "set-1") is None
+
+
+def test_token_expires_with_the_set(secret, monkeypatch):
+    token = seal_sentence_set(SET)
+    later = time.time() + set_tokens.set_ttl_seconds(SET) + 1
+    monkeypatch.setattr(set_tokens.time, "time", lambda: later)
+    assert open_set_token(token, "set-1") is None
@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal
+from app.main import app
+from app.models import Submission
+from app.services.grading import evaluate_submission
+from app.services.prompt_store import prompt_store
+
+ESSAY = (
+    "Dear Ms. Park,\r\n\r\nI am writing about the broken heater in the study room on the second floor. It has not "
+    "worked for a week, and students are leaving early because the room is too cold.\r\n\r\nCould someone repair it "
+    "before exams begin? Thank you for your help.\r\n\r\nSincerely,\r\nJordan"
+)
+
+
+def _email_prompt() -> dict:
+    prompt_store.reload()
+    return next(p for p in prompt_store.all_prompts() if p.get("task_type") == "email")
+
+
+def _rows(text: str) -> int:
+    with SessionLocal() as db:
+        return db.query(Submission).filter(Submission.user_text == text).count()
+
+
+def test_essay_is_graded_as_sent():
+    prompt = _email_prompt()
+    with TestClient(app) as client:
+        result = client.post("/api/submit", json={"prompt_id": prompt["prompt_id"], "user_text": ESSAY}).json()
+    expected = evaluate_submission(prompt, ESSAY)
+    assert result["rule_checks"] == expected["rule_checks"]
+    assert result["rubric_scores"] == expected["rubric_scores"]
+
+
+def test_repeats_are_stored_once_per_student_and_always_when_anonymous():
+    text = ESSAY + " Repeat."
+    body = {"prompt_id": _email_prompt()["prompt_id"], "user_text": text}
+    with TestClient(app) as client:
+        for _ in range(2):
+            client.post("/api/submit", json={**body, "student_id": "s-1"})
+        assert _rows(text) == 1
+        for _ in range(2):
+            client.post("/api/submit", json=body)
+        assert _rows(text) == 3
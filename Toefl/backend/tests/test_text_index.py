@@ -0,0 +1,52 @@
+from app.services.text_index import TextIndex, content_terms, light_stem
+
+TEXT = "I think extended library hours help. Library hours matter to students studying late."
+
+
+def test_light_stem_folds_common_suffixes():
+    assert light_stem("studies") == light_stem("study") == "study"
+    assert light_stem("libraries") == "library"
+    assert light_stem("running") == "run"
+    assert light_stem("planned") == "plan"
+    assert light_stem("classes") == "class"
+    assert light_stem("status") == "status"
+
+
+def test_content_terms_skips_stopwords_and_repeats():
+    text = "The Library should extend its hours and the library staff would help"
+    assert content_terms(text) == ["library", "extend", "hours", "staff", "help"]
+    assert content_terms(text, limit=2) == ["library", "extend"]
+    assert content_terms("Describe the problem", min_len=4) == ["problem"]
+
+
+def test_find_term_matches_stems_case_insensitively():
+    index = TextIndex(TEXT)
+    assert [TEXT[s:e] for s, e in index.find_term("study")] == ["studying"]
+    assert [TEXT[s:e] for s, e in index.find_term("LIBRARY")] == ["library", "Library"]
+    assert index.find_term("study", stem=False) == []
+    assert index.contains("student") and not index.contains("professor")
+
+
+def test_find_phrase_requires_adjacent_words():
+    index = TextIndex(TEXT)
+    assert [TEXT[s:e] for s, e in index.find_phrase("library hour")] == ["library hours", "Library hours"]
+    assert index.find_phrase("hours library") == []
+    assert index.find_phrase("library hour", stem=False) == []
+    assert index.find_phrase("") == []
+
+
+def test_match_terms_orders_phrases_and_terms_by_position():
+    index = TextIndex(TEXT)
+    matches = index.match_terms(["student"], phrases=["library hours"])
+    assert [(m["term"], TEXT[m["start"] : m["end"]]) for m in matches] == [
+        ("library hours", "library hours"),
+        ("library hours", "Library hours"),
+        ("student", "students"),
+    ]
+
+
+def test_token_reports_stem_and_span():
+    index = TextIndex(TEXT)
+    assert len(index) == 13
+    stem, start, end = index.token(-1)
+    assert (stem, TEXT[start:end]) == (light_stem("late"), "late")
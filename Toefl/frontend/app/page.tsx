@@ -2,7 +2,7 @@
 
 import { useEffect, useMemo, useState } from "react";
 
-import { fetchRandomPrompt, fetchSentenceSet, submitAnswer, submitSentenceSet } from "@/lib/api";
+import { fetchRandomPrompt, streamSentenceSet, submitAnswer, submitSentenceSet } from "@/lib/api";
 import { Prompt, SentenceSet, SentenceSubmitResult, SubmitResult, TaskType } from "@/lib/types";
 
 function countWords(text: string): number {
@@ -352,19 +352,35 @@ function SentencePracticeSection() {
         tough: "very_hard",
         extra_tough: "extra_tough",
       } as const;
-      const data = await fetchSentenceSet(questionCount, difficultyMap[difficultyLevel]);
-      const seed: Record<string, string> = {};
-      const seedPlacements: Record<string, string[]> = {};
-      data.questions.forEach((q) => {
-        seed[q.question_id] = "";
-        seedPlacements[q.question_id] = Array(q.tokens.length).fill("");
+      setSetData(null);
+      setAnswers({});
+      setPlacements({});
+      // Questions render as they stream in; the timer starts with the first one.
+      let timerStarted = false;
+      await streamSentenceSet(questionCount, difficultyMap[difficultyLevel], (data) => {
+        setAnswers((prev) => {
+          const next = { ...prev };
+          data.questions.forEach((q) => {
+            if (!(q.question_id in next)) next[q.question_id] = "";
+          });
+          return next;
+        });
+        setPlacements((prev) => {
+          const next = { ...prev };
+          data.questions.forEach((q) => {
+            if (!(q.question_id in next)) next[q.question_id] = Array(q.tokens.length).fill("");
+          });
+          return next;
+        });
+        setSetData(data);
+        if (!timerStarted && data.questions.length > 0) {
+          timerStarted = true;
+          setSecondsLeft(data.time_minutes * 60);
+          setRunning(true);
+        }
       });
-      setAnswers(seed);
-      setPlacements(seedPlacements);
-      setSetData(data);
-      setSecondsLeft(data.time_minutes * 60);
-      setRunning(true);
     } catch (e) {
+      setRunning(false);
       setError(e instanceof Error ? e.message : "Failed to load sentence set");
     } finally {
       setLoadingSet(false);
@@ -452,7 +468,7 @@ function SentencePracticeSection() {
   async function submit() {
     if (!setData) return;
     try {
-      const r = await submitSentenceSet(setData.set_id, answers);
+      const r = await submitSentenceSet(setData.set_id, answers, setData.set_token);
       setResult(r);
       setRunning(false);
     } catch (e) {
@@ -627,7 +643,7 @@ function SentencePracticeSection() {
           <button
             onClick={() => void submit()}
             className="bg-accent2 text-white px-4 py-2 rounded hover:opacity-90 disabled:opacity-50"
-            disabled={!running}
+            disabled={!running || loadingSet}
           >
             Submit Sentence Set
           </button>
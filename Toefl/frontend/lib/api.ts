@@ -40,20 +40,29 @@ export async function fetchRandomPromptForStudent(taskType: TaskType, studentId:
   });
 }
 
-export async function submitAnswer(promptId: string, userText: string): Promise<SubmitResult> {
-  return fetchJson<SubmitResult>(`/api/submit`, {
+async function postSubmission(body: Record<string, string>): Promise<SubmitResult> {
+  // The same key is reused on retry so the backend returns the stored result instead of grading twice.
+  const init: RequestInit = {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ prompt_id: promptId, user_text: userText }),
-  });
+    headers: { "Content-Type": "application/json", "Idempotency-Key": crypto.randomUUID() },
+    body: JSON.stringify(body),
+  };
+  try {
+    return await fetchJson<SubmitResult>(`/api/submit`, init);
+  } catch (err) {
+    if (err instanceof Error && err.message.startsWith("Cannot connect")) {
+      return fetchJson<SubmitResult>(`/api/submit`, init);
+    }
+    throw err;
+  }
+}
+
+export async function submitAnswer(promptId: string, userText: string): Promise<SubmitResult> {
+  return postSubmission({ prompt_id: promptId, user_text: userText });
 }
 
 export async function submitAnswerForStudent(promptId: string, userText: string, studentId: string): Promise<SubmitResult> {
-  return fetchJson<SubmitResult>(`/api/submit`, {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ prompt_id: promptId, user_text: userText, student_id: studentId }),
-  });
+  return postSubmission({ prompt_id: promptId, user_text: userText, student_id: studentId });
 }
 
 export async function fetchHistory(): Promise<HistoryItem[]> {
@@ -75,10 +84,63 @@ export async function fetchSentenceSet(
   });
 }
 
-export async function submitSentenceSet(setId: string, answers: Record<string, string>): Promise<SentenceSubmitResult> {
+type SentenceStreamHeader = Omit<SentenceSet, "questions" | "set_token"> & { count: number };
+
+export async function streamSentenceSet(
+  count = 10,
+  difficulty: "normal" | "hard" | "very_hard" | "extra_tough" = "hard",
+  onUpdate: (partial: SentenceSet, expected: number) => void
+): Promise<SentenceSet> {
+  const path = `/api/sentence/random/stream?count=${count}&difficulty=${difficulty}`;
+  const res = await fetchOrThrow(path, { method: "POST", cache: "no-store" });
+  if (!res.ok || !res.body) {
+    const detail = await parseError(res);
+    throw new Error(`Backend request failed (${res.status}) for ${path}: ${detail}`);
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let current: SentenceSet | null = null;
+  let expected = count;
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep = buffer.indexOf("\n\n");
+    while (sep !== -1) {
+      const chunk = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      sep = buffer.indexOf("\n\n");
+      const event = chunk.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(chunk.match(/^data: (.*)$/m)?.[1] || "{}");
+      if (event === "error") {
+        throw new Error(`Backend request failed for ${path}: ${data.detail}`);
+      }
+      if (event === "header") {
+        const { count: total, ...header } = data as SentenceStreamHeader;
+        expected = total;
+        current = { ...header, questions: [] };
+      } else if (event === "question" && current) {
+        current = { ...current, questions: [...current.questions, data] };
+      } else if (event === "done" && current) {
+        current = { ...current, set_token: data.set_token };
+        onUpdate(current, expected);
+        return current;
+      }
+      if (current) onUpdate(current, expected);
+    }
+  }
+  throw new Error(`Sentence set stream ended early for ${path}.`);
+}
+
+export async function submitSentenceSet(
+  setId: string,
+  answers: Record<string, string>,
+  setToken?: string | null
+): Promise<SentenceSubmitResult> {
   return fetchJson<SentenceSubmitResult>(`/api/sentence/submit`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ set_id: setId, answers }),
+    body: JSON.stringify({ set_id: setId, answers, set_token: setToken ?? undefined }),
   });
 }
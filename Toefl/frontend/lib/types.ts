@@ -28,6 +28,7 @@ export type SubmitResult = {
   };
   improved_sample: string;
   vocab_suggestions: string[];
+  rubric_job_id?: string | null;
 };
 
 export type HistoryItem = {
@@ -55,6 +56,7 @@ export type SentenceSet = {
   time_minutes: number;
   difficulty: "normal" | "hard" | "very_hard" | "extra_tough";
   questions: SentenceQuestion[];
+  set_token?: string | null;
 };
 
 export type SentenceSubmitResult = {
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.app.services.embeddings import EMBEDDING_DIM, LocalHashEmbedding  # noqa: E402
+
+WORDS = (
+    "professor student campus library seminar assignment deadline schedule office hours project team "
+    "research discussion policy community environment technology online learning experience opinion "
+    "support example because however therefore although instead community volunteer funding survey"
+).split()
+
+
+def legacy_embed(texts: list[str]) -> list[list[float]]:
+    # The previous pure-Python version, kept here for comparison (built-in hash(), unsigned buckets).
+    vectors = []
+    for text in texts:
+        vec = [0.0] * 128
+        for tok in re.findall(r"\b\w+\b", (text or "").lower()):
+            vec[hash(tok) % 128] += 1.0
+        norm = sum(v * v for v in vec) ** 0.5 or 1.0
+        vectors.append([v / norm for v in vec])
+    return vectors
+
+
+def synthetic_docs(count: int, words: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) + rng.choice(["", "s", "ing", str(i % 97)]) for _ in range(words)) for i in range(count)]
+
+
+def fingerprint(vectors) -> str:
+    rounded = [[round(float(v), 5) for v in row] for row in vectors]
+    return hashlib.sha1(repr(rounded).encode("utf-8")).hexdigest()[:12]
+
+
+def time_runs(fn, docs: list[str], runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn(docs)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=250)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--fingerprint", choices=["legacy", "numpy"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    docs = synthetic_docs(args.docs, args.words, args.seed)
+    embedding = LocalHashEmbedding(args.dim)
+    if args.fingerprint:
+        print(fingerprint(legacy_embed(docs[:50]) if args.fingerprint == "legacy" else embedding.embed(docs[:50])))
+        return
+
+    legacy_s = time_runs(legacy_embed, docs, args.runs)
+    numpy_s = time_runs(embedding.embed, docs, args.runs)
+    print(f"docs={args.docs} words/doc={args.words} dim={args.dim}")
+    print(f"legacy  median={legacy_s * 1000:.1f}ms docs/s={args.docs / legacy_s:,.0f}")
+    print(f"numpy   median={numpy_s * 1000:.1f}ms docs/s={args.docs / numpy_s:,.0f} speedup={legacy_s / numpy_s:.1f}x")
+
+    # Each implementation runs in two fresh interpreters with different hash salts.
+    for impl in ("legacy", "numpy"):
+        prints = set()
+        for salt in ("1", "2"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--fingerprint", impl, "--dim", str(args.dim), "--seed", str(args.seed)],
+                capture_output=True,
+                text=True,
+                check=True,
+                env={**os.environ, "PYTHONHASHSEED": salt},
+            )
+            prints.add(out.stdout.strip())
+        print(f"{impl:<7} stable_across_processes={len(prints) == 1}")
+
+
+if __name__ == "__main__":
+    main()
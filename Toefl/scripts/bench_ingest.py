@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+INGEST = ROOT / "scripts" / "ingest_pdf.py"
+SEED_BANK = ROOT / "data" / "prompts" / "prompts.json"
+
+
+def synthetic_pages(count: int, seed: int) -> list[list[str]]:
+    # One prompt per page, cloned from the shipped bank with shuffled body lines so the parsers see the
+    # real layout. Prompt numbers stay within the three digits the section splitter recognizes.
+    rng = random.Random(seed)
+    templates = []
+    for prompt in json.loads(SEED_BANK.read_text(encoding="utf-8")):
+        text = prompt["raw_text"].replace("●", "-")
+        lines = [ln for ln in text.encode("ascii", "ignore").decode("ascii").splitlines() if ln.strip()]
+        templates.append(lines[1:])
+    pages = []
+    for i in range(count):
+        body = list(rng.choice(templates))
+        head, tail = body[:4], body[4:]
+        rng.shuffle(tail)
+        pages.append([f"#{i % 999 + 1}", *head, *tail])
+    return pages
+
+
+def write_pdf(path: Path, pages: list[list[str]]) -> None:
+    # Minimal uncompressed PDF: one Helvetica text stream per page, enough for pypdf/pdfplumber to extract.
+    objects: list[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_ref = 1 + 2 * len(pages) + 1
+    kids = []
+    for lines in pages:
+        shown = " ".join("(" + re.sub(r"([()\\\\])", r"\\\1", line) + ") Tj T*" for line in lines)
+        stream = f"BT /F1 10 Tf 50 780 Td 12 TL {shown} ET".encode("ascii")
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        kids.append(
+            add(
+                f"<< /Type /Page /Parent {pages_ref} 0 R /MediaBox [0 0 612 792] /Contents {content} 0 R "
+                f"/Resources << /Font << /F1 {font} 0 R >> >> >>".encode("ascii")
+            )
+        )
+    add(f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode("ascii"))
+    catalog = add(f"<< /Type /Catalog /Pages {pages_ref} 0 R >>".encode("ascii"))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    out += b"".join(f"{o:010d} 00000 n \n".encode("ascii") for o in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    path.write_bytes(bytes(out))
+
+
+def run_ingest(pdf: Path, work: Path, workers: int, memory: bool) -> dict:
+    # A fresh process and empty output/cache directories per run, so every run is a cold ingest.
+    out = Path(tempfile.mkdtemp(dir=work))
+    report = out / "profile.json"
+    cmd = [
+        sys.executable, str(INGEST), "--pdf", str(pdf), "--output-json", str(out / "prompts.json"),
+        "--chroma-dir", str(out / "chroma"), "--no-page-cache", "--workers", str(workers), "--profile", str(report),
+    ]
+    if memory:
+        cmd.append("--profile-memory")
+    subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return json.loads(report.read_text(encoding="utf-8"))
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def summarize(timed: list[dict], traced: dict | None) -> dict:
+    # Wall times are medians of the untraced runs; memory peaks come from one tracemalloc run, whose
+    # times are not used because tracing slows every allocation down.
+    stages = {}
+    for name in timed[0]["stages"]:
+        stages[name] = {
+            "seconds": round(statistics.median(r["stages"][name]["seconds"] for r in timed), 4),
+            "calls": timed[0]["stages"][name]["calls"],
+        }
+        if traced and name in traced["stages"]:
+            stages[name]["peak_mb"] = traced["stages"][name]["peak_mb"]
+    wall = statistics.median(r["wall_seconds"] for r in timed)
+    return {
+        "wall_seconds": round(wall, 4),
+        "prompts": timed[0]["prompts"],
+        "prompts_per_second": round(timed[0]["prompts"] / wall, 2),
+        "traced_peak_mb": traced["traced_peak_mb"] if traced else None,
+        "max_rss_mb": max((r.get("max_rss_mb") or {}).get("self", 0) for r in timed) or None,
+        "stages": stages,
+    }
+
+
+def compare(baseline: dict, current: dict) -> None:
+    print(f"vs {baseline.get('commit') or 'baseline'}:")
+    old, new = baseline["result"], current["result"]
+    for name in sorted(set(old["stages"]) | set(new["stages"]), key=lambda n: -new["stages"].get(n, {}).get("seconds", 0)):
+        a = old["stages"].get(name, {}).get("seconds")
+        b = new["stages"].get(name, {}).get("seconds")
+        ratio = f"{b / a:6.2f}x" if a and b is not None else "     -"
+        print(f"  {name:16} {a if a is not None else '-':>9} -> {b if b is not None else '-':>9}s {ratio}")
+    print(f"  {'prompts/s':16} {old['prompts_per_second']:>9} -> {new['prompts_per_second']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile scripts/ingest_pdf.py on a generated PDF.")
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs; the report keeps the median per stage.")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the extra tracemalloc run.")
+    parser.add_argument("--output", help="Report path (default: bench-ingest-<commit>.json in the current directory).")
+    parser.add_argument("--compare", help="An earlier report to print per-stage deltas against.")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        pdf = work / "synthetic.pdf"
+        started = time.perf_counter()
+        write_pdf(pdf, synthetic_pages(args.pages, args.seed))
+        print(f"Generated {args.pages}-page PDF ({pdf.stat().st_size / 1e6:.1f}MB) in {time.perf_counter() - started:.2f}s")
+        timed = []
+        for run in range(args.runs):
+            timed.append(run_ingest(pdf, work, args.workers, memory=False))
+            print(f"  run {run + 1}: {timed[-1]['wall_seconds']:.2f}s, {timed[-1]['prompts_per_second']} prompts/s")
+        traced = None if args.no_memory else run_ingest(pdf, work, args.workers, memory=True)
+
+    report = {
+        "commit": commit,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {"pages": args.pages, "runs": args.runs, "workers": args.workers, "seed": args.seed},
+        "result": summarize(timed, traced),
+    }
+    output = Path(args.output or f"bench-ingest-{commit or 'local'}.json")
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    for name, stage in sorted(report["result"]["stages"].items(), key=lambda kv: -kv[1]["seconds"]):
+        peak = f"  peak {stage['peak_mb']:.1f}MB" if "peak_mb" in stage else ""
+        print(f"  {name:16} {stage['seconds']:8.3f}s  {stage['calls']:7} calls{peak}")
+    print(f"{report['result']['prompts_per_second']} prompts/s; report written to {output}")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    main()
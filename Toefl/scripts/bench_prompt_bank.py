@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.app.services.prompt_bank import PromptBank, PromptBankWriter  # noqa: E402
+
+SEED_BANK = Path(__file__).resolve().parents[1] / "data" / "prompts" / "prompts.json"
+
+
+def synthetic_prompts(count: int, seed: int) -> list[dict]:
+    # Real prompts cloned under new ids, with their text shuffled so records are not identical.
+    rng = random.Random(seed)
+    base = json.loads(SEED_BANK.read_text(encoding="utf-8"))
+    out = []
+    for i in range(count):
+        prompt = dict(rng.choice(base))
+        words = (prompt.get("raw_text") or "").split()
+        rng.shuffle(words)
+        prompt["prompt_id"] = f"bench:{i}"
+        prompt["raw_text"] = " ".join(words)
+        out.append(prompt)
+    return out
+
+
+def rss_kb() -> dict[str, int]:
+    # Anonymous pages are private to the process; file pages of a shared mapping sit in the page cache.
+    fields = {}
+    with open("/proc/self/status", encoding="ascii") as fh:
+        for line in fh:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                fields[key] = int(value.split()[0])
+    return fields
+
+
+def measure(loader: str, directory: Path, lookups: int) -> dict:
+    before = rss_kb()
+    started = time.perf_counter()
+    if loader == "json":
+        bank = PromptBank.from_prompts(json.loads((directory / "prompts.json").read_text(encoding="utf-8")))
+    else:
+        bank = PromptBank.open(directory / "prompts.bank")
+    load_s = time.perf_counter() - started
+    after = rss_kb()
+    rng = random.Random(1)
+    ids = [bank.ids[rng.randrange(len(bank))] for _ in range(lookups)]
+    started = time.perf_counter()
+    for pid in ids:
+        bank.get(pid)
+    lookup_s = time.perf_counter() - started
+    return {
+        "loader": loader,
+        "load_ms": round(load_s * 1000, 1),
+        "rss_delta_kb": after.get("VmRSS", 0) - before.get("VmRSS", 0),
+        "anon_delta_kb": after.get("RssAnon", 0) - before.get("RssAnon", 0),
+        "lookup_us": round(lookup_s / max(lookups, 1) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prompts", type=int, default=50000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--measure", choices=["json", "mmap"], help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, Path(args.dir), args.lookups)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        prompts = synthetic_prompts(args.prompts, args.seed)
+        (directory / "prompts.json").write_text(json.dumps(prompts, indent=2, ensure_ascii=False), encoding="utf-8")
+        with PromptBankWriter(directory / "prompts.bank") as writer:
+            for prompt in prompts:
+                writer.write(prompt)
+        del prompts
+        json_mb = (directory / "prompts.json").stat().st_size / 1e6
+        bank_mb = (directory / "prompts.bank").stat().st_size / 1e6
+        print(f"prompts={args.prompts} prompts.json={json_mb:.1f}MB prompts.bank={bank_mb:.1f}MB")
+        # Each loader runs in a fresh interpreter so the memory numbers are not mixed up.
+        for loader in ("json", "mmap"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--measure", loader, "--dir", tmp, "--lookups", str(args.lookups)],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            r = json.loads(out.stdout)
+            print(
+                f"{loader:5} load={r['load_ms']}ms rss+={r['rss_delta_kb'] / 1024:.1f}MB "
+                f"private+={r['anon_delta_kb'] / 1024:.1f}MB lookup={r['lookup_us']}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.app.services.sentence_builder import (  # noqa: E402
+    QUESTION_BANK,
+    REQUIRED_FAMILIES,
+    TARGET_GRAMMAR_TAGS,
+    _SelectorIndex,
+    build_item_record,
+)
+
+FILLERS = ["this week", "after class", "for the seminar", "before lunch", "at the library", "with my team", "on Friday"]
+
+
+def synthetic_pool(size: int, precomputed: bool) -> list[dict]:
+    base = [r for r in (build_item_record(q["prompt"], q["answer"], q.get("response_template")) for q in QUESTION_BANK) if r]
+    pool = []
+    for i in range(size):
+        src = dict(random.choice(base))
+        src["prompt"] = f"{src['prompt'].rstrip('.?!')} {random.choice(FILLERS)} #{i}{src['prompt'][-1]}"
+        if not precomputed:
+            # Shape of raw model output: features have to be derived inside the selector.
+            src = {k: src[k] for k in ("prompt", "answer", "response_template", "pattern", "context", "grammar_tags")}
+        pool.append(src)
+    return pool
+
+
+def coverage(picks: list[dict]) -> dict[str, bool]:
+    families = {p.get("family") for p in picks}
+    tags: set[str] = set()
+    for p in picks:
+        tags.update(p.get("grammar_tags") or ())
+    statements = sum(1 for p in picks if p.get("format_group") == "statement")
+    return {
+        "families": all(f in families for f in REQUIRED_FAMILIES),
+        "contexts": {"social", "campus"} <= {p.get("context") for p in picks},
+        "grammar": len(tags & set(TARGET_GRAMMAR_TAGS)) / len(TARGET_GRAMMAR_TAGS),
+        "statement_quota": statements >= max(3, round(len(picks) * 0.5)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--raw", action="store_true", help="Do not precompute item features (LLM-shaped pool).")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    for size in [int(x) for x in args.sizes.split(",")]:
+        pool = synthetic_pool(size, precomputed=not args.raw)
+        started = time.perf_counter()
+        index = _SelectorIndex(pool)
+        build_ms = (time.perf_counter() - started) * 1000
+        timings = []
+        checks = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            picks = index.select(args.count)
+            timings.append((time.perf_counter() - started) * 1000)
+            if not args.raw:
+                checks.append(coverage(picks))
+        line = (
+            f"pool={size:>6} count={args.count} index_build={build_ms:.2f}ms"
+            f" select_median={statistics.median(timings):.3f}ms select_max={max(timings):.3f}ms"
+        )
+        if checks:
+            line += (
+                f" families={sum(c['families'] for c in checks)}/{len(checks)}"
+                f" contexts={sum(c['contexts'] for c in checks)}/{len(checks)}"
+                f" grammar={statistics.mean(c['grammar'] for c in checks):.0%}"
+                f" statement_quota={sum(c['statement_quota'] for c in checks)}/{len(checks)}"
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
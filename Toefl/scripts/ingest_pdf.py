@@ -1,11 +1,27 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
 import json
+import os
 import re
+import sys
+import time
+import tracemalloc
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
+from typing import Iterable, Iterator
 
 import chromadb
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.app.services.embeddings import EMBEDDING_DIM, LocalHashEmbedding  # noqa: E402
+from backend.app.services.prompt_bank import PromptBankWriter  # noqa: E402
+from backend.app.services.prompt_enrichment import ENRICH_MODEL, ENRICH_MODEL_URL, PromptEnricher  # noqa: E402
+
 try:
     from pypdf import PdfReader
 except ImportError:
@@ -14,35 +30,252 @@ try:
     import pdfplumber
 except ImportError:
     pdfplumber = None
+try:
+    import resource
+except ImportError:
+    resource = None
 
 
 def normalize(text: str) -> str:
     return re.sub(r"\s+", " ", text or "").strip()
 
 
-def extract_pdf_text(pdf_path: Path) -> str:
+class StageProfiler:
+    # Wall time and traced-memory peak per pipeline stage, for --profile. The pipeline streams, so stages
+    # interleave and nest (splitting pulls pages from extraction); time spent in an inner stage is not
+    # charged to the outer one. Disabled, a stage costs one generator round trip.
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.stages: dict[str, dict] = {}
+        self._stack: list[list] = []
+        self._peak = 0
+        self._started = 0.0
+
+    def start(self, trace_memory: bool = False) -> None:
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory:
+            tracemalloc.start()
+        self._started = time.perf_counter()
+
+    def _charge(self, name: str, seconds: float) -> None:
+        entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "peak_mb": 0.0})
+        entry["seconds"] += seconds
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+            self._peak = max(self._peak, peak)
+            entry["peak_mb"] = max(entry["peak_mb"], peak / 2**20)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        now = time.perf_counter()
+        if self._stack:
+            self._charge(self._stack[-1][0], now - self._stack[-1][1])
+        elif self.trace_memory:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._charge(name, now - self._stack.pop()[1])
+            self.stages[name]["calls"] += 1
+            if self._stack:
+                self._stack[-1][1] = now
+
+    def iter(self, name: str, iterable: Iterable) -> Iterator:
+        it = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+
+    def report(self, prompts: int) -> dict:
+        wall = time.perf_counter() - self._started
+        if self.trace_memory:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+        stages = {name: {"seconds": round(e["seconds"], 4), "calls": e["calls"]} for name, e in self.stages.items()}
+        if self.trace_memory:
+            for name, e in self.stages.items():
+                stages[name]["peak_mb"] = round(e["peak_mb"], 2)
+        report = {
+            "wall_seconds": round(wall, 4),
+            "unattributed_seconds": round(wall - sum(e["seconds"] for e in self.stages.values()), 4),
+            "prompts": prompts,
+            "prompts_per_second": round(prompts / wall, 2) if wall else None,
+            "traced_peak_mb": round(self._peak / 2**20, 2) if self.trace_memory else None,
+            "stages": stages,
+        }
+        if resource is not None:
+            # ru_maxrss is in KiB on Linux; children covers the extraction workers.
+            report["max_rss_mb"] = {
+                "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+            }
+        return report
+
+
+profiler = StageProfiler()
+
+
+PAGE_CACHE_VERSION = 2
+# Upper bound on pages per worker task, which also bounds how much extracted text is buffered.
+PAGE_CHUNK = 16
+_worker_pdf = None
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _open_pdf(pdf_path: str):
     if PdfReader is not None:
-        reader = PdfReader(str(pdf_path))
-        return "\n".join((p.extract_text() or "") for p in reader.pages)
+        return PdfReader(pdf_path)
     if pdfplumber is not None:
-        with pdfplumber.open(str(pdf_path)) as pdf:
-            return "\n".join((p.extract_text() or "") for p in pdf.pages)
+        return pdfplumber.open(pdf_path)
     raise RuntimeError("Missing dependency: install either `pypdf` or `pdfplumber`.")
 
 
-class LocalHashEmbedding:
-    def name(self) -> str:
-        return "local_hash_embedding"
-
-    def __call__(self, input: list[str]) -> list[list[float]]:
-        vectors = []
-        for text in input:
-            vec = [0.0] * 128
-            for tok in re.findall(r"\b\w+\b", (text or "").lower()):
-                vec[hash(tok) % 128] += 1.0
-            norm = sum(v * v for v in vec) ** 0.5 or 1.0
-            vectors.append([v / norm for v in vec])
-        return vectors
+def _init_worker(pdf_path: str) -> None:
+    # Each worker parses the document once and then extracts whatever pages it is handed.
+    global _worker_pdf
+    if tracemalloc.is_tracing():
+        # Inherited from a profiled parent on fork; workers only show up in max_rss_mb.children.
+        tracemalloc.stop()
+    _worker_pdf = _open_pdf(pdf_path)
+
+
+def _extract_pages(pages: list[int]) -> list[tuple[int, str]]:
+    return [(i, _worker_pdf.pages[i].extract_text() or "") for i in pages]
+
+
+def _page_digests(page_count: int, file_hash: str) -> list[str]:
+    # Keyed on the file hash and page number. A content stream alone is not enough: two pages with the same
+    # stream can draw different form XObjects or fonts.
+    return [hashlib.sha256(f"{file_hash}:{i}".encode()).hexdigest() for i in range(page_count)]
+
+
+class PageCache:
+    # <dir>/files/<file sha256>.json lists the page keys of a document; <dir>/pages/<key>.txt holds the text.
+    def __init__(self, root: Path):
+        self.root = root
+        (root / "files").mkdir(parents=True, exist_ok=True)
+        (root / "pages").mkdir(parents=True, exist_ok=True)
+
+    def manifest(self, file_hash: str) -> list[str] | None:
+        path = self.root / "files" / f"{file_hash}.json"
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return data["pages"] if data.get("v") == PAGE_CACHE_VERSION else None
+
+    def save_manifest(self, file_hash: str, keys: list[str]) -> None:
+        path = self.root / "files" / f"{file_hash}.json"
+        path.write_text(json.dumps({"v": PAGE_CACHE_VERSION, "pages": keys}), encoding="utf-8")
+
+    def has(self, key: str) -> bool:
+        return (self.root / "pages" / f"{key}.txt").exists()
+
+    def get(self, key: str) -> str | None:
+        path = self.root / "pages" / f"{key}.txt"
+        return path.read_text(encoding="utf-8") if path.exists() else None
+
+    def put(self, key: str, text: str) -> None:
+        path = self.root / "pages" / f"{key}.txt"
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(text, encoding="utf-8")
+        tmp.replace(path)
+
+
+def iter_pdf_pages(
+    pdf_path: Path, workers: int | None = None, cache_dir: Path | None = None, stats: dict | None = None
+) -> Iterator[str]:
+    # Yields page texts in document order. Only a bounded window of chunks is in flight, so memory does not
+    # grow with the page count; `stats` is filled in once the last page has been yielded.
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    cache = PageCache(cache_dir) if cache_dir else None
+    file_hash = file_sha256(pdf_path)
+    keys = cache.manifest(file_hash) if cache else None
+    extracted = 0
+    if keys and all(cache.has(k) for k in keys):
+        for key in keys:
+            yield cache.get(key) or ""
+    else:
+        pdf = _open_pdf(str(pdf_path))
+        keys = _page_digests(len(pdf.pages), file_hash)
+        missing = [i for i, key in enumerate(keys) if not (cache and cache.has(key))]
+        missing_set = set(missing)
+        extracted = len(missing)
+        pool = None
+        if workers > 1 and len(missing) >= 2 * workers:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(str(pdf_path),))
+        try:
+            # Contiguous chunks keep each worker reading neighbouring objects; several chunks per
+            # worker even out pages that are much slower to extract than others.
+            size = max(1, min(PAGE_CHUNK, -(-len(missing) // (workers * 4))))
+            chunks = iter([missing[i : i + size] for i in range(0, len(missing), size)])
+            pending: deque = deque()
+            ready: dict[int, str] = {}
+            if pool is not None:
+                for chunk in islice(chunks, workers * 2):
+                    pending.append(pool.submit(_extract_pages, chunk))
+            for i, key in enumerate(keys):
+                if i not in missing_set:
+                    yield cache.get(key) or ""
+                    continue
+                if pool is None:
+                    text = pdf.pages[i].extract_text() or ""
+                else:
+                    while i not in ready:
+                        ready.update(pending.popleft().result())
+                        for chunk in islice(chunks, 1):
+                            pending.append(pool.submit(_extract_pages, chunk))
+                    text = ready.pop(i)
+                if cache:
+                    cache.put(key, text)
+                yield text
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            if hasattr(pdf, "close"):
+                pdf.close()
+        if cache:
+            cache.save_manifest(file_hash, keys)
+    if stats is not None:
+        elapsed = time.perf_counter() - started
+        stats.update(
+            pages=len(keys), extracted=extracted, cached=len(keys) - extracted, seconds=elapsed, file_hash=file_hash
+        )
+
+
+def extract_pdf_pages(
+    pdf_path: Path, workers: int | None = None, cache_dir: Path | None = None, stats: dict | None = None
+) -> list[str]:
+    return list(iter_pdf_pages(pdf_path, workers=workers, cache_dir=cache_dir, stats=stats))
+
+
+def extract_pdf_text(
+    pdf_path: Path, workers: int | None = None, cache_dir: Path | None = None, stats: dict | None = None
+) -> str:
+    # Pages are joined in document order exactly as before, so `#N` boundaries split the same way.
+    return "\n".join(iter_pdf_pages(pdf_path, workers=workers, cache_dir=cache_dir, stats=stats))
+
+
+_SECTION_RE = re.compile(r"#\d{1,3}\b")
 
 
 def split_prompt_sections(text: str) -> list[str]:
@@ -50,6 +283,28 @@ def split_prompt_sections(text: str) -> list[str]:
     return [p.strip() for p in parts if re.search(r"#\d{1,3}\b", p)]
 
 
+def iter_prompt_sections(pages: Iterable[str]) -> Iterator[str]:
+    # Streaming split_prompt_sections over pages joined with "\n": a `#N` marker never spans a line, so
+    # only the section that is still open is carried from one page to the next.
+    current: list[str] | None = None
+    for page in pages:
+        pos = 0
+        for match in _SECTION_RE.finditer(page):
+            if current is not None:
+                current.append(page[pos : match.start()])
+                section = "\n".join(current).strip()
+                if section:
+                    yield section
+            current = []
+            pos = match.start()
+        if current is not None:
+            current.append(page[pos:])
+    if current is not None:
+        section = "\n".join(current).strip()
+        if section:
+            yield section
+
+
 def classify_task(chunk: str) -> str:
     c = chunk.lower()
     if "to:" in c and "subject:" in c:
@@ -170,64 +425,433 @@ def parse_discussion_chunk(chunk: str, prompt_num: str) -> dict:
     }
 
 
-def parse_prompts(full_text: str) -> list[dict]:
-    prompts: list[dict] = []
-    for chunk in split_prompt_sections(full_text):
+def iter_prompts(sections: Iterable[str]) -> Iterator[dict]:
+    for chunk in sections:
         match = re.search(r"#(\d{1,3})", chunk)
         if not match:
             continue
         prompt_num = match.group(1)
-        task_type = classify_task(chunk)
-        parsed = parse_discussion_chunk(chunk, prompt_num) if task_type == "discussion" else parse_email_chunk(chunk, prompt_num)
-        prompts.append(parsed)
-    return prompts
-
-
-def build_chroma(prompts: list[dict], chroma_dir: Path):
-    chroma_dir.mkdir(parents=True, exist_ok=True)
-    client = chromadb.PersistentClient(path=str(chroma_dir))
-    embed_fn = LocalHashEmbedding()
-    try:
-        client.delete_collection("toefl_prompts")
-    except Exception:
-        pass
-
-    collection = client.get_or_create_collection("toefl_prompts", embedding_function=embed_fn)
-    if not prompts:
+        with profiler.stage("classify"):
+            task_type = classify_task(chunk)
+        with profiler.stage(f"parse_{task_type}"):
+            prompt = parse_discussion_chunk(chunk, prompt_num) if task_type == "discussion" else parse_email_chunk(chunk, prompt_num)
+        yield prompt
+
+
+def parse_prompts(full_text: str) -> list[dict]:
+    return list(iter_prompts(split_prompt_sections(full_text)))
+
+
+class PromptFileWriter:
+    # Writes prompts as they are parsed: a `.ndjson`/`.jsonl` path gets one object per line, anything else
+    # the same indented JSON array as before. The file is written next to the target and swapped in on success.
+    def __init__(self, path: Path):
+        self.path = path
+        self.ndjson = path.suffix.lower() in (".ndjson", ".jsonl")
+        self.count = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        self._fh = open(self._tmp, "w", encoding="utf-8")
+
+    def write(self, prompt: dict) -> None:
+        if self.ndjson:
+            self._fh.write(json.dumps(prompt, ensure_ascii=False) + "\n")
+        else:
+            body = json.dumps(prompt, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+            self._fh.write(("[\n  " if self.count == 0 else ",\n  ") + body)
+        self.count += 1
+
+    def close(self) -> None:
+        if not self.ndjson:
+            self._fh.write("\n]" if self.count else "[]")
+        self._fh.close()
+        self._tmp.replace(self.path)
+
+    def abort(self) -> None:
+        self._fh.close()
+        self._tmp.unlink(missing_ok=True)
+
+    def __enter__(self) -> "PromptFileWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+COLLECTION_NAME = "toefl_prompts"
+UPSERT_BATCH = 256
+# Stored hashes are read in pages so opening a large collection does not load every record at once.
+HASH_PAGE_SIZE = 1000
+
+
+def prompt_content_hash(prompt: dict) -> str:
+    return hashlib.sha1(json.dumps(prompt, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _prompt_metadata(prompt: dict) -> dict:
+    return {
+        "task_type": prompt["task_type"],
+        "prompt_id": prompt["prompt_id"],
+        "title": prompt["title"],
+        "constraints": json.dumps(prompt["constraints"]),
+        "raw_text": prompt["raw_text"][:1500],
+        "content_hash": prompt_content_hash(prompt),
+    }
+
+
+class ChromaIndexWriter:
+    # Diffs prompts against the collection by content hash as they arrive: only new or changed prompts are
+    # embedded and upserted (in batches), and prompts that never arrived are deleted on close.
+    def __init__(self, chroma_dir: Path, embedding_dim: int = EMBEDDING_DIM, full_rebuild: bool = False):
+        chroma_dir.mkdir(parents=True, exist_ok=True)
+        client = chromadb.PersistentClient(path=str(chroma_dir))
+        embed_fn = LocalHashEmbedding(embedding_dim)
+        self.summary = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "full_rebuild": full_rebuild}
+        collection = None
+        if not full_rebuild:
+            collection = client.get_or_create_collection(
+                COLLECTION_NAME, embedding_function=embed_fn, metadata={"embedding_dim": embedding_dim}
+            )
+            if (collection.metadata or {}).get("embedding_dim") != embedding_dim:
+                # Vectors of a different dimension (or from before dimensions were recorded) cannot be mixed.
+                self.summary["full_rebuild"] = True
+        if self.summary["full_rebuild"]:
+            try:
+                client.delete_collection(COLLECTION_NAME)
+            except Exception:
+                pass
+            collection = client.create_collection(
+                COLLECTION_NAME, embedding_function=embed_fn, metadata={"embedding_dim": embedding_dim}
+            )
+        self.collection = collection
+        self.embed_fn = embed_fn
+        self.stored = self._stored_hashes(collection)
+        self.seen: set[str] = set()
+        self.batch: dict[str, dict] = {}
+
+    @staticmethod
+    def _stored_hashes(collection) -> dict[str, str | None]:
+        stored: dict[str, str | None] = {}
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=HASH_PAGE_SIZE, offset=offset)
+            for pid, meta in zip(page["ids"], page["metadatas"]):
+                stored[pid] = (meta or {}).get("content_hash")
+            if len(page["ids"]) < HASH_PAGE_SIZE:
+                return stored
+            offset += HASH_PAGE_SIZE
+
+    def add(self, prompt: dict) -> None:
+        pid = prompt["prompt_id"]
+        if pid in self.seen:
+            # A prompt number repeated in the source keeps its first occurrence, as the prompt bank does.
+            return
+        self.seen.add(pid)
+        if pid not in self.stored:
+            self.summary["added"] += 1
+        elif self.stored[pid] != prompt_content_hash(prompt):
+            self.summary["updated"] += 1
+        else:
+            self.summary["unchanged"] += 1
+            return
+        self.batch[pid] = prompt
+        if len(self.batch) >= UPSERT_BATCH:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.batch:
+            return
+        batch = list(self.batch.values())
+        documents = [p["raw_text"] for p in batch]
+        # Embedded here rather than inside upsert so --profile can time the two apart.
+        with profiler.stage("embed"):
+            embeddings = self.embed_fn(documents)
+        self.collection.upsert(
+            ids=[p["prompt_id"] for p in batch],
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=[_prompt_metadata(p) for p in batch],
+        )
+        self.batch.clear()
+
+    def close(self) -> dict:
+        self.flush()
+        removed = [pid for pid in self.stored if pid not in self.seen]
+        if removed:
+            self.collection.delete(ids=removed)
+        self.summary["removed"] = len(removed)
+        return self.summary
+
+
+def build_chroma(
+    prompts: Iterable[dict], chroma_dir: Path, embedding_dim: int = EMBEDDING_DIM, full_rebuild: bool = False
+) -> dict:
+    index = ChromaIndexWriter(chroma_dir, embedding_dim, full_rebuild=full_rebuild)
+    for prompt in prompts:
+        index.add(prompt)
+    return index.close()
+
+
+# Bumped when parsing changes, so batch ingestion re-parses sources whose files did not change.
+INGEST_VERSION = 1
+
+
+def bank_meta_path(output_json: Path) -> Path:
+    return output_json.with_name(f"{output_json.stem}.meta.json")
+
+
+def binary_bank_path(output_json: Path) -> Path:
+    # prompts.json -> prompts.bank, the memory-mapped copy the backend prefers.
+    return output_json.with_name(f"{output_json.stem}.bank")
+
+
+def write_bank_meta(output_json: Path, sources: dict[str, dict], count: int) -> str:
+    # The version is derived from the source hashes, so re-running on unchanged sources keeps it (and the
+    # backend's loaded bank) as is. Written after the bank itself, which the backend reads first.
+    fingerprint = json.dumps(
+        [INGEST_VERSION, sorted((ns, src["sha256"]) for ns, src in sources.items())], separators=(",", ":")
+    )
+    version = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+    meta = {
+        "version": version,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "count": count,
+        "sources": {ns: {"path": src["path"], "sha256": src["sha256"], "prompts": src["prompts"]} for ns, src in sources.items()},
+    }
+    path = bank_meta_path(output_json)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    tmp.replace(path)
+    return version
+
+
+def _namespace(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "source"
+
+
+def load_sources(source_dir: str | None, manifest: str | None) -> list[tuple[str, Path]]:
+    # A manifest is a JSON list (or {"sources": [...]}) of paths or {"path": ..., "namespace": ...} objects;
+    # relative paths are resolved against the manifest's directory.
+    if source_dir:
+        entries = [{"path": str(p)} for p in sorted(Path(source_dir).glob("*.pdf"))]
+        base = Path(".")
+    else:
+        data = json.loads(Path(manifest).read_text(encoding="utf-8"))
+        entries = data.get("sources", []) if isinstance(data, dict) else data
+        base = Path(manifest).parent
+    out: list[tuple[str, Path]] = []
+    seen: set[str] = set()
+    for entry in entries:
+        entry = {"path": entry} if isinstance(entry, str) else entry
+        path = Path(entry["path"])
+        path = path if path.is_absolute() else base / path
+        namespace = _namespace(entry.get("namespace") or path.stem)
+        if namespace in seen:
+            raise SystemExit(f"Duplicate source namespace {namespace!r}; set distinct `namespace` values in the manifest.")
+        seen.add(namespace)
+        out.append((namespace, path))
+    return out
+
+
+def _ingest_source(namespace: str, pdf_path: str, part_path: str, workers: int, cache_dir: str | None) -> dict:
+    # Runs in a worker process: one source document -> one NDJSON part with namespaced prompt ids.
+    stats: dict = {}
+    pages = iter_pdf_pages(Path(pdf_path), workers=workers, cache_dir=Path(cache_dir) if cache_dir else None, stats=stats)
+    with PromptFileWriter(Path(part_path)) as writer:
+        for prompt in iter_prompts(iter_prompt_sections(pages)):
+            prompt["prompt_id"] = f"{namespace}:{prompt['prompt_id']}"
+            prompt["source"] = namespace
+            writer.write(prompt)
+    return {"prompts": writer.count, **stats}
+
+
+def _iter_part(path: Path) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def make_enricher(args, output_json: Path) -> PromptEnricher | None:
+    if not args.enrich:
+        return None
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key and ENRICH_MODEL_URL.startswith("https://api.openai.com/"):
+        raise SystemExit("--enrich needs OPENAI_API_KEY (or ENRICH_MODEL_URL pointing at a compatible server).")
+    return PromptEnricher(
+        output_json.parent / ".ingest" / "enrich.ndjson",
+        model=args.enrich_model,
+        api_key=api_key,
+        batch_size=args.enrich_batch,
+        concurrency=args.enrich_concurrency,
+        per_minute=args.enrich_rpm,
+    )
+
+
+def print_enrich_summary(enricher: PromptEnricher | None) -> None:
+    if enricher is None:
         return
+    s = enricher.close()
+    print(
+        f"Enrichment: {s['generated']} model answers generated in {s['calls']} calls, {s['reused']} reused "
+        f"from the checkpoint, {s['failed']} failed validation (served with the template sample)"
+    )
 
-    collection.add(
-        ids=[p["prompt_id"] for p in prompts],
-        documents=[p["raw_text"] for p in prompts],
-        metadatas=[
-            {
-                "task_type": p["task_type"],
-                "prompt_id": p["prompt_id"],
-                "title": p["title"],
-                "constraints": json.dumps(p["constraints"]),
-                "raw_text": p["raw_text"][:1500],
-            }
-            for p in prompts
-        ],
+
+def run_batch(args, sources: list[tuple[str, Path]]) -> None:
+    output_json = Path(args.output_json)
+    work_dir = output_json.parent / ".ingest"
+    (work_dir / "parts").mkdir(parents=True, exist_ok=True)
+    manifest_path = work_dir / "manifest.json"
+    previous = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+    previous_sources = previous.get("sources", {}) if previous.get("ingest_version") == INGEST_VERSION else {}
+    cache_dir = None if args.no_page_cache else str(Path(args.page_cache or output_json.parent / ".page_cache"))
+
+    started = time.perf_counter()
+    records: dict[str, dict] = {}
+    todo: list[tuple[str, Path]] = []
+    for namespace, path in sources:
+        part = work_dir / "parts" / f"{namespace}.ndjson"
+        sha = file_sha256(path)
+        old = previous_sources.get(namespace)
+        records[namespace] = {"path": str(path), "sha256": sha, "part": str(part)}
+        if not args.force and old and old.get("sha256") == sha and part.exists():
+            records[namespace]["prompts"] = old.get("prompts", 0)
+            print(f"  {namespace}: unchanged, skipped")
+        else:
+            todo.append((namespace, path))
+
+    if todo:
+        # Documents run in parallel; a lone changed document gets the workers for its pages instead.
+        doc_workers = min(args.workers, len(todo))
+        page_workers = args.workers if doc_workers <= 1 else 1
+        jobs = [(ns, str(path), records[ns]["part"], page_workers, cache_dir) for ns, path in todo]
+        if doc_workers <= 1:
+            results = [_ingest_source(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=doc_workers) as pool:
+                results = list(pool.map(_ingest_source, *zip(*jobs)))
+        for (namespace, _), result in zip(todo, results):
+            records[namespace]["prompts"] = result["prompts"]
+            print(
+                f"  {namespace}: {result['prompts']} prompts from {result['pages']} pages "
+                f"({result['extracted']} extracted, {result['cached']} cached)"
+            )
+
+    # Merge the parts in manifest order into the bank and the index, streaming.
+    index = ChromaIndexWriter(Path(args.chroma_dir), args.embedding_dim, full_rebuild=args.full_rebuild)
+    enricher = make_enricher(args, output_json)
+    merged = (prompt for namespace, _ in sources for prompt in _iter_part(Path(records[namespace]["part"])))
+    if enricher is not None:
+        merged = enricher.enrich(merged)
+    with PromptFileWriter(output_json) as writer, PromptBankWriter(binary_bank_path(output_json)) as bank:
+        for prompt in merged:
+            writer.write(prompt)
+            bank.write(prompt)
+            index.add(prompt)
+    summary = index.close()
+    version = write_bank_meta(output_json, records, writer.count)
+    for namespace, old in previous_sources.items():
+        if namespace not in records:
+            Path(old.get("part", "")).unlink(missing_ok=True)
+    manifest_path.write_text(json.dumps({"ingest_version": INGEST_VERSION, "sources": records}, indent=2), encoding="utf-8")
+
+    print(
+        f"Merged {writer.count} prompts from {len(sources)} sources ({len(todo)} ingested, "
+        f"{len(sources) - len(todo)} unchanged) into {output_json}, version {version}, "
+        f"in {time.perf_counter() - started:.2f}s"
     )
+    print(
+        f"Chroma {'rebuilt' if summary['full_rebuild'] else 'updated'}: {summary['added']} added, "
+        f"{summary['updated']} changed, {summary['removed']} removed, {summary['unchanged']} unchanged"
+    )
+    print_enrich_summary(enricher)
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--pdf", required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pdf", help="Ingest a single PDF; prompt ids stay the bare #N numbers.")
+    source.add_argument("--source-dir", help="Ingest every *.pdf in a directory, ids namespaced by file name.")
+    source.add_argument("--sources", help="JSON manifest of source documents (paths, optional namespaces).")
     parser.add_argument("--output-json", required=True)
     parser.add_argument("--chroma-dir", required=True)
+    parser.add_argument("--embedding-dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--full-rebuild", action="store_true", help="Drop the Chroma collection and re-embed every prompt.")
+    parser.add_argument("--force", action="store_true", help="Re-ingest batch sources even if their files are unchanged.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes used for extraction.")
+    parser.add_argument("--page-cache", help="Per-page text cache directory (default: .page_cache next to the output JSON).")
+    parser.add_argument("--no-page-cache", action="store_true")
+    parser.add_argument("--enrich", action="store_true", help="Add a validated model answer and keywords to each prompt.")
+    parser.add_argument("--enrich-model", default=ENRICH_MODEL)
+    parser.add_argument("--enrich-batch", type=int, default=5, help="Prompts per model request.")
+    parser.add_argument("--enrich-concurrency", type=int, default=2)
+    parser.add_argument("--enrich-rpm", type=float, default=30, help="Model requests per minute.")
+    parser.add_argument("--profile", metavar="REPORT_JSON", help="Time each pipeline stage and write a JSON report.")
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Also record per-stage memory peaks with tracemalloc (slows the run several times over).",
+    )
     args = parser.parse_args()
 
-    text = extract_pdf_text(Path(args.pdf))
-    prompts = parse_prompts(text)
+    if not args.pdf:
+        if args.profile:
+            parser.error("--profile needs --pdf")
+        run_batch(args, load_sources(args.source_dir, args.sources))
+        return
+    if args.profile:
+        profiler.start(trace_memory=args.profile_memory)
 
     output_json = Path(args.output_json)
-    output_json.parent.mkdir(parents=True, exist_ok=True)
-    output_json.write_text(json.dumps(prompts, indent=2, ensure_ascii=False), encoding="utf-8")
-    build_chroma(prompts, Path(args.chroma_dir))
-
-    print(f"Extracted {len(prompts)} prompts to {output_json}")
+    cache_dir = None if args.no_page_cache else Path(args.page_cache or output_json.parent / ".page_cache")
+    stats: dict = {}
+    # Pages -> sections -> prompts -> (output file, index batches), one item at a time.
+    pages = profiler.iter("extract", iter_pdf_pages(Path(args.pdf), workers=args.workers, cache_dir=cache_dir, stats=stats))
+    with profiler.stage("index_write"):
+        index = ChromaIndexWriter(Path(args.chroma_dir), args.embedding_dim, full_rebuild=args.full_rebuild)
+    enricher = make_enricher(args, output_json)
+    prompts = iter_prompts(profiler.iter("split", iter_prompt_sections(pages)))
+    if enricher is not None:
+        prompts = profiler.iter("enrich", enricher.enrich(prompts))
+    with PromptFileWriter(output_json) as writer, PromptBankWriter(binary_bank_path(output_json)) as bank:
+        for prompt in prompts:
+            with profiler.stage("write_output"):
+                writer.write(prompt)
+                bank.write(prompt)
+            with profiler.stage("index_write"):
+                index.add(prompt)
+    with profiler.stage("index_write"):
+        summary = index.close()
+    source = {"path": args.pdf, "sha256": stats["file_hash"], "prompts": writer.count}
+    version = write_bank_meta(output_json, {_namespace(Path(args.pdf).stem): source}, writer.count)
+
+    print(
+        f"Pages: {stats['pages']} ({stats['extracted']} extracted, {stats['cached']} from cache) "
+        f"in {stats['seconds']:.2f}s, {stats['pages'] / max(stats['seconds'], 1e-9):.1f} pages/s"
+    )
+    print(f"Extracted {writer.count} prompts to {output_json} (version {version})")
+    print(
+        f"Chroma {'rebuilt' if summary['full_rebuild'] else 'updated'}: {summary['added']} added, "
+        f"{summary['updated']} changed, {summary['removed']} removed, {summary['unchanged']} unchanged"
+    )
+    print_enrich_summary(enricher)
+    if args.profile:
+        report = {
+            "pdf": args.pdf,
+            "pages": stats["pages"],
+            "pages_extracted": stats["extracted"],
+            "workers": args.workers,
+            **profiler.report(writer.count),
+        }
+        Path(args.profile).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        for name, stage in sorted(report["stages"].items(), key=lambda kv: -kv[1]["seconds"]):
+            peak = f"  peak {stage['peak_mb']:.1f}MB" if "peak_mb" in stage else ""
+            print(f"  {name:16} {stage['seconds']:8.3f}s  {stage['calls']:7} calls{peak}")
+        print(f"Profile: {report['prompts_per_second']} prompts/s, report written to {args.profile}")
 
 
 if __name__ == "__main__":
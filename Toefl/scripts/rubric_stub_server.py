@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import re
+import threading
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+
+RUBRIC_KEYS = ["Task Fulfillment", "Organization & Coherence", "Grammar & Sentence Structure", "Vocabulary & Tone"]
+
+
+def create_app(fail_first: int = 0, score: float = 4.2) -> FastAPI:
+    # A stand-in for the chat completions API that answers rubric requests with fixed scores, so the rubric
+    # job path can run without network access. The first `fail_first` requests return 503.
+    app = FastAPI(title="Rubric model stub")
+    lock = threading.Lock()
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        with lock:
+            app.state.requests += 1
+            seen = app.state.requests
+        if seen <= fail_first:
+            raise HTTPException(status_code=503, detail="stub model unavailable")
+        instruction = body["messages"][-1]["content"]
+        words = len(re.findall(r"[A-Za-z']+", instruction.split("Response:", 1)[-1]))
+        content = {
+            "rubric_scores": {key: score for key in RUBRIC_KEYS},
+            "explanations": {key: f"Stub rating of a {words}-word response." for key in RUBRIC_KEYS},
+        }
+        return {
+            "model": body.get("model") or "stub",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(content)}}],
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fixed rubric scores for RUBRIC_MODEL_URL.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-first", type=int, default=0, help="Return 503 for the first N requests.")
+    parser.add_argument("--score", type=float, default=4.2)
+    args = parser.parse_args()
+    print(f"RUBRIC_MODEL_URL=http://{args.host}:{args.port}/v1/chat/completions")
+    uvicorn.run(create_app(args.fail_first, args.score), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()